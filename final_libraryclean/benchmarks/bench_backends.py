@@ -0,0 +1,66 @@
+"""
+The pandas and the lazy Polars backend side by side on the pipeline in ../pipeline.yaml.
+
+Both backends clean the same synthetic data with the memory runner; the script prints
+the end-to-end time of each, and checks that the cleaned and quarantine files are
+byte-identical and the logged metrics equal.
+
+Usage: python bench_backends.py [rows ...]   (default 1,000,000 5,000,000)
+"""
+
+import filecmp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json_data_clean as jdc
+import polars_backend
+from pipeline import Pipeline, load_config
+from synthetic_data import generate_library_data
+
+BACKENDS = ['pandas', 'polars']
+
+
+def run_backend(data_dir, backend):
+    config = load_config(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pipeline.yaml'))
+    config.update({'input_dir': data_dir, 'output_dir': os.path.join(data_dir, backend), 'backend': backend})
+
+    jdc.metrics_logger = jdc.MetricsLogger()
+    start = time.perf_counter()
+    Pipeline(config).run()
+    seconds = time.perf_counter() - start
+
+    metrics = {k: v for k, v in jdc.metrics_logger.metrics.items() if k != 'execution_timestamp'}
+    return seconds, metrics, config['output_dir']
+
+
+def same_files(dir_a, dir_b):
+    names = sorted(os.listdir(dir_a))
+    return names == sorted(os.listdir(dir_b)) and all(
+        filecmp.cmp(os.path.join(dir_a, name), os.path.join(dir_b, name), shallow=False) for name in names
+    )
+
+
+if __name__ == '__main__':
+    if not polars_backend.available():
+        sys.exit("polars is not installed (pip install polars)")
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000_000, 5_000_000]
+
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            print(f"Generating {rows:,} rows...")
+            generate_library_data(data_dir, rows)
+
+            runs = {backend: run_backend(data_dir, backend) for backend in BACKENDS}
+            identical = same_files(runs['pandas'][2], runs['polars'][2])
+            same_metrics = runs['pandas'][1] == runs['polars'][1]
+            results.append((rows, runs['pandas'][0], runs['polars'][0], identical, same_metrics))
+
+    print(f"\n{'rows':>12}{'pandas s':>10}{'polars s':>10}{'speedup':>9}{'same files':>12}{'same metrics':>14}")
+    for rows, pandas_seconds, polars_seconds, identical, same_metrics in results:
+        print(f"{rows:>12,}{pandas_seconds:>10.2f}{polars_seconds:>10.2f}{pandas_seconds / polars_seconds:>8.1f}x"
+              f"{str(identical):>12}{str(same_metrics):>14}")
@@ -0,0 +1,53 @@
+"""
+Benchmark borrow_period_days against the weeks-only conversion in data_clean2.py.
+
+The legacy conversion lowercases and strips every row, so its cost grows with the row
+count, and it only reads "N weeks". borrow_period_days parses each distinct value once.
+
+Usage: python bench_borrow_period.py [rows]   (default 10,000,000)
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from borrow_period import borrow_period_days
+
+PERIODS = ['2 weeks', '2 weeks', '2 weeks', '3 weeks', '1 week', '14 days', '1 month', '3 wks', 'a fortnight']
+
+
+def legacy_convert(values):
+    """The data_clean2.py conversion: strip 'weeks', to_numeric, times 7"""
+    values = values.astype(str).str.lower()
+    values = values.str.replace('weeks', '').str.strip()
+    return pd.to_numeric(values, errors='coerce') * 7
+
+
+def time_run(func, values):
+    start = time.perf_counter()
+    days = func(values)
+    return time.perf_counter() - start, days
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    print(f"Generating {rows:,} rows...")
+    rng = np.random.default_rng(0)
+    values = pd.Series(np.array(PERIODS)[rng.integers(0, len(PERIODS), rows)], dtype=str)
+
+    legacy_time, legacy_days = time_run(legacy_convert, values)
+    new_time, new_days = time_run(borrow_period_days, values)
+    category_time, category_days = time_run(borrow_period_days, values.astype('category'))
+
+    pd.testing.assert_series_equal(new_days, category_days)
+
+    print(f"{'implementation':<26}{'seconds':>10}{'rows/sec':>16}{'unread rows':>14}")
+    print(f"{'legacy weeks conversion':<26}{legacy_time:>10.2f}{rows / legacy_time:>16,.0f}{legacy_days.isna().sum():>14,}")
+    print(f"{'borrow_period_days':<26}{new_time:>10.2f}{rows / new_time:>16,.0f}{new_days.isna().sum():>14,}")
+    print(f"{'  on a category column':<26}{category_time:>10.2f}{rows / category_time:>16,.0f}{category_days.isna().sum():>14,}")
+    print(f"Speedup: {legacy_time / new_time:.1f}x, {legacy_time / category_time:.1f}x on categories")
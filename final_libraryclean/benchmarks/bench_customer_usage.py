@@ -0,0 +1,81 @@
+"""
+Per-customer usage: a customer page computed from the loans at request time, against
+reading the precomputed customer_usage row, and a full rebuild of the table against an
+incremental update with a day's worth of new loans.
+
+Usage: python bench_customer_usage.py [loans] [new loans]   (default 10,000,000 50,000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from customer_usage import CustomerUsage
+
+AS_OF = pd.Timestamp('2025-06-01')
+
+
+def make_loans(rows, customers, first_id=1, seed=0):
+    rng = np.random.default_rng(seed)
+    checkout = AS_OF - pd.to_timedelta(rng.integers(0, 1095, rows), unit='D')
+    days = rng.integers(0, 35, rows)
+    return pd.DataFrame({
+        'Id': np.arange(first_id, first_id + rows),
+        'Book checkout': checkout,
+        'Book Returned': checkout + pd.to_timedelta(days, unit='D'),
+        'Customer ID': rng.integers(1, customers + 1, rows),
+        'days_borrowed': days,
+        'borrow_period_days': rng.choice([7, 14, 21], rows)
+    })
+
+
+def page_from_loans(loans, customer_id):
+    """What a customer page would compute without the precomputed table"""
+    mine = loans[loans['Customer ID'] == customer_id]
+    return len(mine), mine['days_borrowed'].mean(), int((mine['days_borrowed'] > mine['borrow_period_days']).sum())
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    new_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    customer_count = max(10, rows // 20)
+
+    print(f"Generating {rows:,} loans for {customer_count:,} customers...")
+    loans = make_loans(rows, customer_count)
+    customers = pd.DataFrame({'Customer ID': np.arange(1, customer_count + 1), 'Customer Name': 'Customer'})
+    added = make_loans(new_rows, customer_count, first_id=rows + 1, seed=1)
+    lookups = np.random.default_rng(2).integers(1, customer_count + 1, 20)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        usage = CustomerUsage(output_dir, os.path.join(output_dir, 'unused.csv'), 'parquet')
+
+        start = time.perf_counter()
+        table = usage.rebuild(customers, loans, as_of=AS_OF)
+        rebuild_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        usage.update(customers, added, as_of=AS_OF)
+        update_seconds = time.perf_counter() - start
+
+        indexed = table.set_index('Customer ID')
+        start = time.perf_counter()
+        for customer_id in lookups:
+            page_from_loans(loans, customer_id)
+        scan_seconds = (time.perf_counter() - start) / len(lookups)
+
+        start = time.perf_counter()
+        for customer_id in lookups:
+            indexed.loc[customer_id]
+        row_seconds = (time.perf_counter() - start) / len(lookups)
+
+    print(f"{'':<40}{'seconds':>10}")
+    print(f"{'rebuild from all loans':<40}{rebuild_seconds:>10.3f}")
+    print(f"{f'update with {new_rows:,} new loans':<40}{update_seconds:>10.3f}")
+    print(f"{'customer page from the loans':<40}{scan_seconds:>10.5f}")
+    print(f"{'customer page from customer_usage':<40}{row_seconds:>10.5f}")
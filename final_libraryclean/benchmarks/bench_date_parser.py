@@ -0,0 +1,66 @@
+"""
+Benchmark the single-pass date parser against the original dateCleaner logic.
+
+Usage: python bench_date_parser.py [rows]   (default 10,000,000)
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from date_parser import DateFormatCache, parse_dates
+
+
+def make_date_columns(rows, seed=0):
+    """Build Book checkout/Book Returned columns shaped like the systembook export"""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('2020-01-01', '2025-12-31', freq='D').strftime('%d/%m/%Y').to_numpy()
+    # A few impossible dates like the '32/05/2023' in the sample data
+    days = np.append(days, ['32/05/2023', '31/02/2024', '00/01/2023'])
+
+    checkout = pd.Series(days[rng.integers(0, len(days), rows)], dtype=str)
+    checkout = '"' + checkout + '"'
+    returned = pd.Series(days[rng.integers(0, len(days), rows)], dtype=str)
+    return pd.DataFrame({'Book checkout': checkout, 'Book Returned': returned})
+
+
+def legacy_parse(df, col):
+    """The original dateCleaner: regex quote strip, then two dayfirst parses"""
+    df[col] = df[col].str.replace('"', "", regex=True)
+    df[col] = pd.to_datetime(df[col], dayfirst=True, errors='coerce')
+    error_flag = pd.to_datetime(df[col], dayfirst=True, errors='coerce').isna()
+    return df[~error_flag].reset_index(drop=True)
+
+
+def single_pass_parse(df, col, cache):
+    df[col], error_flag = parse_dates(df[col], source='benchmark', column=col, cache=cache)
+    return df[~error_flag].reset_index(drop=True)
+
+
+def time_run(func, df, *args):
+    df = df.copy()
+    start = time.perf_counter()
+    for col in ['Book checkout', 'Book Returned']:
+        df = func(df, col, *args)
+    return time.perf_counter() - start, df
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    print(f"Generating {rows:,} rows...")
+    data = make_date_columns(rows)
+
+    legacy_time, legacy_df = time_run(legacy_parse, data)
+    new_time, new_df = time_run(single_pass_parse, data, DateFormatCache())
+
+    pd.testing.assert_frame_equal(legacy_df, new_df)
+
+    print(f"{'implementation':<20}{'seconds':>10}{'rows/sec':>16}")
+    print(f"{'legacy dateCleaner':<20}{legacy_time:>10.2f}{rows / legacy_time:>16,.0f}")
+    print(f"{'parse_dates':<20}{new_time:>10.2f}{rows / new_time:>16,.0f}")
+    print(f"Speedup: {legacy_time / new_time:.1f}x, {len(new_df):,} rows kept")
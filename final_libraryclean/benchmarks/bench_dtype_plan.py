@@ -0,0 +1,65 @@
+"""
+Memory per row and load/clean time of the default read_csv dtypes against the planned ones.
+
+Usage: python bench_dtype_plan.py [rows]   (default 5,000,000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json_data_clean as jdc
+from dtype_planner import memory_report, plan_dtypes, read_planned_csv
+from synthetic_data import generate_systembook
+
+
+def clean(df):
+    """The systembook chain of json_data_clean.py after loading"""
+    df = jdc.duplicateCleaner(df, 'systembook_metrics')
+    df = jdc.naCleaner(df, 'systembook_metrics')
+    df = jdc.datesCleaner(['Book checkout', 'Book Returned'], df, 'systembook_metrics')
+    df = jdc.enrich_dateDuration('Book checkout', 'Book Returned', df, 'systembook_metrics')
+    return jdc.idCleaner(['Id', 'Customer ID'], df, 'systembook_metrics')
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'systembook.csv')
+        print(f"Generating {rows:,} rows...")
+        generate_systembook(path, rows)
+
+        plan = plan_dtypes(path)
+        print(f"Plan: {plan}")
+
+        results = {}
+        cleaned = {}
+        for name, read in [('default', pd.read_csv), ('planned', read_planned_csv)]:
+            start = time.perf_counter()
+            df = read(path)
+            load_time = time.perf_counter() - start
+            report = memory_report(df)
+
+            start = time.perf_counter()
+            cleaned[name] = clean(df)
+            clean_time = time.perf_counter() - start
+            results[name] = (report, load_time, clean_time, memory_report(cleaned[name]))
+
+    print(f"\n{'column':<26}{'default B/row':>15}{'planned B/row':>15}")
+    for col in results['default'][0]['columns']:
+        print(f"{col:<26}{results['default'][0]['columns'][col]:>15.1f}{results['planned'][0]['columns'][col]:>15.1f}")
+
+    print(f"\n{'dtypes':<10}{'B/row':>10}{'total MB':>10}{'load s':>9}{'clean s':>9}{'cleaned B/row':>15}")
+    for name, (report, load_time, clean_time, cleaned_report) in results.items():
+        print(f"{name:<10}{report['bytes_per_row']:>10.1f}{report['total_mb']:>10.1f}{load_time:>9.2f}"
+              f"{clean_time:>9.2f}{cleaned_report['bytes_per_row']:>15.1f}")
+
+    saving = 1 - results['planned'][0]['bytes_per_row'] / results['default'][0]['bytes_per_row']
+    print(f"\nPlanned dtypes use {saving:.0%} less memory per loaded row")
+    print(f"Same cleaned rows: {cleaned['default'].astype(str).equals(cleaned['planned'].astype(str))}")
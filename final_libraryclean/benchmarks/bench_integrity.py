@@ -0,0 +1,67 @@
+"""
+Benchmark the IdSet check of loan Customer IDs against a merge with the customers
+followed by a filter on the rows that found no customer.
+
+Reports the time and the peak Python allocations (tracemalloc) of each, for dense
+customer IDs (bitmap) and sparse ones (sorted array).
+
+Usage: python bench_integrity.py [loans] [customers]   (default 10,000,000 1,000,000)
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from integrity import IdSet
+
+
+def merge_orphans(loans, customers):
+    """The naive check: join every loan to its customer and keep the loans left without one"""
+    merged = loans.merge(customers, on='Customer ID', how='left', indicator=True)
+    return (merged['_merge'] == 'left_only').to_numpy()
+
+
+def idset_orphans(loans, customers):
+    return IdSet(customers['Customer ID']).orphans(loans['Customer ID'])
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    customer_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    rng = np.random.default_rng(0)
+
+    print(f"{rows:,} loans, {customer_count:,} customers")
+    print(f"{'':<24}{'method':<10}{'seconds':>10}{'peak MB':>10}{'orphans':>12}")
+    for layout, ids in [
+        ('dense IDs', np.arange(1, customer_count + 1)),
+        ('sparse IDs', np.sort(rng.choice(10**12, customer_count, replace=False)))
+    ]:
+        customers = pd.DataFrame({'Customer ID': ids, 'Customer Name': 'Customer'})
+        # 1% of the loans point at a customer that does not exist
+        references = ids[rng.integers(0, customer_count, rows)]
+        references[rng.random(rows) < 0.01] = ids[-1] + 1
+        loans = pd.DataFrame({'Id': np.arange(rows), 'Customer ID': references.astype('float64')})
+
+        results = []
+        for method, func in [('merge', merge_orphans), ('IdSet', idset_orphans)]:
+            seconds, peak, orphans = measure(func, loans, customers)
+            results.append(orphans)
+            print(f"{layout:<24}{method:<10}{seconds:>10.2f}{peak:>10.0f}{int(orphans.sum()):>12,}")
+        assert (results[0] == results[1]).all()
+        print(f"{'':<24}IdSet size: {IdSet(ids).nbytes / 2**20:.2f} MB")
@@ -0,0 +1,71 @@
+"""
+Point lookups on the lookup service (lookup.py) against scanning the cleaned outputs.
+
+Cleans synthetic data with the pipeline in ../pipeline.yaml, builds the indexes, then
+times random customer, loan and title lookups (median and 99th percentile) and the same
+customer lookups done as a scan of the loaded frames.
+
+Usage: python bench_lookup.py [rows] [lookups]   (default 2,000,000 10,000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json_data_clean as jdc
+from lookup import LookupService
+from pipeline import DEFAULT_CONFIG, Pipeline, load_config
+from synthetic_data import BOOKS, generate_library_data
+
+
+def time_calls(func, args):
+    """Per-call seconds for func(arg) over args"""
+    seconds = np.empty(len(args))
+    for i, arg in enumerate(args):
+        start = time.perf_counter()
+        func(arg)
+        seconds[i] = time.perf_counter() - start
+    return seconds
+
+
+def report(name, seconds):
+    print(f"{name:<30}{np.median(seconds) * 1e6:>12.1f}{np.percentile(seconds, 99) * 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        print(f"Generating and cleaning {rows:,} rows...")
+        generate_library_data(data_dir, rows)
+        config = load_config(DEFAULT_CONFIG)
+        config.update({'input_dir': data_dir, 'output_dir': os.path.join(data_dir, 'out')})
+        jdc.metrics_logger = jdc.MetricsLogger()
+        Pipeline(config).run()
+
+        start = time.perf_counter()
+        service = LookupService(config['output_dir'])
+        build_seconds = time.perf_counter() - start
+
+        rng = np.random.default_rng(0)
+        customers = rng.choice(list(service.index.customer_rows), lookups)
+        loans = rng.choice(list(service.index.loan_rows), lookups)
+        titles = rng.choice(BOOKS, lookups)
+
+        loans_frame = pd.read_csv(os.path.join(config['output_dir'], 'cleaned_library_systembook.csv'))
+        scan = time_calls(lambda customer: loans_frame[loans_frame['Customer ID'] == customer], customers[:100])
+
+        print(f"\nIndexes built in {build_seconds:.2f}s over {service.index.loans.rows:,} loans")
+        print(f"{'lookup':<30}{'median us':>12}{'p99 us':>12}")
+        report('customer', time_calls(service.customer, customers))
+        report("customer's loans", time_calls(service.customer_loans, customers))
+        report('loan by Id', time_calls(service.loan, loans))
+        report('title status', time_calls(service.title, titles))
+        report("customer's loans, scan", scan)
@@ -0,0 +1,96 @@
+"""
+Benchmark several reader processes (dashboard sessions in separate processes, lookup
+services) loading the same cleaned output:
+
+- read_output() of the Parquet file: every process decodes its own copy
+- map_output() of the uncompressed Arrow IPC file: every process maps the same file
+
+Each reader loads the output, touches every column and reports its load time and its
+private and proportional (PSS) memory from /proc/self/smaps_rollup (Linux only). Shared
+page cache pages count once across the readers in PSS.
+
+Usage: python bench_mapped_output.py [rows] [readers]   (default 5,000,000 4)
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from writers import write_dataframe
+
+READER = """
+import sys, time
+sys.path.insert(0, {root!r})
+from writers import map_output, read_output
+
+start = time.perf_counter()
+df = {load}({path!r})
+for col in df.columns:
+    df[col].isna().sum()
+seconds = time.perf_counter() - start
+
+memory = {{}}
+with open('/proc/self/smaps_rollup') as f:
+    for line in f:
+        name, _, value = line.partition(':')
+        if name in ('Pss', 'Private_Clean', 'Private_Dirty'):
+            memory[name] = int(value.split()[0]) / 1024
+print(seconds, memory['Pss'], memory['Private_Clean'] + memory['Private_Dirty'])
+sys.stdin.read()
+"""
+
+
+def cleaned_loans(rows, seed=0):
+    """A frame shaped like cleaned_library_systembook"""
+    rng = np.random.default_rng(seed)
+    checkout = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    days = rng.integers(0, 40, rows)
+    return pd.DataFrame({
+        'Id': np.arange(1, rows + 1),
+        'Books': pd.Series(rng.choice(['Catcher in the Rye', 'Little Women', 'Dune', 'Catch 22', '1984'], rows)),
+        'Book checkout': checkout,
+        'Book Returned': checkout + pd.to_timedelta(days, unit='D'),
+        'Customer ID': rng.integers(1, rows // 20 + 2, rows),
+        'days_borrowed': days,
+        'is_overdue': days > 14
+    })
+
+
+def run_readers(path, load, readers):
+    """Start readers processes together, wait until they have all loaded; [(seconds, pss MB, private MB)]"""
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    code = READER.format(root=root, load=load, path=path)
+    procs = [
+        subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(readers)
+    ]
+    # Readers stay alive until all have reported, so their memory is measured side by side
+    results = [tuple(map(float, proc.stdout.readline().split())) for proc in procs]
+    for proc in procs:
+        proc.communicate('')
+    return results
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print(f"Writing {rows:,} cleaned loans...")
+        df = cleaned_loans(rows)
+        parquet_path = write_dataframe(df, os.path.join(tmpdir, 'loans.parquet'), 'parquet')
+        arrow_path = write_dataframe(df, os.path.join(tmpdir, 'loans.arrow'), 'arrow')
+        print(f"Arrow file: {os.path.getsize(arrow_path) / 1024 ** 2:,.0f} MB")
+
+        print(f"{readers} readers{'':<21}{'load s':>10}{'PSS MB':>12}{'private MB':>12}{'total PSS MB':>14}")
+        for label, path, load in [('read_output (parquet)', parquet_path, 'read_output'),
+                                  ('map_output (arrow)', arrow_path, 'map_output')]:
+            results = run_readers(path, load, readers)
+            seconds, pss, private = (sum(values) / readers for values in zip(*results))
+            print(f"{label:<32}{seconds:>10.2f}{pss:>12,.0f}{private:>12,.0f}{pss * readers:>14,.0f}")
@@ -0,0 +1,92 @@
+"""
+Benchmark cleaning many branch exports of the Systembook into one output:
+
+- serial: each file read with fileLoader and cleaned with run_steps one after another,
+  the clean rows appended to the output (what a loop over the scripts would do)
+- clean_files: reads on a thread pool, cleaning on a process pool, one output
+
+One branch file is broken (no date columns) to show it does not stop the others.
+
+Usage: python bench_multi_file.py [files] [rows per file] [workers]   (default 32 100,000 cpu count)
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json_data_clean as jdc
+from integrity import IdSet
+from multi_file import SOURCE_COLUMN, clean_files, file_labels
+from quarantine import run_steps
+from synthetic_data import generate_systembook
+from writers import get_writer
+
+
+def systembook_steps(customers, source=None):
+    return [
+        partial(jdc.duplicateCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.naCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.datesCleaner, ['Book checkout', 'Book Returned'], dataset_name='systembook_metrics', source=source),
+        partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+        partial(jdc.referenceCleaner, 'Customer ID', dataset_name='systembook_metrics', known_ids=IdSet(range(1, customers + 1))),
+        partial(jdc.borrowPeriodCleaner, 'Days allowed to borrow', dataset_name='systembook_metrics'),
+        partial(jdc.enrich_overdue, 'days_borrowed', 'borrow_period_days', dataset_name='systembook_metrics'),
+        partial(jdc.idCleaner, ['Id', 'Customer ID'], dataset_name='systembook_metrics')
+    ]
+
+
+def clean_serially(paths, customers, output_path):
+    rows, failed = 0, 0
+    with get_writer('csv', output_path) as writer:
+        for path, label in zip(paths, file_labels(paths)):
+            try:
+                df = run_steps(jdc.fileLoader(path, 'systembook_metrics'), systembook_steps(customers, path))
+            except (OSError, KeyError, ValueError, TypeError):
+                failed += 1
+                continue
+            writer.write(df.assign(**{SOURCE_COLUMN: label}))
+        rows = writer.rows_written
+    return rows, failed
+
+
+if __name__ == '__main__':
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    customers = max(10, rows // 20)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print(f"Generating {files} branch exports of {rows:,} loans...")
+        paths = [
+            generate_systembook(os.path.join(tmpdir, f'branch_{i:03d}.csv'), rows, customers, seed=i)
+            for i in range(files - 1)
+        ]
+        broken = os.path.join(tmpdir, f'branch_{files - 1:03d}.csv')
+        with open(broken, 'w') as f:
+            f.write('Id,Books,Customer ID\n1,Dune,1\n')
+        paths.append(broken)
+
+        results = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            jdc.metrics_logger = jdc.MetricsLogger()
+            start = time.perf_counter()
+            serial_rows, serial_failed = clean_serially(paths, customers, os.path.join(tmpdir, 'serial.csv'))
+            results.append(('serial loop', time.perf_counter() - start, serial_rows, serial_failed))
+
+            jdc.metrics_logger = jdc.MetricsLogger()
+            start = time.perf_counter()
+            union_rows = clean_files(paths, 'systembook_metrics', systembook_steps(customers), os.path.join(tmpdir, 'union.csv'),
+                                     jdc.metrics_logger, max_workers=workers)
+            failed = jdc.metrics_logger.metrics['systembook_metrics']['files_failed']
+            results.append(('clean_files', time.perf_counter() - start, union_rows, failed))
+
+        print(f"{os.cpu_count()} CPUs, {workers or os.cpu_count()} cleaning workers")
+        print(f"{'':<20}{'seconds':>10}{'rows':>14}{'files failed':>14}{'rows/s':>12}")
+        for label, seconds, written, failed in results:
+            print(f"{label:<20}{seconds:>10.2f}{written:>14,}{failed:>14}{files * rows / seconds:>12,.0f}")
@@ -0,0 +1,63 @@
+"""
+Benchmark overdue_columns against working out lateness row by row with DataFrame.apply,
+which is what a per-visual calculated column amounts to.
+
+Usage: python bench_overdue.py [rows] [apply rows]   (default 10,000,000 1,000,000)
+
+apply is timed on the first [apply rows] rows only and scaled up, it takes minutes on
+the full column.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from overdue import FINE_PENCE_PER_DAY, overdue_columns
+
+
+def row_lateness(row):
+    if pd.isna(row['days_borrowed']) or pd.isna(row['borrow_period_days']):
+        return pd.NA, False, pd.NA
+    late = max(row['days_borrowed'] - row['borrow_period_days'], 0)
+    return late, late > 0, late * FINE_PENCE_PER_DAY
+
+
+def apply_lateness(df):
+    return df.apply(row_lateness, axis=1, result_type='expand')
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    apply_rows = min(rows, int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
+
+    print(f"Generating {rows:,} loans...")
+    rng = np.random.default_rng(0)
+    days = pd.array(rng.integers(0, 40, rows), dtype='Int64')
+    periods = pd.array(rng.choice([7, 14, 21], rows), dtype='Int64')
+    # A few loans without a readable period
+    periods[rng.random(rows) < 0.001] = pd.NA
+    df = pd.DataFrame({'days_borrowed': days, 'borrow_period_days': periods})
+
+    start = time.perf_counter()
+    days_overdue, is_overdue, fines = overdue_columns(df['days_borrowed'], df['borrow_period_days'])
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = apply_lateness(df.iloc[:apply_rows])
+    applied = (time.perf_counter() - start) * rows / apply_rows
+
+    same = (
+        (expected[1].to_numpy(dtype=bool) == is_overdue[:apply_rows]).all()
+        and expected[0].astype('Int64').equals(days_overdue.iloc[:apply_rows])
+        and expected[2].astype('Int64').equals(fines.iloc[:apply_rows])
+    )
+    print(f"Same results on the first {apply_rows:,} rows: {same}")
+    print(f"Overdue loans: {int(is_overdue.sum()):,}, estimated fines {int(fines.sum()):,}p")
+    print(f"{'':<32}{'seconds':>10}{'rows/sec':>16}")
+    print(f"{'row by row (apply, scaled)':<32}{applied:>10.2f}{rows / applied:>16,.0f}")
+    print(f"{'overdue_columns':<32}{vectorized:>10.2f}{rows / vectorized:>16,.0f}")
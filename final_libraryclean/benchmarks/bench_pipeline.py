@@ -0,0 +1,141 @@
+"""
+Benchmark the cleaners and the end-to-end pipeline on synthetic library data.
+
+For each size, synthetic Systembook/Customers CSVs are generated (synthetic_data.py),
+the pipeline in ../pipeline.yaml is run on them and the end-to-end time plus the
+per-step timings recorded by MetricsLogger are stored in a JSON results file named
+after the current commit, so runs on different commits can be compared.
+
+Usage:
+    python bench_pipeline.py [--rows 10000 100000 1000000] [--runner memory|streaming|parallel]
+                             [--chunksize 1000000] [--data-dir DIR] [--results-dir DIR]
+    python bench_pipeline.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import json_data_clean as jdc
+from pipeline import Pipeline, load_config
+from synthetic_data import generate_library_data
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_size(rows, data_dir, runner, chunksize):
+    """Generate (or reuse) the data for one size, run the pipeline and return the timings"""
+    size_dir = os.path.join(data_dir, f'rows_{rows}')
+    start = time.perf_counter()
+    if not os.path.exists(os.path.join(size_dir, 'done')):
+        generate_library_data(size_dir, rows)
+        open(os.path.join(size_dir, 'done'), 'w').close()
+    generate_seconds = time.perf_counter() - start
+
+    config = load_config(os.path.join(BENCH_DIR, '..', 'pipeline.yaml'))
+    config.update({
+        'input_dir': size_dir,
+        'output_dir': os.path.join(size_dir, 'output'),
+        'runner': runner,
+        'chunksize': chunksize
+    })
+
+    jdc.metrics_logger = jdc.MetricsLogger()
+    start = time.perf_counter()
+    final_rows = Pipeline(config).run()
+    end_to_end_seconds = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'generate_seconds': round(generate_seconds, 3),
+        'end_to_end_seconds': round(end_to_end_seconds, 3),
+        'rows_per_second': round(rows / end_to_end_seconds),
+        'final_rows': final_rows,
+        'steps': jdc.metrics_logger.step_timings
+    }
+
+
+def compare(old_path, new_path):
+    """Print the end-to-end and per-step wall time of two result files side by side"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'rows':>12}  {'dataset':<20}{'step':<22}{'old s':>10}{'new s':>10}{'change':>9}")
+    old_runs = {run['rows']: run for run in old['results']}
+    for run in new['results']:
+        if run['rows'] not in old_runs:
+            continue
+        before = old_runs[run['rows']]
+        lines = [('', 'end to end', before['end_to_end_seconds'], run['end_to_end_seconds'])]
+        for dataset, steps in run['steps'].items():
+            for step, timings in steps.items():
+                old_timings = before['steps'].get(dataset, {}).get(step)
+                if old_timings:
+                    lines.append((dataset, step, old_timings['wall_seconds'], timings['wall_seconds']))
+        for dataset, step, old_seconds, new_seconds in lines:
+            change = f'{(new_seconds / old_seconds - 1) * 100:+.0f}%' if old_seconds else 'n/a'
+            print(f"{run['rows']:>12,}  {dataset:<20}{step:<22}{old_seconds:>10.3f}{new_seconds:>10.3f}{change:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the cleaning pipeline on synthetic data')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--runner', choices=['memory', 'streaming', 'parallel'], default='memory')
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    parser.add_argument('--data-dir', help='keep generated data here and reuse it on later runs')
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'runner': args.runner,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': []
+    }
+
+    with tempfile.TemporaryDirectory(prefix='bench_pipeline_') as tmpdir:
+        data_dir = args.data_dir or tmpdir
+        for rows in args.rows:
+            print(f"---- {rows:,} rows ({args.runner}) ----")
+            run = run_size(rows, data_dir, args.runner, args.chunksize)
+            results['results'].append(run)
+            print(f"End to end: {run['end_to_end_seconds']:.2f}s ({run['rows_per_second']:,} rows/s)")
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    results_path = os.path.join(args.results_dir, f"pipeline_{results['commit']}_{args.runner}.json")
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results saved to {results_path}")
@@ -0,0 +1,64 @@
+"""
+Benchmark run_cached_steps on a synthetic Systembook: a run without a cache, a cold run
+that fills the cache, a warm run that restores the final state, and a run whose last step
+changed (restores the state before it and runs that step only).
+
+Usage: python bench_step_cache.py [rows]   (default 2,000,000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json_data_clean as jdc
+from integrity import IdSet
+from step_cache import StepCache, run_cached_steps
+from synthetic_data import generate_systembook
+
+
+def systembook_steps(customers, id_columns=('Id', 'Customer ID')):
+    return [
+        partial(jdc.duplicateCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.naCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.datesCleaner, ['Book checkout', 'Book Returned'], dataset_name='systembook_metrics'),
+        partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+        partial(jdc.referenceCleaner, 'Customer ID', dataset_name='systembook_metrics', known_ids=IdSet(range(1, customers + 1))),
+        partial(jdc.borrowPeriodCleaner, 'Days allowed to borrow', dataset_name='systembook_metrics'),
+        partial(jdc.enrich_overdue, 'days_borrowed', 'borrow_period_days', dataset_name='systembook_metrics'),
+        partial(jdc.idCleaner, list(id_columns), dataset_name='systembook_metrics')
+    ]
+
+
+def timed(path, steps, cache):
+    jdc.metrics_logger = jdc.MetricsLogger()
+    start = time.perf_counter()
+    df = run_cached_steps(path, 'systembook_metrics', jdc.fileLoader, steps, cache)
+    return time.perf_counter() - start, df
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    customers = max(10, rows // 20)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print(f"Generating {rows:,} loans...")
+        path = generate_systembook(os.path.join(tmpdir, 'systembook.csv'), rows, customers)
+        cache = StepCache(os.path.join(tmpdir, 'cache'))
+
+        uncached, expected = timed(path, systembook_steps(customers), None)
+        cold, _ = timed(path, systembook_steps(customers), cache)
+        warm, df = timed(path, systembook_steps(customers), cache)
+        changed, _ = timed(path, systembook_steps(customers, id_columns=['Id']), cache)
+
+        cache_mb = sum(size for _, size, _ in cache.entries()) / 1024 ** 2
+        print(f"Same output from the cache: {df.equals(expected)}")
+        print(f"Cache: {len(cache.entries())} entries, {cache_mb:,.0f} MB")
+        print(f"{'':<32}{'seconds':>10}")
+        print(f"{'no cache':<32}{uncached:>10.2f}")
+        print(f"{'cold cache (fills it)':<32}{cold:>10.2f}")
+        print(f"{'warm cache':<32}{warm:>10.2f}")
+        print(f"{'last step changed':<32}{changed:>10.2f}")
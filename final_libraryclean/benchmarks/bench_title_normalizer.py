@@ -0,0 +1,92 @@
+"""
+Benchmark blocked title matching against all-pairs matching, and title id assignment
+against the per-row str.strip().str.title() of data_clean2.py.
+
+Synthetic catalogue: base titles made of random words, each also spelled in lower case,
+with punctuation and with a one-letter typo outside the first word.
+
+Usage: python bench_title_normalizer.py [base titles] [rows]   (default 5,000 10,000,000)
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from title_normalizer import TitleCatalog, assign_title_ids, similarity
+
+WORDS = [
+    'lord', 'rings', 'king', 'return', 'shadow', 'river', 'night', 'garden', 'winter', 'house', 'secret',
+    'war', 'peace', 'stone', 'fire', 'queen', 'island', 'road', 'city', 'dark', 'tales', 'little', 'women',
+    'heart', 'eden', 'dragon', 'sea', 'storm', 'glass', 'silver', 'empire', 'child', 'light', 'forest'
+]
+
+
+class AllPairsCatalog(TitleCatalog):
+    """TitleCatalog that compares a new key with every known key"""
+
+    def closest(self, key):
+        best, best_ratio = None, self.threshold
+        for other in self.keys:
+            ratio = similarity(key, other, at_least=best_ratio)
+            if ratio >= best_ratio and (best is None or ratio > best_ratio):
+                best, best_ratio = other, ratio
+        return best
+
+
+def make_spellings(base_titles, seed=0):
+    rng = np.random.default_rng(seed)
+    spellings = []
+    for _ in range(base_titles):
+        words = list(rng.choice(WORDS, rng.integers(2, 6)))
+        title = 'The ' + ' of the '.join(word.capitalize() for word in words)
+        typo = list(title)
+        position = rng.integers(len('The ' + words[0]) + 1, len(title))
+        typo[position] = 'x'
+        spellings += [title, title.lower(), title.replace(' of the ', ': ', 1) + '.', ''.join(typo)]
+    return spellings
+
+
+def time_matching(catalog, spellings):
+    start = time.perf_counter()
+    for spelling in spellings:
+        catalog.title_id(spelling)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    base_titles = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000_000
+    spellings = make_spellings(base_titles)
+
+    # All-pairs grows with the square of the catalogue, so it only gets a slice
+    sample = spellings[:min(len(spellings), 4_000)]
+    all_pairs_time = time_matching(AllPairsCatalog(), sample)
+    blocked_sample_time = time_matching(TitleCatalog(), sample)
+    catalog = TitleCatalog()
+    blocked_time = time_matching(catalog, spellings)
+
+    print(f"{'matching':<32}{'spellings':>10}{'seconds':>10}{'titles':>9}")
+    print(f"{'all pairs':<32}{len(sample):>10,}{all_pairs_time:>10.2f}")
+    print(f"{'blocked on first word':<32}{len(sample):>10,}{blocked_sample_time:>10.2f}")
+    print(f"{'blocked on first word':<32}{len(spellings):>10,}{blocked_time:>10.2f}{len(catalog.titles):>9,}")
+
+    print(f"\nGenerating {rows:,} loan rows...")
+    rng = np.random.default_rng(1)
+    books = pd.Series(np.array(spellings, dtype=object)[rng.integers(0, len(spellings), rows)], dtype='category')
+
+    start = time.perf_counter()
+    books.astype(str).str.strip().str.title()
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assign_title_ids(books, catalog)
+    cached_time = time.perf_counter() - start
+
+    print(f"{'per row':<32}{'seconds':>10}{'rows/sec':>16}")
+    print(f"{'str.strip().str.title()':<32}{legacy_time:>10.2f}{rows / legacy_time:>16,.0f}")
+    print(f"{'assign_title_ids (cached)':<32}{cached_time:>10.2f}{rows / cached_time:>16,.0f}")
@@ -0,0 +1,82 @@
+"""
+Benchmark the time from dropping a Systembook export to its cleaned output and metrics:
+
+- cold: a new `python pipeline.py config` process per drop (interpreter start, imports,
+  config parsing, then every dataset, as a run by hand would)
+- warm: IngestService already running; it cleans the dropped Systembook only, and the
+  time includes the settle time and polling
+
+Usage: python bench_watch_folder.py [rows] [drops]   (default 100,000 5)
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pipeline import DEFAULT_CONFIG, load_config
+from synthetic_data import SYSTEMBOOK_FILE, generate_library_data, generate_systembook
+from watch_folder import IngestService
+
+POLL_SECONDS = 0.1
+SETTLE_SECONDS = 0.3
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    drops = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_dir, output_dir = os.path.join(tmpdir, 'in'), os.path.join(tmpdir, 'out')
+        print(f"Generating {drops} exports of {rows:,} loans...")
+        generate_library_data(input_dir, rows)
+        exports = [
+            generate_systembook(os.path.join(tmpdir, f'export_{i}.csv'), rows, max(10, rows // 20), seed=i)
+            for i in range(drops)
+        ]
+
+        config = load_config(DEFAULT_CONFIG)
+        config.update(input_dir=input_dir, output_dir=output_dir, step_cache=None)
+        config_path = os.path.join(tmpdir, 'pipeline.json')
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+
+        # Cold: one process per drop; the first run also cleans the customers the loans reference
+        subprocess.run([sys.executable, os.path.join(root, 'pipeline.py'), config_path], capture_output=True, check=True)
+        cold = []
+        for export in exports:
+            shutil.copyfile(export, os.path.join(input_dir, SYSTEMBOOK_FILE))
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(root, 'pipeline.py'), config_path], capture_output=True, check=True)
+            cold.append(time.perf_counter() - start)
+
+        # Warm: one service for every drop
+        service = IngestService(config, poll_seconds=POLL_SECONDS, settle_seconds=SETTLE_SECONDS).start()
+        warm, run_seconds = [], []
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for export in exports:
+                    runs = service.runs
+                    start = time.perf_counter()
+                    shutil.copyfile(export, os.path.join(input_dir, SYSTEMBOOK_FILE))
+                    while service.runs == runs:
+                        time.sleep(0.01)
+                    warm.append(time.perf_counter() - start)
+                    with open(os.path.join(output_dir, 'pipeline_metrics.json')) as f:
+                        run_seconds.append(json.load(f)['ingest_metrics']['run_seconds'])
+        finally:
+            service.stop()
+
+        print(f"Settle time {SETTLE_SECONDS}s, poll every {POLL_SECONDS}s, {service.failed_runs} failed runs")
+        print(f"{'seconds per drop':<40}{'mean':>10}{'min':>10}")
+        for label, times in [('cold process (pipeline.py)', cold), ('warm service, drop to output', warm),
+                             ('warm service, run only', run_seconds)]:
+            print(f"{label:<40}{sum(times) / len(times):>10.2f}{min(times):>10.2f}")
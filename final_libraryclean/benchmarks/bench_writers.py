@@ -0,0 +1,68 @@
+"""
+Compare write time, file size and reload time of the CSV, Parquet and Arrow writers.
+
+Usage: python bench_writers.py [rows]   (default 1,000,000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from writers import cleaned_output_path, read_output, write_dataframe
+
+BOOKS = ['Catcher in the Rye ', 'Lord of the rings the two towers', 'The hobbit', 'Dune ', 'Little Women',
+         'IT', 'Misery ', 'Catch 22', 'Animal Farm ', '1984', 'East of Eden', 'Wuthering Heights', 'Dracula']
+
+CONFIGURATIONS = [
+    ('csv', None),
+    ('parquet', 'snappy'),
+    ('parquet', 'zstd'),
+    ('arrow', None),
+    ('arrow', 'lz4')
+]
+
+
+def make_cleaned_systembook(rows, seed=0):
+    """Build a frame with the same columns and dtypes as cleaned_library_systembook"""
+    rng = np.random.default_rng(seed)
+    checkout = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, rows), unit='D')
+    days = rng.integers(0, 60, rows)
+    return pd.DataFrame({
+        'Id': pd.array(np.arange(1, rows + 1), dtype='Int64'),
+        'Books': pd.Series(np.array(BOOKS)[rng.integers(0, len(BOOKS), rows)], dtype=str),
+        'Book checkout': checkout,
+        'Book Returned': checkout + pd.to_timedelta(days, unit='D'),
+        'Days allowed to borrow': '2 weeks',
+        'Customer ID': pd.array(rng.integers(1, 5000, rows), dtype='Int64'),
+        'days_borrowed': days,
+        'valid_loan_flag': True
+    })
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Generating {rows:,} rows...")
+    data = make_cleaned_systembook(rows)
+
+    print(f"{'format':<10}{'compression':<13}{'write s':>9}{'size MB':>10}{'reload s':>10}  types kept")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for output_format, compression in CONFIGURATIONS:
+            path = cleaned_output_path(tmpdir, f'bench_{compression}', output_format)
+
+            start = time.perf_counter()
+            write_dataframe(data, path, output_format, row_group_size=128_000, compression=compression)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            reloaded = read_output(path)
+            reload_time = time.perf_counter() - start
+
+            size_mb = os.path.getsize(path) / 1024 ** 2
+            types_kept = reloaded.dtypes.equals(data.dtypes)
+            print(f"{output_format:<10}{str(compression):<13}{write_time:>9.2f}{size_mb:>10.1f}{reload_time:>10.2f}  {types_kept}")
@@ -0,0 +1,122 @@
+"""
+Synthetic Systembook / Customers CSVs that look like the library exports in sample-data.
+
+The files carry the same problems the cleaners deal with, at a configurable rate:
+- checkout dates wrapped in literal quotes ("20/02/2023" with the quotes in the field)
+- exact duplicate rows
+- blank cells (NaN)
+- unparseable dates
+- invalid loans (returned before checkout)
+- "Days allowed to borrow" as text such as "2 weeks"
+
+Rows are written in chunks so 100M-row files can be generated with bounded memory.
+
+Usage: python synthetic_data.py rows output_dir
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BOOKS = ['Catcher in the Rye ', 'Lord of the rings the two towers', 'Lord of the rings the return of the kind',
+         'The hobbit', 'Dune ', 'Little Women', 'IT', 'Misery ', 'Catch 22', 'Animal Farm ', '1984',
+         'East of Eden', 'Wuthering Heights', 'Dracula', 'Of Mice and Men']
+BORROW_PERIODS = ['2 weeks', '2 weeks', '2 weeks', '3 weeks', '1 week']
+FIRST_NAMES = ['Jane', 'John', 'Dan', 'William', 'Jaztyn', 'Jackie', 'Matthew', 'Emory', 'Ada', 'Grace']
+LAST_NAMES = ['Doe', 'Smith', 'Reeves', 'Holden', 'Forest', 'Irving', 'Stirling', 'Ted', 'Lovelace', 'Hopper']
+
+# Share of rows with each problem
+DEFAULT_RATES = {
+    'duplicates': 0.3,
+    'na': 0.02,
+    'invalid_dates': 0.01,
+    'invalid_loans': 0.05
+}
+
+CHUNK_ROWS = 1_000_000
+SYSTEMBOOK_FILE = '03_Library Systembook.csv'
+CUSTOMERS_FILE = '03_Library SystemCustomers.csv'
+
+
+def _systembook_chunk(rng, first_id, rows, customers, rates):
+    """One chunk of loans; duplicates are copies of earlier rows of the same chunk"""
+    unique_rows = max(1, rows - int(rows * rates['duplicates']))
+
+    checkout = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 1095, unique_rows), unit='D')
+    borrowed = pd.to_timedelta(rng.integers(0, 35, unique_rows), unit='D')
+    invalid_loans = rng.random(unique_rows) < rates['invalid_loans']
+    returned = checkout + np.where(invalid_loans, -borrowed - pd.Timedelta(days=1), borrowed)
+
+    checkout_text = pd.Series(checkout.strftime('%d/%m/%Y'), dtype=object)
+    returned_text = pd.Series(pd.DatetimeIndex(returned).strftime('%d/%m/%Y'), dtype=object)
+    bad_dates = rng.random(unique_rows) < rates['invalid_dates']
+    checkout_text[bad_dates] = rng.choice(['32/01/2023', '00/00/0000', 'not returned'], int(bad_dates.sum()))
+
+    df = pd.DataFrame({
+        'Id': np.arange(first_id, first_id + unique_rows).astype(float),
+        'Books': np.array(BOOKS, dtype=object)[rng.integers(0, len(BOOKS), unique_rows)],
+        'Book checkout': '"' + checkout_text + '"',
+        'Book Returned': returned_text,
+        'Days allowed to borrow': np.array(BORROW_PERIODS, dtype=object)[rng.integers(0, len(BORROW_PERIODS), unique_rows)],
+        'Customer ID': rng.integers(1, customers + 1, unique_rows).astype(float)
+    })
+
+    for col in df.columns:
+        df.loc[rng.random(unique_rows) < rates['na'] / len(df.columns), col] = np.nan
+
+    duplicates = rng.integers(0, unique_rows, rows - unique_rows)
+    positions = np.sort(np.concatenate([np.arange(unique_rows), duplicates]), kind='stable')
+    return df.iloc[positions]
+
+
+def generate_systembook(path, rows, customers=None, seed=0, rates=None):
+    """Write a synthetic Systembook CSV with rows loans and return its path"""
+    rng = np.random.default_rng(seed)
+    rates = {**DEFAULT_RATES, **(rates or {})}
+    customers = customers or max(10, rows // 20)
+
+    next_id = 1
+    for start in range(0, rows, CHUNK_ROWS):
+        chunk_rows = min(CHUNK_ROWS, rows - start)
+        chunk = _systembook_chunk(rng, next_id, chunk_rows, customers, rates)
+        next_id += chunk_rows
+
+        # float_format keeps IDs as 1 rather than 1.0, like the real export
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False, float_format='%.0f')
+    return path
+
+
+def generate_customers(path, customers, seed=0, rates=None):
+    """Write a synthetic Customers CSV with one row per customer ID"""
+    rng = np.random.default_rng(seed + 1)
+    rates = {**DEFAULT_RATES, **(rates or {})}
+
+    names = (
+        pd.Series(np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), customers)])
+        + ' '
+        + pd.Series(np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), customers)])
+    )
+    df = pd.DataFrame({'Customer ID': np.arange(1, customers + 1).astype(float), 'Customer Name': names})
+    blank = rng.random(customers) < rates['na']
+    df.loc[blank, ['Customer ID', 'Customer Name']] = np.nan
+
+    df.to_csv(path, index=False, float_format='%.0f')
+    return path
+
+
+def generate_library_data(output_dir, rows, seed=0, rates=None):
+    """Write both CSVs into output_dir with the sample-data file names; returns their paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    customers = max(10, rows // 20)
+    systembook = generate_systembook(os.path.join(output_dir, SYSTEMBOOK_FILE), rows, customers, seed, rates)
+    customers_path = generate_customers(os.path.join(output_dir, CUSTOMERS_FILE), customers, seed, rates)
+    return systembook, customers_path
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else '.'
+    for path in generate_library_data(output_dir, rows):
+        print(f"Wrote {path} ({os.path.getsize(path) / 1024 ** 2:.1f} MB)")
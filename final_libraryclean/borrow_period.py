@@ -0,0 +1,68 @@
+"""
+Borrow-period parsing for the 'Days allowed to borrow' column.
+
+The column is free text: "2 weeks", but also "14 days", "1 month", "3 wks", "a
+fortnight" or a bare "14". parse_borrow_period() reads a number (digits or a word such
+as "two") and a unit, and returns the period in days:
+
+    day(s), d             1
+    week(s), wk(s), w     7
+    fortnight(s)          14
+    month(s), mth(s), mo  30
+    year(s), yr(s), y     365
+
+A bare number is taken as days. Anything else cannot be read and gives None.
+
+Exports repeat a handful of distinct periods over millions of rows, so
+borrow_period_days() parses each distinct value once and maps the results back by
+code: the cost depends on the number of distinct values, not the number of rows.
+"""
+
+import re
+
+import pandas as pd
+
+UNIT_DAYS = {'day': 1, 'week': 7, 'fortnight': 14, 'month': 30, 'year': 365}
+
+UNITS = {
+    **dict.fromkeys(['d', 'day', 'days', 'dy', 'dys'], 'day'),
+    **dict.fromkeys(['w', 'wk', 'wks', 'week', 'weeks'], 'week'),
+    **dict.fromkeys(['fortnight', 'fortnights'], 'fortnight'),
+    **dict.fromkeys(['m', 'mo', 'mos', 'mth', 'mths', 'month', 'months'], 'month'),
+    **dict.fromkeys(['y', 'yr', 'yrs', 'year', 'years'], 'year')
+}
+
+WORD_NUMBERS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12
+}
+
+TOKEN = re.compile(r'\d+(?:\.\d+)?|[a-z]+')
+
+
+def parse_borrow_period(text):
+    """Days in one borrow period such as '2 weeks' or '14 days', or None if it cannot be read"""
+    if not isinstance(text, str):
+        return None
+
+    tokens = TOKEN.findall(text.lower())
+    if len(tokens) == 1:
+        # "fortnight" is one of that unit, "14" is 14 days
+        tokens = ['1', tokens[0]] if tokens[0] in UNITS else [tokens[0], 'days']
+    if len(tokens) != 2 or tokens[1] not in UNITS:
+        return None
+
+    number, unit = tokens
+    try:
+        number = float(WORD_NUMBERS.get(number, number))
+    except ValueError:
+        return None
+    return int(round(number * UNIT_DAYS[UNITS[unit]]))
+
+
+def borrow_period_days(values):
+    """Int64 Series with the days of each borrow period in values, parsing each distinct value once"""
+    codes, uniques = pd.factorize(values)
+    days = pd.array([parse_borrow_period(value) for value in uniques], dtype='Int64')
+    # Missing values have code -1 and come back as <NA>
+    return pd.Series(days.take(codes, allow_fill=True), index=values.index)
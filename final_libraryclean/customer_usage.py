@@ -0,0 +1,146 @@
+"""
+Per-customer library usage for the customer login POC (README "Requirements Update").
+
+customer_usage (CSV, Parquet or Arrow, like the cleaned outputs) has one precomputed row
+per customer, so a customer's page reads a single row instead of scanning every loan:
+
+    Customer ID, Customer Name, loan_count, days_borrowed_total, avg_days_borrowed,
+    overdue_loans, current_loans
+
+The loans are aggregated by Customer ID first and only the aggregate is joined to
+cleaned_customers. Customers without loans get zeros; loans whose Customer ID is not in
+cleaned_customers keep their row with an empty name.
+
+loan_count, days_borrowed_total and overdue_loans are sums, so update() adds the
+aggregates of the loans a run cleaned and subtracts those of the loans it removed (the
+incremental mode of final_data_clean, see incremental.py) instead of aggregating the
+whole output again. current_loans (checked out on or before the as-of date and
+returned after it or not returned at all, i.e. out on that day) changes with the date
+alone, so the loans not yet returned are kept in a small side file and checked again on
+every run.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from writers import WRITERS, cleaned_output_path, read_output, write_dataframe
+
+USAGE_OUTPUT = 'customer_usage'
+OPEN_LOANS_FILE = 'customer_open_loans.parquet'
+
+SUM_COLUMNS = ['loan_count', 'days_borrowed_total', 'overdue_loans']
+USAGE_COLUMNS = ['Customer ID', 'Customer Name'] + SUM_COLUMNS[:2] + ['avg_days_borrowed'] + SUM_COLUMNS[2:] + ['current_loans']
+
+# Loan columns the aggregates are built from (is_overdue and borrow_period_days when present)
+LOAN_COLUMNS = ['Id', 'Customer ID', 'Book checkout', 'Book Returned', 'days_borrowed', 'borrow_period_days', 'is_overdue']
+
+
+def read_loans(path):
+    """The loan columns the aggregates need from a cleaned systembook output"""
+    if path.endswith(WRITERS['csv'].extension):
+        return pd.read_csv(path, usecols=lambda col: col in LOAN_COLUMNS)
+    loans = read_output(path)
+    return loans[[col for col in loans.columns if col in LOAN_COLUMNS]]
+
+
+def overdue_flags(loans):
+    """Loans kept longer than their borrow period (is_overdue if the loans were enriched with it)"""
+    if 'is_overdue' in loans.columns:
+        return loans['is_overdue'].to_numpy(dtype=bool, na_value=False)
+    if 'borrow_period_days' in loans.columns:
+        return (loans['days_borrowed'] > loans['borrow_period_days']).to_numpy(dtype=bool, na_value=False)
+    return np.zeros(len(loans), dtype=bool)
+
+
+def loan_totals(loans):
+    """loan_count, days_borrowed_total and overdue_loans per Customer ID"""
+    if loans is None or len(loans) == 0:
+        return pd.DataFrame({col: pd.Series(dtype='int64') for col in SUM_COLUMNS}, index=pd.Index([], name='Customer ID', dtype='int64'))
+
+    frame = pd.DataFrame({
+        'Customer ID': loans['Customer ID'].to_numpy(dtype='int64'),
+        'loan_count': 1,
+        'days_borrowed_total': loans['days_borrowed'].to_numpy(dtype='int64', na_value=0),
+        'overdue_loans': overdue_flags(loans).astype('int64')
+    })
+    return frame.groupby('Customer ID', sort=False).sum()
+
+
+def not_returned_by(returned, as_of):
+    """Loans returned after as_of, or with no return date yet"""
+    return returned.isna() | (returned > as_of)
+
+
+def open_loans(loans, as_of):
+    """Id, Customer ID and dates of the loans returned after as_of or not returned"""
+    if loans is None or len(loans) == 0:
+        return pd.DataFrame({
+            'Id': pd.Series(dtype='int64'), 'Customer ID': pd.Series(dtype='int64'),
+            'Book checkout': pd.Series(dtype='datetime64[us]'), 'Book Returned': pd.Series(dtype='datetime64[us]')
+        })
+    # CSV outputs hold the dates as ISO text
+    checkout = pd.to_datetime(loans['Book checkout'], format='ISO8601')
+    returned = pd.to_datetime(loans['Book Returned'], format='ISO8601')
+    not_returned = not_returned_by(returned, as_of).to_numpy()
+    return pd.DataFrame({
+        'Id': loans['Id'].to_numpy(dtype='int64')[not_returned],
+        'Customer ID': loans['Customer ID'].to_numpy(dtype='int64')[not_returned],
+        'Book checkout': checkout.to_numpy()[not_returned],
+        'Book Returned': returned.to_numpy()[not_returned]
+    })
+
+
+class CustomerUsage:
+    """The customer_usage output of one output directory, built from its cleaned systembook output"""
+
+    def __init__(self, output_dir, loans_path, output_format='csv', writer_options=None):
+        self.loans_path = loans_path
+        self.output_format = output_format
+        self.writer_options = writer_options or {}
+        self.path = cleaned_output_path(output_dir, USAGE_OUTPUT, output_format)
+        self.open_loans_path = os.path.join(output_dir, OPEN_LOANS_FILE)
+
+    def rebuild(self, customers, loans=None, as_of=None):
+        """Aggregate every loan (loans, or the cleaned output read back) and write the table"""
+        as_of = pd.Timestamp.now().normalize() if as_of is None else pd.Timestamp(as_of)
+        loans = read_loans(self.loans_path) if loans is None else loans
+        return self._write(customers, loan_totals(loans), open_loans(loans, as_of), as_of)
+
+    def update(self, customers, added, removed=None, as_of=None):
+        """Add the aggregates of the added loans and subtract those of the removed ones"""
+        if not (os.path.exists(self.path) and os.path.exists(self.open_loans_path)):
+            # Nothing to update yet: aggregate the whole output, added loans included
+            return self.rebuild(customers, as_of=as_of)
+
+        as_of = pd.Timestamp.now().normalize() if as_of is None else pd.Timestamp(as_of)
+        usage = read_output(self.path)
+        totals = usage[['Customer ID'] + SUM_COLUMNS].astype('int64').set_index('Customer ID')
+        totals = totals.add(loan_totals(added), fill_value=0)
+        totals = totals.sub(loan_totals(removed), fill_value=0)
+
+        still_out = pd.read_parquet(self.open_loans_path)
+        if removed is not None and len(removed):
+            still_out = still_out[~still_out['Id'].isin(removed['Id'])]
+        still_out = pd.concat([still_out, open_loans(added, as_of)], ignore_index=True)
+        return self._write(customers, totals.astype('int64'), still_out, as_of)
+
+    def _write(self, customers, totals, still_out, as_of):
+        still_out = still_out[not_returned_by(still_out['Book Returned'], as_of)]
+        out_now = still_out[still_out['Book checkout'] <= as_of]
+        current = out_now.groupby('Customer ID').size().rename('current_loans')
+
+        names = customers[['Customer ID', 'Customer Name']].astype({'Customer ID': 'int64'}).drop_duplicates('Customer ID')
+        usage = names.merge(totals.reset_index(), on='Customer ID', how='outer')
+        usage = usage.merge(current.reset_index(), on='Customer ID', how='left')
+        usage[SUM_COLUMNS + ['current_loans']] = usage[SUM_COLUMNS + ['current_loans']].fillna(0).astype('int64')
+        usage['avg_days_borrowed'] = (usage['days_borrowed_total'] / usage['loan_count'].replace(0, np.nan)).round(2)
+        # Customers whose loans were all removed, and who are not in cleaned_customers, are dropped
+        usage = usage[usage['Customer Name'].notna() | (usage['loan_count'] > 0)]
+        usage = usage.sort_values('Customer ID', ignore_index=True)[USAGE_COLUMNS]
+
+        write_dataframe(usage, self.path, self.output_format, **self.writer_options)
+        still_out.to_parquet(self.open_loans_path, index=False)
+        print(f"Wrote usage for {len(usage)} customers to {self.path}")
+        return usage
@@ -0,0 +1,92 @@
+"""
+Cached data layer for streamlit_dashboard.py.
+
+- The latest metrics JSON is only re-parsed when its mtime or content hash changes.
+- The run history is read from the SQLite metrics store (metrics_store.py) incrementally
+  by one shared reader, so a refresh only fetches the runs stored since the last one.
+- history_version() identifies the history read so far; figure builders take it as a
+  cache key instead of hashing the whole history frame.
+- Range queries against the SQLite metrics store (metrics_store.py) are cached until a
+  new run is stored.
+- Cleaned outputs are loaded once per file version into st.cache_resource, which hands
+  every session the same frame (st.cache_data would copy it per session), and Arrow IPC
+  outputs are memory-mapped (writers.open_output()), so other dashboard processes share
+  the same page cache pages.
+"""
+
+import hashlib
+import json
+import os
+
+import streamlit as st
+
+from metrics_store import HistoryReader, MetricsStore
+from writers import WRITERS, cleaned_output_path, open_output
+
+
+def file_hash(path):
+    """sha256 of the file contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _read_metrics(path, mtime_ns, content_hash):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_metrics(path):
+    """The metrics JSON, parsed once per (mtime, content hash)"""
+    return _read_metrics(path, os.stat(path).st_mtime_ns, file_hash(path))
+
+
+@st.cache_resource(show_spinner=False)
+def _history_reader(path):
+    return HistoryReader(path)
+
+
+def load_history(path):
+    """(history frame, version) with any runs appended since the last call read in"""
+    reader = _history_reader(path)
+    reader.refresh()
+    return reader.frame(), history_version(reader)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _metric_range(path, dataset, metric_name, last_days, run_count):
+    with MetricsStore(path) as store:
+        return store.metric_range(dataset, metric_name, last_days=last_days)
+
+
+def load_metric_range(path, dataset, metric_name, last_days):
+    """One metric over the last last_days days from the metrics store"""
+    with MetricsStore(path) as store:
+        run_count = store.run_count()
+    return _metric_range(path, dataset, metric_name, last_days, run_count)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _output(path, mtime_ns, size):
+    return open_output(path)
+
+
+def find_cleaned_output(output_dir, name):
+    """The most recently written file of a cleaned output (the Arrow copy, when one is written), or None"""
+    paths = [cleaned_output_path(output_dir, name, fmt) for fmt in WRITERS]
+    paths = [path for path in paths if os.path.exists(path)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def load_output(path):
+    """A cleaned output shared by every session; reloaded when the file changes. Do not modify it in place."""
+    stat = os.stat(path)
+    return _output(path, stat.st_mtime_ns, stat.st_size)
+
+
+def history_version(reader):
+    """Changes whenever new runs are read, used as the cache key for history figures"""
+    return reader.path, reader.last_run_id, reader.run_count
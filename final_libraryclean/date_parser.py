@@ -0,0 +1,111 @@
+"""
+Single-pass date parsing for the cleaning pipeline.
+
+pd.to_datetime(..., dayfirst=True) has to work out the date format every time it is
+called, and dateCleaner used to call it twice per column. Here the format is inferred
+once per source file and column, cached, and every later call (including every chunk
+in streaming mode) parses the column once against that explicit format.
+
+A source that changes format (a file replaced by an export from another system, or a
+caller that passes the same source for several files) is caught: when the cached format
+leaves values unparsed, the format is inferred again from the values at hand and kept
+if it parses more of them.
+
+Benchmark: benchmarks/bench_date_parser.py
+"""
+
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# How many non-null values to try when guessing a column's format
+FORMAT_SAMPLE_SIZE = 100
+
+
+class DateFormatCache:
+    """Cache of inferred date formats keyed by (source file, column)"""
+
+    def __init__(self):
+        self.formats = {}
+
+    def get_format(self, source, column, values, dayfirst=True):
+        """Return the cached format for the column, inferring it from values on first use"""
+        key = (source, column)
+        if key not in self.formats:
+            self.formats[key] = infer_date_format(values, dayfirst=dayfirst)
+        return self.formats[key]
+
+    def set_format(self, source, column, fmt):
+        self.formats[(source, column)] = fmt
+
+    def clear(self):
+        self.formats.clear()
+
+
+# Initialize shared format cache
+date_format_cache = DateFormatCache()
+
+
+def strip_quotes(values):
+    """Remove quote characters from a text column in one vectorized pass"""
+    return values.str.replace('"', '', regex=False)
+
+
+def infer_date_format(values, dayfirst=True):
+    """
+    Guess the strftime format of a text column from its first parseable values.
+
+    Returns None when no format can be guessed, in which case parse_dates falls back to
+    pandas' own per-value parsing.
+    """
+    for value in values.dropna().head(FORMAT_SAMPLE_SIZE):
+        fmt = guess_datetime_format(value, dayfirst=dayfirst)
+        if fmt is not None:
+            return fmt
+    return None
+
+
+def parse_dates(values, source=None, column=None, cache=date_format_cache, dayfirst=True):
+    """
+    Strip quotes from a text column and convert it to datetime in a single parse.
+
+    Loan dates repeat heavily (one value per calendar day), so the column is factorized
+    and only its distinct values are stripped and parsed, then mapped back by code.
+
+    Returns (parsed, invalid) where invalid is a boolean Series marking values that
+    could not be parsed, so callers do not need to parse the column a second time.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, values.isna()
+
+    codes, uniques = pd.factorize(values)
+    uniques = strip_quotes(pd.Series(uniques, dtype=str))
+
+    column = column if column is not None else values.name
+    fmt = cache.get_format(source, column, uniques, dayfirst=dayfirst)
+    parsed_uniques = _parse_uniques(uniques, fmt, dayfirst)
+
+    failed = parsed_uniques.isna().sum() - uniques.isna().sum()
+    if fmt is not None and failed:
+        # Values the cached format cannot read: check it still is the format of this data
+        fresh = infer_date_format(uniques[parsed_uniques.isna()], dayfirst=dayfirst)
+        if fresh is not None and fresh != fmt:
+            reparsed = _parse_uniques(uniques, fresh, dayfirst)
+            if reparsed.isna().sum() < parsed_uniques.isna().sum():
+                print(f"Date format of '{column}' in {source} changed from {fmt} to {fresh}")
+                cache.set_format(source, column, fresh)
+                parsed_uniques = reparsed
+
+    # Missing values have code -1 and come back as NaT (take() refuses an all-missing column)
+    parsed_uniques = pd.DatetimeIndex(parsed_uniques)
+    if len(parsed_uniques):
+        parsed = parsed_uniques.take(codes, allow_fill=True, fill_value=pd.NaT)
+    else:
+        parsed = pd.DatetimeIndex([pd.NaT] * len(codes), dtype=parsed_uniques.dtype)
+    parsed = pd.Series(parsed, index=values.index, name=values.name)
+    return parsed, parsed.isna()
+
+
+def _parse_uniques(uniques, fmt, dayfirst):
+    if fmt is None:
+        return pd.to_datetime(uniques, dayfirst=dayfirst, errors='coerce')
+    return pd.to_datetime(uniques, format=fmt, errors='coerce')
@@ -0,0 +1,169 @@
+"""
+Hash-based, memory-bounded duplicate elimination for streamed inputs.
+
+Every row is reduced to a 64-bit digest and only the digests of rows already kept are
+remembered. Digests are held as sorted numpy runs (8 bytes per unique row) and, once
+they grow past the memory budget, spilled to disk. A spill is split into a fixed number
+of hash partitions on the top bits of the digest, and each partition keeps its own
+sorted run files, merged when they are of similar size, so a partition only ever has a
+logarithmic number of runs. A digest is only looked up in its own partition's runs,
+which are memory-mapped and searched with binary search, so a lookup only touches a
+handful of pages instead of loading the runs back into RAM or searching every spill.
+
+Rows are kept in first-seen order, so the output and the duplicates_dropped count match
+df.drop_duplicates() on the whole file. Two different rows would only be confused if
+their 64-bit digests collided (odds of roughly n^2 / 2^65 for n unique rows).
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Spilled digests are split on their top SPILL_PARTITION_BITS bits
+SPILL_PARTITION_BITS = 6
+SPILL_PARTITIONS = 2 ** SPILL_PARTITION_BITS
+# First digest of each partition after the first
+PARTITION_STARTS = np.arange(1, SPILL_PARTITIONS, dtype=np.uint64) << np.uint64(64 - SPILL_PARTITION_BITS)
+
+
+def row_digests(df):
+    """64-bit hash of each row's values (index ignored, NaNs hash equal like drop_duplicates)"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _contains(run, keys):
+    """Boolean mask of which sorted keys are present in a sorted run"""
+    if len(run) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.searchsorted(run, keys)
+    positions[positions == len(run)] = len(run) - 1
+    return run[positions] == keys
+
+
+def _partition_bounds(keys):
+    """Start and end offsets of each spill partition's digests in the sorted keys"""
+    bounds = np.concatenate([[0], np.searchsorted(keys, PARTITION_STARTS), [len(keys)]])
+    return zip(bounds[:-1], bounds[1:])
+
+
+def _merge_similar_runs(runs, merge):
+    """Merge the newest runs while they are of similar size, so lookups only search a logarithmic number of runs"""
+    while len(runs) > 1 and len(runs[-2]) <= 2 * len(runs[-1]):
+        newest = runs.pop()
+        previous = runs.pop()
+        runs.append(merge(previous, newest))
+
+
+def _merge_in_memory(previous, newest):
+    return np.sort(np.concatenate([previous, newest]))
+
+
+class HashDeduplicator:
+    """Remembers the rows seen across chunks and drops repeats, spilling to disk past memory_budget bytes"""
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, spill_dir=None):
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.memory_runs = []
+        # Sorted, memory-mapped run files of each spill partition
+        self.partitions = [[] for _ in range(SPILL_PARTITIONS)]
+        self.spills = 0
+        self.files_written = 0
+        self.rows_seen = 0
+        self.rows_kept = 0
+        self._owns_spill_dir = False
+
+    @property
+    def duplicates_dropped(self):
+        return self.rows_seen - self.rows_kept
+
+    @property
+    def memory_bytes(self):
+        return sum(run.nbytes for run in self.memory_runs)
+
+    def keep_mask(self, df):
+        """Boolean array marking the rows of df that have not been seen before"""
+        digests = row_digests(df)
+        keys, first_index = np.unique(digests, return_index=True)
+
+        seen = np.zeros(len(keys), dtype=bool)
+        for run in self.memory_runs:
+            seen |= _contains(run, keys)
+        if self.spills:
+            for runs, (start, end) in zip(self.partitions, _partition_bounds(keys)):
+                for run in runs:
+                    seen[start:end] |= _contains(run, keys[start:end])
+
+        mask = np.zeros(len(digests), dtype=bool)
+        mask[first_index[~seen]] = True
+        self._add(keys[~seen])
+
+        self.rows_seen += len(digests)
+        self.rows_kept += int(mask.sum())
+        return mask
+
+    def drop_duplicates(self, df):
+        """Return df without rows seen earlier in this chunk or in previous chunks"""
+        return df[self.keep_mask(df)].reset_index(drop=True)
+
+    def _add(self, keys):
+        if len(keys) == 0:
+            return
+        self.memory_runs.append(keys)
+        _merge_similar_runs(self.memory_runs, _merge_in_memory)
+
+        if self.memory_bytes > self.memory_budget:
+            self._spill()
+
+    def _spill(self):
+        """Write the in-memory digests to disk, one sorted run per partition, and memory-map them"""
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='dedupe_')
+            self._owns_spill_dir = True
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+        run = np.sort(np.concatenate(self.memory_runs))
+        merged_paths = []
+        for partition, (runs, (start, end)) in enumerate(zip(self.partitions, _partition_bounds(run))):
+            if start == end:
+                continue
+            runs.append(self._write_run(partition, run[start:end]))
+            _merge_similar_runs(runs, lambda previous, newest: self._merge_spilled(partition, previous, newest,
+                                                                                   merged_paths))
+        # Only removed once nothing maps them any more (Windows cannot remove a mapped file)
+        for path in merged_paths:
+            os.remove(path)
+        self.memory_runs = []
+        self.spills += 1
+        print(f"Dedupe spilled {len(run)} row hashes to {self.spill_dir}")
+
+    def _write_run(self, partition, run):
+        path = os.path.join(self.spill_dir, f'part_{partition:02d}_{self.files_written:06d}.u64')
+        run.tofile(path)
+        self.files_written += 1
+        return np.memmap(path, dtype=np.uint64, mode='r')
+
+    def _merge_spilled(self, partition, previous, newest, merged_paths):
+        """Merge two run files of a partition into a new one; a partition holds 1/SPILL_PARTITIONS of the digests"""
+        merged_paths += [previous.filename, newest.filename]
+        return self._write_run(partition, _merge_in_memory(previous, newest))
+
+    def close(self):
+        """Release the spilled runs and remove any spill directory this instance created"""
+        self.partitions = [[] for _ in range(SPILL_PARTITIONS)]
+        self.memory_runs = []
+        if self._owns_spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+            self._owns_spill_dir = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
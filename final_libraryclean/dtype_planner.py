@@ -0,0 +1,113 @@
+"""
+Pick compact column dtypes before a CSV is read.
+
+Left to itself read_csv loads IDs with blanks as float64 and every text column as
+full Python/Arrow strings. The planner reads a sample of the file and chooses:
+
+- Int32 (nullable) for whole-number columns such as Id and Customer ID, or Int64 if
+  the sample gets near the Int32 range; a column counts as numbers when at least
+  NUMBER_MIN_SHARE of its sampled values are, so a stray 'abc' does not make it text
+- category for text columns that repeat, such as Books, Days allowed to borrow and the
+  loan dates (one value per calendar day)
+- the pandas default for everything else (e.g. Customer Name)
+
+Date columns stay categorical on load and are turned into datetime64 by dateCleaner,
+which parses each category once. Parsing them at read time would turn invalid dates
+into blanks, and they would be dropped as NAs instead of being reported as invalid dates.
+"""
+
+import pandas as pd
+
+DEFAULT_SAMPLE_ROWS = 100_000
+
+# A text column becomes a category when its sample has at most this share of distinct values
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Switch to Int64 well before Int32 overflows, as IDs keep growing past the sample
+INT32_LIMIT = 2 ** 31 // 4
+
+# Share of a sample's values that must be numbers for the column to be read as numbers
+NUMBER_MIN_SHARE = 0.9
+
+
+def sample_numbers(values):
+    """The non-missing sample values as numbers, or None if the column is not a number column"""
+    values = values.dropna()
+    if values.empty or pd.api.types.is_bool_dtype(values):
+        return None
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    # Each distinct value is parsed once, weighted by how often it occurs
+    counts = values.value_counts()
+    numbers = pd.to_numeric(counts.index.to_series(), errors='coerce').to_numpy()
+    if counts[~pd.isna(numbers)].sum() < NUMBER_MIN_SHARE * len(values):
+        return None
+    return pd.to_numeric(values, errors='coerce').dropna()
+
+
+def plan_column(sample):
+    """Compact dtype for one column, judged from a sample of its values"""
+    values = sample.dropna()
+    if values.empty:
+        return None
+
+    if pd.api.types.is_bool_dtype(values):
+        return None
+
+    numbers = sample_numbers(values)
+    if numbers is not None:
+        if (numbers % 1 == 0).all():
+            return 'Int32' if numbers.abs().max() < INT32_LIMIT else 'Int64'
+        return None
+
+    if values.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(values):
+        return 'category'
+    return None
+
+
+def plan_dtypes(filepath, sample_rows=DEFAULT_SAMPLE_ROWS):
+    """{column: dtype} for the columns that can be read more compactly than the default"""
+    sample = pd.read_csv(filepath, nrows=sample_rows)
+    plan = {}
+    for col in sample.columns:
+        dtype = plan_column(sample[col])
+        if dtype is not None:
+            plan[col] = dtype
+    return plan
+
+
+def read_planned_csv(filepath, sample_rows=DEFAULT_SAMPLE_ROWS):
+    """
+    Read a CSV with planned dtypes.
+
+    The pyarrow engine builds the categories while parsing, which is faster than the
+    default engine with or without the plan. If a value past the sample does not fit
+    the plan (e.g. text in an ID column) the file is read again with the default
+    dtypes, and a value that is not a number in a planned number column is read as
+    missing so naCleaner rejects its row. The streaming and parallel runners read such
+    values the same way (streaming.convert_pinned), so all runners keep the same rows.
+    """
+    plan = plan_dtypes(filepath, sample_rows)
+    try:
+        return pd.read_csv(filepath, dtype=plan, engine='pyarrow')
+    except (ValueError, TypeError, OverflowError) as e:
+        print(f"Warning: planned dtypes did not fit {filepath} ({e}), reading with default dtypes")
+        df = pd.read_csv(filepath)
+        for col, dtype in plan.items():
+            if dtype in ('Int32', 'Int64') and not pd.api.types.is_numeric_dtype(df[col]):
+                numbers = pd.to_numeric(df[col], errors='coerce')
+                print(f"Warning: {int((numbers.isna() & df[col].notna()).sum())} value(s) in '{col}' are not "
+                      f"numbers, reading them as missing")
+                df[col] = numbers
+        return df
+
+
+def memory_report(df):
+    """Memory use of a frame: total MB, bytes per row and bytes per row of each column"""
+    usage = df.memory_usage(deep=True, index=False)
+    rows = max(len(df), 1)
+    return {
+        'total_mb': round(usage.sum() / 1024 ** 2, 2),
+        'bytes_per_row': round(usage.sum() / rows, 1),
+        'columns': {col: round(value / rows, 1) for col, value in usage.items()}
+    }
@@ -0,0 +1,156 @@
+"""
+Incremental runs: only clean source rows that are new or changed since the last run.
+
+A manifest in the output directory keeps a fingerprint (64-bit hash) of every source row
+already processed, together with the row's key (Id). Each run fingerprints the current
+source file, cleans only the rows whose fingerprint is not in the manifest and merges
+them into the existing cleaned output. Rows whose fingerprint disappeared (edited or
+deleted in the source) are removed from the output by key before the merge, so an edited
+loan replaces its old version.
+
+Rows rejected for a reason that depends on other data rather than on the row itself
+(RECHECKED_REASONS: a loan whose customer is not in the customers output yet) are left
+out of the manifest, so every run checks them again until they pass.
+
+The manifest also carries running totals of the pipeline metrics, so each run can report
+its own delta as well as the totals across all runs.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dedupe import row_digests
+from quarantine import REASON_COLUMN, ROW_COLUMN
+from streaming import NON_ADDITIVE_METRICS
+from writers import read_output, write_dataframe
+
+# Metrics whose total is the latest value rather than the sum over runs
+LATEST_VALUE_METRICS = NON_ADDITIVE_METRICS | {'source_row_count'}
+
+# Reject reasons (prefixes) whose rows are cleaned again by the next run
+RECHECKED_REASONS = ('orphan:',)
+
+
+def row_fingerprints(df):
+    """Row hashes that do not change when pandas reads an ID column as int one run and float the next"""
+    canonical = df.copy()
+    for col in canonical.columns:
+        if pd.api.types.is_numeric_dtype(canonical[col]) and not pd.api.types.is_bool_dtype(canonical[col]):
+            canonical[col] = canonical[col].astype('float64')
+    return row_digests(canonical)
+
+
+class RowManifest:
+    """Fingerprints of the source rows already processed, plus running metric totals"""
+
+    def __init__(self, output_dir, name, key='Id'):
+        self.key = key
+        self.path = f'{output_dir}/{name}_manifest.parquet'
+        self.totals_path = f'{output_dir}/{name}_manifest.json'
+        self.fingerprints = pd.DataFrame({'fingerprint': np.array([], dtype=np.uint64), 'key': []})
+        self.state = {'runs': 0, 'totals': {}}
+        self.pending = None
+        self.new_fingerprints = None
+
+        if os.path.exists(self.path):
+            self.fingerprints = pd.read_parquet(self.path)
+        if os.path.exists(self.totals_path):
+            with open(self.totals_path, 'r') as f:
+                self.state = json.load(f)
+
+    @property
+    def totals(self):
+        return self.state['totals']
+
+    def select_changes(self, df):
+        """
+        Split the source frame into the rows that still need cleaning.
+
+        Returns (new_rows, removed_keys): new_rows are the rows not seen in an earlier run,
+        removed_keys are the keys of rows that were processed before but are no longer in
+        the source. The manifest is only updated on save().
+        """
+        fingerprints = row_fingerprints(df)
+        is_new = ~np.isin(fingerprints, self.fingerprints['fingerprint'].to_numpy())
+
+        current = pd.DataFrame({'fingerprint': fingerprints, 'key': df[self.key].to_numpy()})
+        current = current.drop_duplicates('fingerprint').reset_index(drop=True)
+        gone = ~self.fingerprints['fingerprint'].isin(current['fingerprint'])
+        removed_keys = self.fingerprints.loc[gone, 'key'].dropna().unique()
+
+        self.pending = current
+        self.new_fingerprints = fingerprints[is_new]
+        return df[is_new].reset_index(drop=True), removed_keys
+
+    def recheck(self, rejected):
+        """
+        Leave the new rows rejected for one of RECHECKED_REASONS out of the fingerprints
+        save() keeps, so the next run cleans them again. rejected are the batches of
+        rejected rows (see quarantine.run_steps) of the frame select_changes() returned.
+        """
+        rows = [
+            batch.loc[batch[REASON_COLUMN].str.startswith(RECHECKED_REASONS), ROW_COLUMN].to_numpy(dtype=np.int64)
+            for batch in rejected
+        ]
+        if rows:
+            recheck = self.new_fingerprints[np.concatenate(rows)]
+            self.pending = self.pending[~self.pending['fingerprint'].isin(recheck)].reset_index(drop=True)
+
+    def add_run_metrics(self, run_metrics):
+        """Add this run's metrics to the running totals and return the totals"""
+        totals = self.state['totals']
+        for metric, value in run_metrics.items():
+            if metric in LATEST_VALUE_METRICS:
+                totals[metric] = value
+            elif metric != 'data_retention_rate':
+                totals[metric] = totals.get(metric, 0) + value
+
+        if totals.get('initial_row_count'):
+            totals['data_retention_rate'] = round((totals['final_row_count'] / totals['initial_row_count']) * 100, 2)
+        self.state['runs'] += 1
+        return totals
+
+    def save(self):
+        """Persist the fingerprints seen this run and the running totals"""
+        if self.pending is not None:
+            self.fingerprints = self.pending
+            self.pending = None
+        self.fingerprints.to_parquet(self.path, index=False)
+        with open(self.totals_path, 'w') as f:
+            json.dump(self.state, f, indent=4, default=int)
+
+
+def removed_rows(path, removed_keys, key='Id'):
+    """The rows of an existing cleaned output that merge_into_output() will remove, or None"""
+    if len(removed_keys) == 0 or not os.path.exists(path):
+        return None
+    existing = read_output(path)
+    return existing[existing[key].isin(removed_keys)].reset_index(drop=True)
+
+
+def merge_into_output(cleaned, path, output_format, removed_keys=(), key='Id', writer_options=None):
+    """
+    Merge newly cleaned rows into an existing cleaned output file.
+
+    Rows whose key is in removed_keys are dropped from the existing output first. When
+    nothing has to be removed from a CSV output the new rows are simply appended.
+    """
+    writer_options = writer_options or {}
+    if not os.path.exists(path):
+        return write_dataframe(cleaned, path, output_format, **writer_options)
+
+    if output_format == 'csv' and len(removed_keys) == 0:
+        if len(cleaned):
+            cleaned.to_csv(path, mode='a', header=False, index=False, compression=writer_options.get('compression'))
+        return path
+
+    existing = read_output(path)
+    existing = existing[~existing[key].isin(removed_keys)]
+    if len(cleaned):
+        # CSV outputs come back as text, so restore the types of the freshly cleaned rows
+        existing = existing.astype(cleaned.dtypes.to_dict())
+        existing = pd.concat([existing, cleaned], ignore_index=True)
+    return write_dataframe(existing.reset_index(drop=True), path, output_format, **writer_options)
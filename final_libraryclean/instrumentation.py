@@ -0,0 +1,139 @@
+"""
+Per-step timing, memory and throughput for the cleaner functions.
+
+Decorate a cleaner with @instrumented and every call records, under its dataset:
+
+    calls           - number of calls (one per chunk/partition when streaming)
+    wall_seconds    - elapsed time
+    cpu_seconds     - CPU time of this process
+    rows_in         - rows handed to the step (rows read, for fileLoader)
+    rows_out        - rows returned by the step
+                      (both count only the still valid rows when the step marks
+                      rejects in a RowValidity, see quarantine.py)
+    rows_per_second - rows_in / wall_seconds
+    peak_alloc_mb   - peak Python allocations above the start of the step
+                      (only while tracemalloc is tracing, it slows the pipeline down)
+    rss_growth_mb   - how much the step raised the peak resident memory of the process
+                      (0 when it stayed under the peak of earlier steps)
+    peak_rss_mb     - peak resident memory of the process so far, cumulative over the
+                      whole run rather than per step
+
+A memory figure that cannot be measured is left out rather than recorded as None.
+
+The timings go to metrics_logger.log_step_timing() of the module the cleaner is
+defined in, next to the row-count metrics.
+"""
+
+import functools
+import inspect
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Timings that add up across calls; the peak memory figures keep their maximum
+ADDITIVE_TIMINGS = ('calls', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out')
+ADDITIVE_MEMORY_TIMINGS = ('rss_growth_mb',)
+PEAK_TIMINGS = ('peak_alloc_mb', 'peak_rss_mb')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if it cannot be read"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in KB on Linux
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 2)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 2)
+    return None
+
+
+def rss_timings(rss_start):
+    """peak_rss_mb and rss_growth_mb of a step that started at peak RSS rss_start ({} if RSS cannot be read)"""
+    rss = peak_rss_mb()
+    if rss is None or rss_start is None:
+        return {}
+    return {'rss_growth_mb': round(rss - rss_start, 2), 'peak_rss_mb': rss}
+
+
+def merge_timings(total, timings):
+    """Add the timings of one call to the running total for a step"""
+    total = dict(total or {})
+    for key in ADDITIVE_TIMINGS:
+        total[key] = total.get(key, 0) + timings.get(key, 0)
+    for key in ADDITIVE_MEMORY_TIMINGS:
+        if key in total or key in timings:
+            total[key] = round(total.get(key, 0) + timings.get(key, 0), 2)
+    for key in PEAK_TIMINGS:
+        values = [value for value in (total.get(key), timings.get(key)) if value is not None]
+        if values:
+            total[key] = max(values)
+
+    total['wall_seconds'] = round(total['wall_seconds'], 6)
+    total['cpu_seconds'] = round(total['cpu_seconds'], 6)
+    total['rows_per_second'] = round(total['rows_in'] / total['wall_seconds']) if total['wall_seconds'] else None
+    return total
+
+
+def flatten_timings(step_timings):
+    """{dataset: {step: timings}} -> [(dataset, 'step_measure', value)] rows for flat outputs"""
+    rows = []
+    for dataset, steps in step_timings.items():
+        for step, timings in steps.items():
+            for measure, value in timings.items():
+                if value is not None:
+                    rows.append((dataset, f'{step}_{measure}', value))
+    return rows
+
+
+def valid_rows(df, validity):
+    """Rows a step works on: the still valid ones if it is given a RowValidity"""
+    return int(validity.valid.sum()) if validity is not None else len(df)
+
+
+def instrumented(func):
+    """Record timing, memory and row throughput for every call of a cleaner"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs).arguments
+        df = arguments.get('df')
+        validity = arguments.get('validity')
+        rows_in = valid_rows(df, validity) if df is not None else None
+
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            alloc_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        rss_start = peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        result = func(*args, **kwargs)
+
+        timings = {
+            'calls': 1,
+            'wall_seconds': time.perf_counter() - wall_start,
+            'cpu_seconds': time.process_time() - cpu_start,
+            'rows_in': rows_in if rows_in is not None else len(result),
+            'rows_out': valid_rows(result, validity),
+            **rss_timings(rss_start)
+        }
+        if tracing:
+            timings['peak_alloc_mb'] = round((tracemalloc.get_traced_memory()[1] - alloc_start) / (1024 * 1024), 2)
+        metrics_logger = sys.modules[func.__module__].metrics_logger
+        metrics_logger.log_step_timing(arguments['dataset_name'], func.__name__, timings)
+        return result
+
+    return wrapper
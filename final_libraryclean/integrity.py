@@ -0,0 +1,101 @@
+"""
+Referential integrity between datasets, e.g. each loan's Customer ID against the
+Customer IDs of cleaned_customers.
+
+IdSet holds the IDs of the referenced output once, compactly, and checks a whole column
+against them in one vectorized pass, so the loans are never merged with the customers:
+
+- dense IDs (the usual 1..N customer numbers) go into a packed bitmap over
+  [lowest, highest] ID, one bit per possible ID
+- sparse IDs go into a sorted array, looked up through the hash table pandas builds
+  over it on the first lookup
+
+An ID is in the set only if it is a whole number; missing IDs are not orphans (naCleaner
+rejects those). The set is plain arrays, so it is built once and shared by every chunk of
+the streaming runner and pickled to the parallel runner's workers.
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from writers import WRITERS, read_output
+
+# Use the bitmap while it costs no more than this many bits per ID in the set (a sorted
+# int64 array costs 64)
+BITMAP_BITS_PER_ID = 64
+
+
+def integer_ids(values):
+    """(int64 array, mask of the values that are whole numbers) for a column of IDs"""
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy(dtype='int64', na_value=0), values.notna().to_numpy()
+    if not pd.api.types.is_float_dtype(values.dtype):
+        values = pd.to_numeric(values, errors='coerce')
+
+    numbers = values.to_numpy(dtype='float64', na_value=np.nan)
+    whole = np.isfinite(numbers) & (numbers == np.floor(numbers))
+    return np.where(whole, numbers, 0).astype('int64'), whole
+
+
+class IdSet:
+    """Compact set of integer IDs: a packed bitmap when the IDs are dense, else a sorted array"""
+
+    def __init__(self, ids):
+        ids, whole = integer_ids(ids)
+        ids = ids[whole]
+        self.low = int(ids.min()) if len(ids) else 0
+        self.span = int(ids.max()) - self.low + 1 if len(ids) else 0
+
+        self.bitmap, self.sorted_ids = None, None
+        if self.span <= BITMAP_BITS_PER_ID * len(ids):
+            bits = np.zeros(self.span, dtype=bool)
+            bits[ids - self.low] = True
+            self.size = int(bits.sum())
+            self.bitmap = np.packbits(bits, bitorder='little')
+        else:
+            ids = np.sort(ids)
+            ids = ids[np.concatenate(([True], ids[1:] != ids[:-1]))]
+            self.size = len(ids)
+            self.sorted_ids = pd.Index(ids)
+
+    @classmethod
+    def from_output(cls, path, column):
+        """The IDs in column of a cleaned output (CSV, Parquet or Arrow), reading only that column"""
+        if path.endswith(WRITERS['csv'].extension):
+            return cls(pd.read_csv(path, usecols=[column])[column])
+        return cls(read_output(path)[column])
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """Bytes held by the bitmap or the sorted array (not counting the hash table of a sorted array)"""
+        return (self.bitmap if self.bitmap is not None else self.sorted_ids).nbytes
+
+    def cache_token(self):
+        """Hash of the IDs, for step_cache.py"""
+        ids = self.bitmap if self.bitmap is not None else self.sorted_ids.to_numpy()
+        return hashlib.blake2b(ids.tobytes() + str(self.low).encode(), digest_size=16).hexdigest()
+
+    def contains(self, values):
+        """Boolean array: is each value an ID in the set"""
+        ids, whole = integer_ids(values)
+        if not self.size:
+            return np.zeros(len(ids), dtype=bool)
+
+        if self.bitmap is not None:
+            offsets = ids - self.low
+            inside = whole & (offsets >= 0) & (offsets < self.span)
+            offsets = np.where(inside, offsets, 0)
+            return inside & ((self.bitmap[offsets >> 3] >> (offsets & 7)) & 1).astype(bool)
+
+        return whole & (self.sorted_ids.get_indexer(ids) >= 0)
+
+    def orphans(self, values):
+        """Boolean array: does each value reference an ID that is not in the set (missing values do not)"""
+        values = values if isinstance(values, pd.Series) else pd.Series(values)
+        return values.notna().to_numpy() & ~self.contains(values)
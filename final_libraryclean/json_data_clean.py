@@ -3,7 +3,24 @@
 import pandas as pd
 import os
 import json
+import tracemalloc
 from datetime import datetime
+from functools import partial
+
+from borrow_period import borrow_period_days
+from customer_usage import CustomerUsage
+from date_parser import parse_dates
+from dtype_planner import read_planned_csv
+from instrumentation import instrumented, merge_timings
+from integrity import IdSet
+from metrics_store import MetricsStore, store_path
+from multi_file import clean_files, expand_inputs, is_multi_input
+from overdue import FINE_PENCE_PER_DAY, overdue_columns
+from quarantine import QuarantineSink, RowValidity, quarantine_path
+from step_cache import StepCache, run_cached_steps
+from streaming import stream_clean
+from title_normalizer import TitleCatalog, assign_title_ids, title_catalog, title_catalog_path
+from writers import cleaned_output_path, write_dataframe, write_mapped_copy
 
 class MetricsLogger:
     """Class to track and log data cleaning metrics"""
@@ -14,6 +31,8 @@ class MetricsLogger:
             'systembook_metrics': {},
             'customers_metrics': {}
         }
+        # Per-step wall/CPU time, memory and rows/sec for each dataset (see instrumentation.py)
+        self.step_timings = {}
     
     def log_metric(self, dataset, metric_name, value):
         """Log a metric for a specific dataset"""
@@ -21,15 +40,26 @@ class MetricsLogger:
             self.metrics[dataset] = {}
         self.metrics[dataset][metric_name] = value
     
+    def log_step_timing(self, dataset, step, timings):
+        """Add the timings of one step call to the step's totals for this run"""
+        steps = self.step_timings.setdefault(dataset, {})
+        steps[step] = merge_timings(steps.get(step), timings)
+    
     def save_metrics(self, output_path):
         """Save metrics to a JSON file"""
         try:
             with open(output_path, 'w') as f:
-                json.dump(self.metrics, f, indent=4)
+                json.dump({**self.metrics, 'step_timings': self.step_timings}, f, indent=4)
             print(f"Metrics saved to {output_path}")
         except Exception as e:
             print(f"Error saving metrics: {e}")
     
+    def save_to_store(self, path):
+        """Append this run to the SQLite metrics store (see metrics_store.py)"""
+        datasets = {k: v for k, v in self.metrics.items() if k != 'execution_timestamp'}
+        with MetricsStore(path) as store:
+            return store.append_run(self.metrics['execution_timestamp'], datasets, self.step_timings)
+    
     def print_summary(self):
         """Print a summary of all metrics"""
         print("\n" + "="*60)
@@ -40,69 +70,141 @@ class MetricsLogger:
                 print(f"\n{dataset.upper()}:")
                 for metric, value in metrics.items():
                     print(f"  {metric}: {value}")
+        for dataset, steps in self.step_timings.items():
+            print(f"\n{dataset.upper()} STEP TIMINGS:")
+            for step, timings in steps.items():
+                print(f"  {step}: {timings['wall_seconds']:.4f}s wall, {timings['cpu_seconds']:.4f}s CPU, "
+                      f"{timings['rows_per_second']} rows/s, peak RSS +{timings.get('rss_growth_mb', 0)} MB")
         print("="*60 + "\n")
 
 # Initialize global metrics logger
 metrics_logger = MetricsLogger()
 
 # Function to output dataframe that can be manipulated via a filepath
+@instrumented
 def fileLoader(filepath, dataset_name):
-    data = pd.read_csv(filepath)
+    # Compact dtypes (nullable ints, categories) are chosen before reading, see dtype_planner.py
+    data = read_planned_csv(filepath)
     initial_rows = len(data)
     metrics_logger.log_metric(dataset_name, 'initial_row_count', initial_rows)
     print(f"Loaded {initial_rows} rows from {filepath}")
     return data 
 
 # Duplicate Dropping Function
-def duplicateCleaner(df, dataset_name):
-    initial_count = len(df)
-    df_cleaned = df.drop_duplicates().reset_index(drop=True)
-    duplicates_dropped = initial_count - len(df_cleaned)
+# The row filters below take an optional RowValidity: given one they only mark the rows they
+# reject and return df unfiltered, the clean rows are split off once by run_steps (see quarantine.py)
+@instrumented
+def duplicateCleaner(df, dataset_name, validity=None):
+    rows = RowValidity(df) if validity is None else validity
+    duplicates_dropped = rows.reject(df.duplicated(), 'duplicate')
     metrics_logger.log_metric(dataset_name, 'duplicates_dropped', duplicates_dropped)
     print(f"Dropped {duplicates_dropped} duplicate rows")
-    return df_cleaned
+    return rows.clean(df) if validity is None else df
 
 # NA handler - future scope can handle errors more elegantly. 
-def naCleaner(df, dataset_name):
-    initial_count = len(df)
-    na_count = df.isna().sum().sum()
+@instrumented
+def naCleaner(df, dataset_name, validity=None):
+    rows = RowValidity(df) if validity is None else validity
+    na_cells = df.isna().to_numpy()
+    na_count = na_cells[rows.valid].sum()
     metrics_logger.log_metric(dataset_name, 'blank_cells_found', int(na_count))
     
-    df_cleaned = df.dropna().reset_index(drop=True)
-    na_rows_dropped = initial_count - len(df_cleaned)
+    na_rows_dropped = rows.reject(na_cells.any(axis=1), 'missing_values')
     metrics_logger.log_metric(dataset_name, 'na_rows_dropped', na_rows_dropped)
     print(f"Found {na_count} blank cells, dropped {na_rows_dropped} rows with NAs")
-    return df_cleaned
+    return rows.clean(df) if validity is None else df
 
 # Turning date columns into datetime
-def dateCleaner(col, df, dataset_name):
-    initial_count = len(df)
-    
-    # Strip any quotes from dates
-    df[col] = df[col].str.replace('"', "", regex=True)
+@instrumented
+def dateCleaner(col, df, dataset_name, source=None, validity=None):
+    rows = RowValidity(df) if validity is None else validity
 
-    try:
-        df[col] = pd.to_datetime(df[col], dayfirst=True, errors='coerce')
-    except Exception as e:
-        print(f"Error while converting column {col} to datetime: {e}")
-
-    # Identify rows with invalid dates
-    error_flag = pd.to_datetime(df[col], dayfirst=True, errors='coerce').isna()
-    invalid_dates = error_flag.sum()
-    
-    # Keep only valid rows in df
-    df = df[~error_flag].copy()
+    # Strip quotes and parse the column once against the cached format for this source file
+    rows.keep_original(df, col)
+    df[col], error_flag = parse_dates(df[col], source=source, column=col)
     
-    # Reset index for the cleaned DataFrame
-    df.reset_index(drop=True, inplace=True)
+    # Rows with an invalid date are rejected (and quarantined by run_steps)
+    invalid_dates = rows.reject(error_flag, f'invalid_date:{col}')
     
-    rows_dropped = initial_count - len(df)
-    metrics_logger.log_metric(dataset_name, f'{col}_invalid_dates', int(invalid_dates))
-    metrics_logger.log_metric(dataset_name, f'{col}_rows_dropped', rows_dropped)
-    print(f"Found {invalid_dates} invalid dates in '{col}', dropped {rows_dropped} rows")
+    metrics_logger.log_metric(dataset_name, f'{col}_invalid_dates', invalid_dates)
+    metrics_logger.log_metric(dataset_name, f'{col}_rows_dropped', invalid_dates)
+    print(f"Found {invalid_dates} invalid dates in '{col}', dropped {invalid_dates} rows")
     
-    return df
+    return rows.clean(df) if validity is None else df
+
+@instrumented
+def datesCleaner(columns, df, dataset_name, source=None, validity=None):
+    """
+    dateCleaner for several columns in one pass: every column is parsed, then the rows
+    with an invalid date in any of them are dropped with a single filter and copy.
+    Logs the same metrics as calling dateCleaner column by column.
+    """
+    rows = RowValidity(df) if validity is None else validity
+    for col in columns:
+        rows.keep_original(df, col)
+        df[col], error_flag = parse_dates(df[col], source=source, column=col)
+
+        # Only counts rows an earlier column has not already rejected
+        invalid_dates = rows.reject(error_flag, f'invalid_date:{col}')
+        metrics_logger.log_metric(dataset_name, f'{col}_invalid_dates', invalid_dates)
+        metrics_logger.log_metric(dataset_name, f'{col}_rows_dropped', invalid_dates)
+        print(f"Found {invalid_dates} invalid dates in '{col}', dropped {invalid_dates} rows")
+
+    return rows.clean(df) if validity is None else df
+
+@instrumented
+def referenceCleaner(col, df, dataset_name, known_ids, validity=None):
+    """
+    Rejects the rows whose ID in col is not one of known_ids, an IdSet of the IDs in the dataset col refers to (e.g. the Customer IDs of cleaned_customers).
+    The whole column is checked in one pass against the set (see integrity.py); missing IDs are left to naCleaner.
+    """
+    rows = RowValidity(df) if validity is None else validity
+
+    orphan_count = rows.reject(known_ids.orphans(df[col]), f'orphan:{col}')
+    metrics_logger.log_metric(dataset_name, f'{col}_orphans', orphan_count)
+    if orphan_count > 0:
+        print(f"Warning: Found {orphan_count} row(s) whose '{col}' is not in the referenced data. Removing these records.")
 
+    return rows.clean(df) if validity is None else df
+
+@instrumented
+def borrowPeriodCleaner(col, df, dataset_name, validity=None):
+    """
+    Adds borrow_period_days, the free-text borrow period in col ("2 weeks", "14 days", "1 month", "3 wks") as a number of days.
+    Each distinct period is parsed once (see borrow_period.py). Periods that cannot be read are left empty and counted, no rows are dropped.
+    """
+    rows = RowValidity(df) if validity is None else validity
+    df['borrow_period_days'] = borrow_period_days(df[col])
+
+    unparsed = (df['borrow_period_days'].isna() & df[col].notna()).to_numpy()
+    unparsed_count = int(unparsed[rows.valid].sum())
+    metrics_logger.log_metric(dataset_name, 'borrow_periods_unparsed', unparsed_count)
+    if unparsed_count > 0:
+        print(f"Warning: Could not read {unparsed_count} borrow period(s) in '{col}', left borrow_period_days empty")
+
+    return rows.clean(df) if validity is None else df
+
+@instrumented
+def titleCleaner(col, df, dataset_name, catalog=None, validity=None):
+    """
+    Adds title_id, the id of the canonical title behind each spelling of the book title in col ("Dune " and "dune", or near misses like "Lord of the rings the return of the kind").
+    Only new distinct spellings are normalized and matched, the catalog remembers the rest (see title_normalizer.py). No rows are dropped.
+    """
+    rows = RowValidity(df) if validity is None else validity
+    catalog = title_catalog if catalog is None else catalog
+    misses = catalog.misses
+
+    # Rejected rows get no title id
+    titles = df[col] if rows.valid.all() else df[col].where(rows.valid)
+    df['title_id'], variants = assign_title_ids(titles, catalog)
+
+    metrics_logger.log_metric(dataset_name, 'new_title_spellings', catalog.misses - misses)
+    metrics_logger.log_metric(dataset_name, 'title_variant_rows', int(variants.sum()))
+    print(f"Matched {catalog.misses - misses} new title spellings, {int(variants.sum())} rows use a variant of their canonical title")
+
+    return rows.clean(df) if validity is None else df
+
+@instrumented
 def idCleaner(id_columns, df, dataset_name):
     """
     Convert ID columns to integers
@@ -120,7 +222,8 @@ def idCleaner(id_columns, df, dataset_name):
     metrics_logger.log_metric(dataset_name, 'id_columns_converted', len(converted_columns))
     return df
 
-def enrich_dateDuration(colA, colB, df, dataset_name):
+@instrumented
+def enrich_dateDuration(colA, colB, df, dataset_name, validity=None):
     """
     Takes the two datetime input column names and the dataframe to create a new column days_borrowed which is the difference, in days, between colB and colA.
     
@@ -129,76 +232,112 @@ def enrich_dateDuration(colA, colB, df, dataset_name):
     colB = return date (later)
     colB > colA for valid loans
     """
-    df['days_borrowed'] = (df[colB] - df[colA]).dt.days
+    rows = RowValidity(df) if validity is None else validity
+
+    # Int64 so rows already rejected for a missing date (NaT) do not turn the column into floats
+    df['days_borrowed'] = (df[colB] - df[colA]).dt.days.astype('Int64')
 
     # Conditional Filtering to be able to gauge erroneous loans.
-    df['valid_loan_flag'] = df['days_borrowed'] >= 0
+    df['valid_loan_flag'] = df['days_borrowed'].ge(0).to_numpy(dtype=bool, na_value=False)
     
-    # Drop invalid loans (where days_borrowed is negative)
-    invalid_count = (~df['valid_loan_flag']).sum()
-    metrics_logger.log_metric(dataset_name, 'invalid_loans_found', int(invalid_count))
+    # Reject invalid loans (where days_borrowed is negative)
+    invalid_count = rows.reject(~df['valid_loan_flag'], 'invalid_loan')
+    metrics_logger.log_metric(dataset_name, 'invalid_loans_found', invalid_count)
     
     if invalid_count > 0:
         print(f"Warning: Found {invalid_count} invalid loan(s) where return date is before checkout date. Removing these records.")
     
-    df = df[df['valid_loan_flag']].copy()
-    df.reset_index(drop=True, inplace=True)
-    
-    metrics_logger.log_metric(dataset_name, 'invalid_loans_dropped', int(invalid_count))
+    metrics_logger.log_metric(dataset_name, 'invalid_loans_dropped', invalid_count)
 
-    return df
+    return rows.clean(df) if validity is None else df
+
+@instrumented
+def enrich_overdue(daysCol, periodCol, df, dataset_name, fine_pence_per_day=FINE_PENCE_PER_DAY, max_fine_pence=None, validity=None):
+    """
+    Takes the days_borrowed and borrow_period_days column names (from enrich_dateDuration and borrowPeriodCleaner) and adds days_overdue, is_overdue and fine_estimate_pence.
+    Computed on whole NumPy arrays (see overdue.py). No rows are dropped.
+    """
+    rows = RowValidity(df) if validity is None else validity
+    df['days_overdue'], df['is_overdue'], df['fine_estimate_pence'] = overdue_columns(
+        df[daysCol], df[periodCol], fine_pence_per_day, max_fine_pence
+    )
+
+    overdue = df['is_overdue'].to_numpy()[rows.valid]
+    fines = df['fine_estimate_pence'].to_numpy(dtype='int64', na_value=0)[rows.valid]
+    metrics_logger.log_metric(dataset_name, 'overdue_loans', int(overdue.sum()))
+    metrics_logger.log_metric(dataset_name, 'fine_estimate_total_pence', int(fines.sum()))
+    print(f"Found {int(overdue.sum())} overdue loan(s), estimated fines {int(fines.sum())}p")
+
+    return rows.clean(df) if validity is None else df
 
 if __name__ == '__main__':
     print('**************** Starting Clean ****************')
 
     # Instantiation - Using Windows paths
+    # The loans may also be a folder or glob of branch exports (e.g. 'C:/.../sample-data/branches/*.csv'),
+    # cleaned in parallel into one output with a source_file column (see multi_file.py)
     filepath_input = 'C:/Users/Admin/Desktop/M5-20260106/sample-data/03_Library Systembook.csv'
     date_columns = ['Book checkout', 'Book Returned']
     id_columns_loans = ['Id', 'Customer ID']
     output_dir = 'C:/Users/Admin/Desktop/M5-20260106/output-data'
 
-    # Ensure output directory exists
-    os.makedirs(output_dir, exist_ok=True)
+    # Set to a row count (e.g. 100_000) to stream large exports in bounded chunks
+    chunksize = None
 
-    # Process systembook data
-    data = fileLoader(filepath=filepath_input, dataset_name='systembook_metrics')
+    # Record peak Python allocations per step (tracemalloc slows the pipeline down)
+    trace_memory = False
+    if trace_memory:
+        tracemalloc.start()
 
-    # Drop duplicates & NAs
-    data = duplicateCleaner(data, dataset_name='systembook_metrics')
-    data = naCleaner(data, dataset_name='systembook_metrics')
+    # Cleaned file format: 'csv', 'parquet' or 'arrow' (see writers.py)
+    output_format = 'csv'
+    writer_options = {'row_group_size': None, 'compression': None}
+    systembook_output = cleaned_output_path(output_dir, 'cleaned_library_systembook', output_format)
+    customers_output = cleaned_output_path(output_dir, 'cleaned_customers', output_format)
 
-    # Converting date columns into datetime
-    for col in date_columns:
-        data = dateCleaner(col, data, dataset_name='systembook_metrics')
-    
-    # Enriching the dataset and removing invalid loans
-    data = enrich_dateDuration(df=data, colA='Book checkout', colB='Book Returned', dataset_name='systembook_metrics')
+    # Also write each cleaned output as uncompressed Arrow IPC, memory-mapped and shared by the
+    # dashboard and lookups (see writers.open_output)
+    mapped_output = True
 
-    # Convert ID columns to integers
-    data = idCleaner(id_columns_loans, data, dataset_name='systembook_metrics')
-    
-    # Log final row count
-    final_rows = len(data)
-    metrics_logger.log_metric('systembook_metrics', 'final_row_count', final_rows)
-    initial_rows = metrics_logger.metrics['systembook_metrics']['initial_row_count']
-    total_dropped = initial_rows - final_rows
-    metrics_logger.log_metric('systembook_metrics', 'total_rows_dropped', total_dropped)
-    metrics_logger.log_metric('systembook_metrics', 'data_retention_rate', round((final_rows / initial_rows) * 100, 2))
+    # Ensure output directory exists
+    os.makedirs(output_dir, exist_ok=True)
 
-    print(data)
+    # Canonical book titles and the spellings already matched to them, kept between runs (see title_normalizer.py)
+    titles = TitleCatalog(title_catalog_path(output_dir))
 
-    # Cleaning the customer file
-    filepath_input_2 = 'C:/Users/Admin/Desktop/M5-20260106/sample-data/03_Library SystemCustomers.csv'
-    id_columns_customers = ['Customer ID']
+    # Reuse the frames of earlier runs over unchanged input files, up to step_cache_mb on disk
+    # (in-memory mode, see step_cache.py), e.g. 1024. Off by default: a cold run pays for writing
+    # the checkpoints.
+    step_cache_mb = None
+    step_cache = StepCache(f'{output_dir}/.step_cache', step_cache_mb * 1024 * 1024) if step_cache_mb else None
 
-    data2 = fileLoader(filepath=filepath_input_2, dataset_name='customers_metrics')
+    # Write every rejected row with its reason code to rejected_<dataset> files (see quarantine.py)
+    quarantine = True
+    systembook_quarantine = None
+    if quarantine:
+        systembook_quarantine = QuarantineSink(
+            quarantine_path(output_dir, 'library_systembook', output_format), output_format, **writer_options
+        )
 
-    # Drop duplicates & NAs
-    data2 = duplicateCleaner(data2, dataset_name='customers_metrics')
-    data2 = naCleaner(data2, dataset_name='customers_metrics')
+    # Cleaning the customer file first, so the loans can be checked against its Customer IDs
+    filepath_input_2 = 'C:/Users/Admin/Desktop/M5-20260106/sample-data/03_Library SystemCustomers.csv'
+    id_columns_customers = ['Customer ID']
 
-    # Convert ID columns to integers
-    data2 = idCleaner(id_columns_customers, data2, dataset_name='customers_metrics')
+    # Drop duplicates & NAs, convert ID columns to integers
+    customers_steps = [
+        partial(duplicateCleaner, dataset_name='customers_metrics'),
+        partial(naCleaner, dataset_name='customers_metrics'),
+        partial(idCleaner, id_columns_customers, dataset_name='customers_metrics')
+    ]
+    if quarantine:
+        customers_quarantine_path = quarantine_path(output_dir, 'customers', output_format)
+        with QuarantineSink(customers_quarantine_path, output_format, **writer_options) as customers_quarantine:
+            data2 = run_cached_steps(
+                filepath_input_2, 'customers_metrics', fileLoader, customers_steps, step_cache, customers_quarantine
+            )
+        metrics_logger.log_metric('customers_metrics', 'rows_quarantined', customers_quarantine.rows_written)
+    else:
+        data2 = run_cached_steps(filepath_input_2, 'customers_metrics', fileLoader, customers_steps, step_cache)
     
     # Log final row count
     final_rows_customers = len(data2)
@@ -209,6 +348,88 @@ if __name__ == '__main__':
     metrics_logger.log_metric('customers_metrics', 'data_retention_rate', round((final_rows_customers / initial_rows_customers) * 100, 2))
 
     print(data2)
+
+    # Every loan's Customer ID must be in the cleaned customers (see integrity.py)
+    customer_ids = IdSet(data2['Customer ID'])
+
+    # Load the systembook data, drop duplicates & NAs, convert the date columns into
+    # datetime, enrich the dataset, remove invalid loans and loans of unknown customers,
+    # work out lateness, then convert ID columns to integers. The filters share one
+    # validity mask, so the clean and rejected rows are only copied out once.
+    systembook_steps = [
+        partial(duplicateCleaner, dataset_name='systembook_metrics'),
+        partial(naCleaner, dataset_name='systembook_metrics'),
+        partial(datesCleaner, date_columns, dataset_name='systembook_metrics', source=filepath_input),
+        partial(enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+        partial(referenceCleaner, 'Customer ID', dataset_name='systembook_metrics', known_ids=customer_ids),
+        partial(borrowPeriodCleaner, 'Days allowed to borrow', dataset_name='systembook_metrics'),
+        partial(enrich_overdue, 'days_borrowed', 'borrow_period_days', dataset_name='systembook_metrics'),
+        partial(idCleaner, id_columns_loans, dataset_name='systembook_metrics'),
+        partial(titleCleaner, 'Books', dataset_name='systembook_metrics', catalog=titles)
+    ]
+
+    if is_multi_input(filepath_input):
+        # One file per branch, cleaned on a process pool
+        systembook_files = expand_inputs(filepath_input)
+        final_rows = clean_files(
+            systembook_files,
+            'systembook_metrics',
+            systembook_steps,
+            systembook_output,
+            metrics_logger,
+            output_format=output_format,
+            writer_options=writer_options,
+            quarantine=systembook_quarantine
+        )
+        data = None
+    elif chunksize:
+        # Stream systembook data straight to the output file
+        systembook_steps = [partial(naCleaner, dataset_name='systembook_metrics')]
+        systembook_steps += [
+            partial(dateCleaner, col, dataset_name='systembook_metrics', source=filepath_input) for col in date_columns
+        ]
+        systembook_steps += [
+            partial(enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+            partial(referenceCleaner, 'Customer ID', dataset_name='systembook_metrics', known_ids=customer_ids),
+            partial(borrowPeriodCleaner, 'Days allowed to borrow', dataset_name='systembook_metrics'),
+            partial(enrich_overdue, 'days_borrowed', 'borrow_period_days', dataset_name='systembook_metrics'),
+            partial(idCleaner, id_columns_loans, dataset_name='systembook_metrics'),
+            partial(titleCleaner, 'Books', dataset_name='systembook_metrics', catalog=titles)
+        ]
+        final_rows = stream_clean(
+            filepath_input,
+            'systembook_metrics',
+            systembook_steps,
+            systembook_output,
+            metrics_logger,
+            chunksize=chunksize,
+            output_format=output_format,
+            writer_options=writer_options,
+            quarantine=systembook_quarantine
+        )
+        data = None
+    else:
+        data = run_cached_steps(
+            filepath_input, 'systembook_metrics', fileLoader, systembook_steps, step_cache, systembook_quarantine
+        )
+        final_rows = len(data)
+        print(data)
+
+    if systembook_quarantine is not None:
+        systembook_quarantine.close()
+        metrics_logger.log_metric('systembook_metrics', 'rows_quarantined', systembook_quarantine.rows_written)
+    titles.save()
+
+    # Log final row count
+    metrics_logger.log_metric('systembook_metrics', 'final_row_count', final_rows)
+    initial_rows = metrics_logger.metrics['systembook_metrics']['initial_row_count']
+    total_dropped = initial_rows - final_rows
+    metrics_logger.log_metric('systembook_metrics', 'total_rows_dropped', total_dropped)
+    metrics_logger.log_metric('systembook_metrics', 'data_retention_rate', round((final_rows / initial_rows) * 100, 2))
+
+    # Per-customer usage for the customer login page (see customer_usage.py); streamed loans are read back
+    usage = CustomerUsage(output_dir, systembook_output, output_format, writer_options).rebuild(data2, loans=data)
+    metrics_logger.log_metric('customers_metrics', 'usage_customers', len(usage))
     print('**************** DATA CLEANED ****************')
 
     # Print metrics summary
@@ -217,11 +438,16 @@ if __name__ == '__main__':
     # Save metrics to JSON file
     metrics_file = f'{output_dir}/pipeline_metrics.json'
     metrics_logger.save_metrics(metrics_file)
+    metrics_logger.save_to_store(store_path(output_dir))
 
-    print('Writing cleaned data to CSV files...')
+    print(f'Writing cleaned data to {output_format} files...')
 
-    # Write cleaned data to CSV
-    data.to_csv(f'{output_dir}/cleaned_library_systembook.csv', index=False)
-    data2.to_csv(f'{output_dir}/cleaned_customers.csv', index=False)
+    # Write cleaned data (systembook is already written when streaming or cleaning branch files)
+    if data is not None:
+        write_dataframe(data, systembook_output, output_format, **writer_options)
+    write_dataframe(data2, customers_output, output_format, **writer_options)
+    if mapped_output:
+        for path in (systembook_output, customers_output):
+            print(f'Wrote memory-mappable copy {write_mapped_copy(path)}')
     
     print('**************** End ****************')
\ No newline at end of file
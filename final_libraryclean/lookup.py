@@ -0,0 +1,336 @@
+"""
+Lookup service over the cleaned outputs: customer details, a customer's loans, loans by
+Id and the status and loans of a book title.
+
+LibraryIndex loads cleaned_customers and cleaned_library_systembook (CSV, Parquet or
+Arrow, whichever was written last; Arrow files are memory-mapped, see
+writers.open_output()) and builds hash indexes once:
+
+    customer_rows   Customer ID -> row of cleaned_customers
+    customer_loans  Customer ID -> rows of cleaned_library_systembook
+    loan_rows       Id          -> rows of cleaned_library_systembook
+    title_loans     title id    -> rows of cleaned_library_systembook
+    latest_loans    title id    -> row of the title's most recent checkout
+
+so a point lookup is a dict lookup plus building the few records it returns, instead of a
+scan of the files. Titles are looked up through the title catalog the pipeline saves
+(see title_normalizer.py), so "the hobbit" or a near miss finds the loans of "The
+Hobbit"; without a catalog or a title_id column the title must match after title_key().
+
+LookupService keeps the current index and, once start() is called, polls the output files
+and builds a new index in a background thread when a pipeline run has changed them. The
+new index replaces the old one in a single assignment, so reads are never blocked or see
+a half-built index.
+
+Usage: python lookup.py [output_dir] [port]   (HTTP on 127.0.0.1, default ../output-data 8000)
+
+    GET /customers/<Customer ID>   customer details and loans
+    GET /loans/<Id>                loans with that Id
+    GET /titles?q=<title>          the book's status: canonical title, loan count, latest loan
+
+Benchmark: benchmarks/bench_lookup.py
+"""
+
+import datetime
+import json
+import math
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from title_normalizer import TitleCatalog, title_catalog_path, title_key
+from writers import WRITERS, cleaned_output_path, open_output
+
+CUSTOMERS_OUTPUT = 'cleaned_customers'
+LOANS_OUTPUT = 'cleaned_library_systembook'
+
+# Seconds between checks of the output files for a new pipeline run
+POLL_SECONDS = 1.0
+
+
+def find_output(output_dir, name):
+    """The most recently written cleaned output called name, in any output format"""
+    paths = [cleaned_output_path(output_dir, name, fmt) for fmt in WRITERS]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        raise FileNotFoundError(f"No {name} output in {output_dir}")
+    return max(paths, key=os.path.getmtime)
+
+
+def outputs_version(output_dir):
+    """(path, mtime, size) of every file the index is built from; changes with each pipeline run"""
+    paths = [cleaned_output_path(output_dir, name, fmt) for name in (CUSTOMERS_OUTPUT, LOANS_OUTPUT) for fmt in WRITERS]
+    paths.append(title_catalog_path(output_dir))
+    return tuple(
+        (path, stat.st_mtime_ns, stat.st_size) for path in paths if os.path.exists(path) for stat in [os.stat(path)]
+    )
+
+
+def positions_by_key(values):
+    """{key: array of the row positions holding it}, from one factorize and one stable sort"""
+    codes, uniques = pd.factorize(values)
+    order = np.argsort(codes, kind='stable')
+    boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+    groups = np.split(order, boundaries)
+    if len(codes) and codes[order[0]] == -1:
+        # Missing keys sort first
+        groups = groups[1:]
+    return dict(zip(_plain_keys(uniques), groups))
+
+
+def latest_by_key(keys, order_by):
+    """{key: position of the row with the largest order_by value among the rows holding key}"""
+    frame = pd.DataFrame({'key': keys.array, 'order_by': order_by.array, 'position': np.arange(len(keys))})
+    latest = frame.dropna(subset=['key']).sort_values('order_by', kind='stable').drop_duplicates('key', keep='last')
+    return dict(zip(_plain_keys(pd.Index(latest['key'])), latest['position'].tolist()))
+
+
+def _plain_keys(uniques):
+    return [value.item() if hasattr(value, 'item') else value for value in uniques.tolist()]
+
+
+def _plain(value):
+    """JSON-friendly Python value for one cell"""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+ID_PATTERN = re.compile(r'\s*([+-]?\d+)(?:\.0*)?\s*')
+
+
+def _id(value):
+    """
+    IDs arrive as ints, floats or strings ('7' in a URL); the indexes hold ints.
+
+    Anything that is not a whole number ('abc', 'inf', 'nan', 7.5) raises ValueError.
+    """
+    if isinstance(value, str):
+        match = ID_PATTERN.fullmatch(value)
+        if match is None:
+            raise ValueError(f"Not an ID: {value!r}")
+        return int(match.group(1))
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"Not an ID: {value!r}")
+    return int(number)
+
+
+class Table:
+    """A frame kept as one array per column, for building a few records quickly"""
+
+    def __init__(self, df):
+        self.columns = list(df.columns)
+        # Columns of a memory-mapped output stay in the mapping, the others become NumPy arrays
+        self.arrays = [
+            df[col].array if isinstance(df[col].dtype, pd.ArrowDtype) else df[col].to_numpy() for col in self.columns
+        ]
+        self.rows = len(df)
+
+    def records(self, positions):
+        return [{col: _plain(values[i]) for col, values in zip(self.columns, self.arrays)} for i in positions]
+
+
+class LibraryIndex:
+    """Hash indexes over one pipeline run's cleaned customers and loans"""
+
+    def __init__(self, customers, loans, catalog=None):
+        self.customers = Table(customers)
+        self.loans = Table(loans)
+        self.catalog = catalog
+
+        self.customer_rows = {key: rows[0] for key, rows in positions_by_key(customers['Customer ID']).items()}
+        self.customer_loans = positions_by_key(loans['Customer ID'])
+        self.loan_rows = positions_by_key(loans['Id'])
+        if 'title_id' in loans.columns and catalog is not None:
+            titles = loans['title_id']
+        else:
+            self.catalog = None
+            titles = loans['Books'].map(title_key, na_action='ignore')
+        self.title_loans = positions_by_key(titles)
+        # ISO dates (text in CSV outputs) sort in date order either way
+        self.latest_loans = latest_by_key(titles, loans['Book checkout']) if 'Book checkout' in loans.columns else {}
+
+    @classmethod
+    def from_output_dir(cls, output_dir):
+        customers = open_output(find_output(output_dir, CUSTOMERS_OUTPUT))
+        loans = open_output(find_output(output_dir, LOANS_OUTPUT))
+        catalog_path = title_catalog_path(output_dir)
+        catalog = TitleCatalog(catalog_path) if os.path.exists(catalog_path) else None
+        return cls(customers, loans, catalog)
+
+    def customer(self, customer_id):
+        """The customer's cleaned record, or None"""
+        row = self.customer_rows.get(_id(customer_id))
+        return None if row is None else self.customers.records([row])[0]
+
+    def customer_loans_of(self, customer_id):
+        return self.loans.records(self.customer_loans.get(_id(customer_id), []))
+
+    def loan(self, loan_id):
+        """Every loan with that Id (a book Id can be lent more than once)"""
+        return self.loans.records(self.loan_rows.get(_id(loan_id), []))
+
+    def title_id(self, title):
+        """Title id (or match key without a catalog) the title resolves to, or None"""
+        if self.catalog is None:
+            return title_key(title)
+        if title in self.catalog.spellings:
+            return self.catalog.spellings[title]
+        key = title_key(title)
+        if key in self.catalog.keys:
+            return self.catalog.keys[key]
+        match = self.catalog.closest(key) if key else None
+        return None if match is None else self.catalog.keys[match]
+
+    def title(self, title):
+        """Status of the book the title resolves to: {'title_id', 'title', 'loan_count', 'latest_loan'}, or None"""
+        title_id = self.title_id(title)
+        if title_id is None or self.catalog is None and title_id not in self.title_loans:
+            return None
+        latest = self.latest_loans.get(title_id)
+        latest_loan = None if latest is None else self.loans.records([latest])[0]
+        return {
+            'title_id': title_id if self.catalog is not None else None,
+            'title': self.catalog.titles[title_id] if self.catalog is not None else latest_loan['Books'].strip(),
+            'loan_count': len(self.title_loans.get(title_id, [])),
+            'latest_loan': latest_loan
+        }
+
+    def title_loans_of(self, title):
+        """Every loan of the book the title resolves to"""
+        return self.loans.records(self.title_loans.get(self.title_id(title), []))
+
+
+class LookupService:
+    """Answers lookups from the latest LibraryIndex, rebuilding it in the background after each pipeline run"""
+
+    def __init__(self, output_dir, poll_seconds=POLL_SECONDS):
+        self.output_dir = output_dir
+        self.poll_seconds = poll_seconds
+        self.version = outputs_version(output_dir)
+        self.index = LibraryIndex.from_output_dir(output_dir)
+        self.reloads = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def customer(self, customer_id):
+        return self.index.customer(customer_id)
+
+    def customer_loans(self, customer_id):
+        return self.index.customer_loans_of(customer_id)
+
+    def loan(self, loan_id):
+        return self.index.loan(loan_id)
+
+    def title(self, title):
+        return self.index.title(title)
+
+    def title_loans(self, title):
+        return self.index.title_loans_of(title)
+
+    def reload(self):
+        """Build a new index from the current outputs and swap it in"""
+        version = outputs_version(self.output_dir)
+        index = LibraryIndex.from_output_dir(self.output_dir)
+        self.index, self.version = index, version
+        self.reloads += 1
+        print(f"Reloaded lookup indexes from {self.output_dir}")
+
+    def changed(self):
+        """True when the outputs changed since the index was built and have not changed since the last poll"""
+        first = outputs_version(self.output_dir)
+        if first == self.version:
+            return False
+        # Wait for a run that is still writing its files to finish
+        self._stop.wait(self.poll_seconds)
+        return outputs_version(self.output_dir) == first
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                if self.changed():
+                    self.reload()
+            except (OSError, ValueError, pd.errors.ParserError) as e:
+                # Keep serving the old index; the next poll tries again
+                print(f"Error reloading lookup indexes: {e}")
+
+    def start(self):
+        """Poll the outputs and reload in a daemon thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name='lookup-reload', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def make_server(service, host='127.0.0.1', port=8000):
+    """Threaded HTTP server answering the GET routes in the module docstring from service"""
+
+    class LookupHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split('/') if part]
+            try:
+                if len(parts) == 2 and parts[0] == 'customers':
+                    customer = service.customer(parts[1])
+                    body = None if customer is None else {'customer': customer, 'loans': service.customer_loans(parts[1])}
+                elif len(parts) == 2 and parts[0] == 'loans':
+                    body = service.loan(parts[1]) or None
+                elif parts == ['titles'] and 'q' in parse_qs(url.query):
+                    body = service.title(parse_qs(url.query)['q'][0])
+                else:
+                    return self.respond(404, {'error': 'unknown route'})
+            except ValueError:
+                return self.respond(400, {'error': 'IDs must be integers'})
+
+            if body is None:
+                return self.respond(404, {'error': 'not found'})
+            self.respond(200, body)
+
+        def respond(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), LookupHandler)
+
+
+if __name__ == '__main__':
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'output-data')
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+
+    service = LookupService(output_dir).start()
+    server = make_server(service, port=port)
+    print(f"Serving lookups for {output_dir} on http://127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
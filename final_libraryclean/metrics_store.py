@@ -0,0 +1,221 @@
+"""
+Append-only SQLite store for the metrics of every pipeline run.
+
+pipeline_metrics.json / .csv only ever hold the latest run. Each run is also inserted
+here as new rows (one per dataset metric and step timing) without rewriting earlier
+runs, so a write costs the same however long the history is. Rows are indexed on
+(dataset, metric_name, execution_timestamp) and execution_timestamp for range queries
+such as "retention rate for systembook_metrics over the last 30 days".
+
+The dashboard's run history is read from here too: HistoryReader keeps the last run_id
+it has read and only fetches the runs stored since, so a refresh with thousands of runs
+in the store does not re-read all of them. Power BI can read the metrics table through
+the SQLite ODBC driver.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+STORE_FILE = 'pipeline_metrics.sqlite'
+
+# Columns of the long-format history frame
+HISTORY_COLUMNS = ['execution_timestamp', 'dataset', 'metric_name', 'metric_value']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    execution_timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    execution_timestamp TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    metric_name TEXT NOT NULL,
+    metric_value REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (execution_timestamp);
+CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics (execution_timestamp);
+CREATE INDEX IF NOT EXISTS idx_metrics_dataset_metric ON metrics (dataset, metric_name, execution_timestamp);
+CREATE INDEX IF NOT EXISTS idx_metrics_run ON metrics (run_id);
+"""
+
+
+def store_path(output_dir):
+    return os.path.join(output_dir, STORE_FILE)
+
+
+def _numeric(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MetricsStore:
+    """Append-only metrics history in one SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        # WAL lets the dashboard read while a pipeline run is appending
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def append_run(self, execution_timestamp, datasets, step_timings=None):
+        """Insert one run: {dataset: {metric: value}} plus step timings as step_measure metrics"""
+        rows = [
+            (dataset, metric, _numeric(value))
+            for dataset, metrics in datasets.items()
+            for metric, value in metrics.items()
+        ]
+        rows += [
+            (dataset, f'{step}_{measure}', _numeric(value))
+            for dataset, steps in (step_timings or {}).items()
+            for step, timings in steps.items()
+            for measure, value in timings.items()
+        ]
+
+        with self.conn:
+            run_id = self.conn.execute(
+                'INSERT INTO runs (execution_timestamp) VALUES (?)', (execution_timestamp,)
+            ).lastrowid
+            self.conn.executemany(
+                'INSERT INTO metrics (run_id, execution_timestamp, dataset, metric_name, metric_value) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(run_id, execution_timestamp, *row) for row in rows]
+            )
+        return run_id
+
+    def metric_range(self, dataset, metric_name, start=None, end=None, last_days=None):
+        """
+        Values of one metric between start and end (inclusive, 'YYYY-MM-DD HH:MM:SS' or
+        datetime), or over the last_days days. Returns a DataFrame ordered by time.
+        """
+        if last_days is not None:
+            start = datetime.now() - timedelta(days=last_days)
+
+        query = (
+            'SELECT run_id, execution_timestamp, metric_value FROM metrics '
+            'WHERE dataset = ? AND metric_name = ?'
+        )
+        params = [dataset, metric_name]
+        query, params = self._time_filter(query, params, start, end)
+        return self._frame(query + ' ORDER BY execution_timestamp, run_id', params)
+
+    def runs(self, start=None, end=None, datasets=None):
+        """All metrics of the runs in a time range, in the long format of pipeline_metrics.csv"""
+        query = 'SELECT run_id, execution_timestamp, dataset, metric_name, metric_value FROM metrics WHERE 1 = 1'
+        params = []
+        if datasets:
+            query += f' AND dataset IN ({", ".join("?" * len(datasets))})'
+            params += list(datasets)
+        query, params = self._time_filter(query, params, start, end)
+        return self._frame(query + ' ORDER BY execution_timestamp, run_id', params)
+
+    def run_count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def latest_run_id(self):
+        return self.conn.execute('SELECT COALESCE(MAX(run_id), 0) FROM runs').fetchone()[0]
+
+    def runs_between(self, after_run_id, last_run_id):
+        """(number of runs, metric rows) stored with after_run_id < run_id <= last_run_id"""
+        count = self.conn.execute(
+            'SELECT COUNT(*) FROM runs WHERE run_id > ? AND run_id <= ?', (after_run_id, last_run_id)
+        ).fetchone()[0]
+        rows = self.conn.execute(
+            'SELECT execution_timestamp, dataset, metric_name, metric_value FROM metrics '
+            'WHERE run_id > ? AND run_id <= ? ORDER BY run_id',
+            (after_run_id, last_run_id)
+        ).fetchall()
+        return count, rows
+
+    def _time_filter(self, query, params, start, end):
+        if start is not None:
+            query += ' AND execution_timestamp >= ?'
+            params.append(_timestamp(start))
+        if end is not None:
+            query += ' AND execution_timestamp <= ?'
+            params.append(_timestamp(end))
+        return query, params
+
+    def _frame(self, query, params):
+        frame = pd.read_sql_query(query, self.conn, params=params)
+        frame['execution_timestamp'] = pd.to_datetime(frame['execution_timestamp'])
+        return frame
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _timestamp(value):
+    """Timestamps are stored as 'YYYY-MM-DD HH:MM:SS' text, which sorts chronologically"""
+    if isinstance(value, str):
+        return value
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class HistoryReader:
+    """Reads the run history from the store incrementally, picking up only the runs stored since the last refresh"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.last_run_id = 0
+        self.run_count = 0
+        self.rows = []
+        self._frame = None
+
+    def refresh(self):
+        """Read any runs stored since the last refresh; returns the number of runs added"""
+        with self.lock:
+            if not os.path.exists(self.path):
+                self.reset()
+                return 0
+
+            with MetricsStore(self.path) as store:
+                latest = store.latest_run_id()
+                if latest < self.last_run_id:
+                    # The store was replaced, start again
+                    self.reset()
+                if latest == self.last_run_id:
+                    return 0
+                # Runs are inserted in one transaction each, so every run up to latest is complete
+                new_runs, rows = store.runs_between(self.last_run_id, latest)
+
+            self.last_run_id = latest
+            self.run_count += new_runs
+            self.rows.extend(rows)
+            self._frame = None
+            return new_runs
+
+    def frame(self):
+        """All runs as a long DataFrame (execution_timestamp, dataset, metric_name, metric_value)"""
+        with self.lock:
+            if self._frame is None:
+                frame = pd.DataFrame(self.rows, columns=HISTORY_COLUMNS)
+                frame['execution_timestamp'] = pd.to_datetime(frame['execution_timestamp'])
+                frame['metric_value'] = pd.to_numeric(frame['metric_value'], errors='coerce')
+                self._frame = frame
+            return self._frame
+
+
+def metric_series(history, dataset, metrics):
+    """Wide frame of the chosen metrics over time for one dataset (one row per run)"""
+    selected = history[(history['dataset'] == dataset) & history['metric_name'].isin(metrics)]
+    return selected.pivot_table(
+        index='execution_timestamp', columns='metric_name', values='metric_value', aggfunc='last'
+    ).reset_index()
@@ -0,0 +1,226 @@
+"""
+Multi-file ingestion: one cleaned output from many exports of the same dataset (one
+Systembook export per library branch).
+
+An input may be a single file, a directory (every *.csv in it) or a glob pattern
+(branches/*.csv, exports/**/*.csv). clean_files() then:
+
+1. reads and parses the files on a thread pool (the pyarrow CSV parser releases the
+   GIL, so reads overlap each other and the cleaning),
+2. cleans each parsed file on a process pool as soon as it is read, with the same steps
+   as a single-file run (each file is deduplicated on its own; the date format cache is
+   keyed by each file, see file_steps()),
+3. writes the clean rows of every file, in file order, to one output with a source_file
+   column naming the export each row came from; rejected rows go to the quarantine the
+   same way. Book titles the catalog does not know yet are matched here, file by file,
+   so title ids are numbered in file order (see title_normalizer.DeferredTitles).
+
+At most io_workers + max_workers files are read but not yet cleaned at a time, so memory
+stays bounded however many files there are.
+
+A file that cannot be read or cleaned (missing columns, a broken CSV) is reported and
+left out; the other files are cleaned as usual. Metrics are logged per file under
+'<dataset>/<file>' and summed under the dataset, with files_total, files_cleaned and
+files_failed.
+"""
+
+import glob
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+
+from dtype_planner import read_planned_csv
+from parallel import step_metrics_logger
+from quarantine import run_steps
+from streaming import NON_ADDITIVE_METRICS
+from title_normalizer import defer_titles, fill_title_ids, match_pending, pending_titles
+from writers import get_writer, read_output, write_dataframe
+
+# Threads reading and parsing input files
+IO_WORKERS = 4
+
+SOURCE_COLUMN = 'source_file'
+
+# Errors that fail one file rather than the batch
+FILE_ERRORS = (OSError, KeyError, ValueError, TypeError)
+
+
+def is_multi_input(path):
+    """True for a directory or a glob pattern"""
+    return os.path.isdir(path) or glob.has_magic(path)
+
+
+def expand_inputs(path):
+    """Sorted input files of a path: every *.csv of a directory, the matches of a glob, or the path itself"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*.csv')))
+    if glob.has_magic(path):
+        return sorted(match for match in glob.glob(path, recursive=True) if os.path.isfile(match))
+    return [path]
+
+
+def file_labels(paths):
+    """Name of each file relative to the directory the files share, used in source_file and metric names"""
+    if len(paths) == 1:
+        return [os.path.basename(paths[0])]
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return [os.path.relpath(os.path.abspath(path), root) for path in paths]
+
+
+def file_steps(steps, filepath):
+    """The steps with their source parameter (the date format cache key) pointed at one file"""
+    return [
+        partial(step.func, *step.args, **{**step.keywords, 'source': filepath})
+        if 'source' in getattr(step, 'keywords', {}) else step
+        for step in steps
+    ]
+
+
+class RejectedBatches(list):
+    """Quarantine sink that keeps the rejected batches of one file in memory"""
+
+    def write(self, rejected):
+        self.append(rejected)
+
+
+def _clean_file(df, dataset_name, steps, partition_path, keep_rejected):
+    # Cleaners log into their own module's logger inside the worker process
+    loggers = {id(logger): logger for logger in map(step_metrics_logger, steps)}
+    for logger in loggers.values():
+        logger.metrics[dataset_name] = {}
+        logger.step_timings[dataset_name] = {}
+
+    metrics, step_timings = {'initial_row_count': len(df)}, {}
+    rejected = RejectedBatches() if keep_rejected else None
+    df = run_steps(df, steps, rejected)
+    for logger in loggers.values():
+        metrics.update(logger.metrics[dataset_name])
+        step_timings.update(logger.step_timings[dataset_name])
+
+    write_dataframe(df, partition_path, 'arrow')
+    rejected_paths = [f'{partition_path}.rejected_{i}.arrow' for i in range(len(rejected or []))]
+    for batch, path in zip(rejected or [], rejected_paths):
+        write_dataframe(batch, path, 'arrow')
+    return len(df), metrics, step_timings, rejected_paths, pending_titles(steps)
+
+
+def union_frame(df, label, columns=None):
+    """
+    One file's rows as written to the union: its source_file, and the first file's columns
+    if given (extra columns dropped, missing ones empty). Each file plans its own
+    categories, so categorical columns are written as their plain values.
+    """
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    for col in df.columns[df.dtypes == 'category']:
+        df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df.assign(**{SOURCE_COLUMN: label})
+
+
+def clean_files(paths, dataset_name, steps, output_path, metrics_logger, max_workers=None, io_workers=IO_WORKERS,
+                output_format='csv', writer_options=None, quarantine=None):
+    """
+    Clean every file in paths with steps (as run_steps() would over each file) and write
+    the clean rows of all of them to output_path. Rejected rows go to quarantine if given.
+
+    Steps must be picklable (module-level cleaners, or functools.partial of them). Logs
+    per-file and summed metrics into metrics_logger and returns the rows written; raises
+    ValueError if no file could be cleaned.
+    """
+    if not paths:
+        raise FileNotFoundError(f"No input files for {dataset_name}")
+    labels = file_labels(paths)
+    steps = defer_titles(steps)
+    results = {}
+    window = io_workers + (max_workers or os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory(prefix='multi_file_') as tmpdir, \
+            ThreadPoolExecutor(io_workers) as readers, ProcessPoolExecutor(max_workers) as pool:
+        queued = iter(range(len(paths)))
+        active = {}
+
+        def read_next():
+            for i in queued:
+                active[readers.submit(read_planned_csv, paths[i])] = (i, 'read')
+                return
+
+        for _ in range(window):
+            read_next()
+        while active:
+            done, _ = wait(active, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, stage = active.pop(future)
+                try:
+                    result = future.result()
+                except FILE_ERRORS as e:
+                    results[i] = e
+                    read_next()
+                    continue
+                if stage == 'read':
+                    partition_path = os.path.join(tmpdir, f'{i:05d}.arrow')
+                    job = pool.submit(
+                        _clean_file, result, dataset_name, file_steps(steps, paths[i]), partition_path,
+                        quarantine is not None
+                    )
+                    active[job] = (i, 'clean')
+                else:
+                    results[i] = result
+                    read_next()
+
+        # Union the files in file order and merge the metrics
+        totals, columns, failed, empty = {'initial_row_count': 0}, None, 0, None
+        writer = get_writer(output_format, output_path, **(writer_options or {}))
+        with writer:
+            for i, label in enumerate(labels):
+                file_dataset = f'{dataset_name}/{label}'
+                try:
+                    if isinstance(results[i], Exception):
+                        raise results[i]
+                    rows, metrics, step_timings, rejected_paths, pending = results[i]
+                    title_ids, title_metrics = match_pending(steps, pending)
+                    for metric, value in title_metrics.items():
+                        metrics[metric] += value
+                    df = fill_title_ids(read_output(os.path.join(tmpdir, f'{i:05d}.arrow')), title_ids)
+                    columns = list(df.columns) if columns is None else columns
+                    df = union_frame(df, label, columns)
+                    # An empty file infers other dtypes (all float); it would fix the output schema
+                    if len(df):
+                        writer.write(df)
+                    elif empty is None:
+                        empty = df
+                except FILE_ERRORS as e:
+                    print(f"Error cleaning {paths[i]}: {type(e).__name__}: {e}")
+                    metrics_logger.log_metric(file_dataset, 'file_failed', 1)
+                    failed += 1
+                    continue
+
+                if quarantine is not None:
+                    for path in rejected_paths:
+                        quarantine.write(union_frame(fill_title_ids(read_output(path), title_ids), label))
+                for metric, value in metrics.items():
+                    metrics_logger.log_metric(file_dataset, metric, value)
+                    if metric in NON_ADDITIVE_METRICS:
+                        totals[metric] = value
+                    else:
+                        totals[metric] = totals.get(metric, 0) + value
+                metrics_logger.log_metric(file_dataset, 'final_row_count', rows)
+                metrics_logger.log_metric(
+                    file_dataset, 'data_retention_rate',
+                    round(rows / metrics['initial_row_count'] * 100, 2) if metrics['initial_row_count'] else 100.0
+                )
+                metrics_logger.log_metric(file_dataset, 'file_failed', 0)
+                for step, timings in step_timings.items():
+                    metrics_logger.log_step_timing(dataset_name, step, timings)
+            if not writer.rows_written and empty is not None:
+                writer.write(empty)
+
+    for metric, value in totals.items():
+        metrics_logger.log_metric(dataset_name, metric, value)
+    metrics_logger.log_metric(dataset_name, 'files_total', len(paths))
+    metrics_logger.log_metric(dataset_name, 'files_cleaned', len(paths) - failed)
+    metrics_logger.log_metric(dataset_name, 'files_failed', failed)
+    print(f"Cleaned {len(paths) - failed} of {len(paths)} files of {dataset_name}, wrote {writer.rows_written} rows")
+    if failed == len(paths):
+        raise ValueError(f"None of the {len(paths)} input files of {dataset_name} could be cleaned")
+    return writer.rows_written
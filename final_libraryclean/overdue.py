@@ -0,0 +1,55 @@
+"""
+Lateness of each loan: days_overdue, is_overdue and a fine estimate.
+
+A loan is overdue when it was kept longer than its borrow period (borrow_period_days,
+see borrow_period.py):
+
+    days_overdue         max(days_borrowed - borrow_period_days, 0)
+    is_overdue           days_overdue > 0
+    fine_estimate_pence  days_overdue * fine_pence_per_day, capped at max_fine_pence if set
+
+Fines are counted in whole pence so the columns stay integers; a fractional
+fine_pence_per_day or max_fine_pence (2.5) is refused with a ValueError. A loan without a
+days_borrowed or a borrow period (one that could not be read) has no days_overdue or
+fine and is not overdue.
+
+overdue_columns() works on the NumPy arrays behind the two Int64 columns: one
+subtraction, one clip and one multiplication over the whole column, no per-row Python.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Estimated fine per day a book is kept past its borrow period, in pence
+FINE_PENCE_PER_DAY = 20
+
+
+def whole_pence(value, name):
+    """value as an int, or ValueError if it is not a whole number of pence (20.0 is fine, 2.5 is not)"""
+    if isinstance(value, bool) or not float(value).is_integer():
+        raise ValueError(f"{name} must be a whole number of pence, got {value!r}")
+    return int(value)
+
+
+def overdue_columns(days_borrowed, borrow_period_days, fine_pence_per_day=FINE_PENCE_PER_DAY, max_fine_pence=None):
+    """(days_overdue, is_overdue, fine_estimate_pence) for two Int64 Series; days and fines are Int64"""
+    fine_pence_per_day = whole_pence(fine_pence_per_day, 'fine_pence_per_day')
+    if max_fine_pence is not None:
+        max_fine_pence = whole_pence(max_fine_pence, 'max_fine_pence')
+
+    known = (days_borrowed.notna() & borrow_period_days.notna()).to_numpy()
+    late = days_borrowed.to_numpy(dtype='int64', na_value=0) - borrow_period_days.to_numpy(dtype='int64', na_value=0)
+    np.maximum(late, 0, out=late)
+    late[~known] = 0
+
+    fine = late * fine_pence_per_day
+    if max_fine_pence is not None:
+        np.minimum(fine, max_fine_pence, out=fine)
+
+    # Missing inputs give <NA> days and fines
+    missing = ~known
+    return (
+        pd.Series(pd.arrays.IntegerArray(late, missing), index=days_borrowed.index),
+        late > 0,
+        pd.Series(pd.arrays.IntegerArray(fine, missing.copy()), index=days_borrowed.index)
+    )
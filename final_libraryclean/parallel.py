@@ -0,0 +1,185 @@
+"""
+Process-pool runner for the dataset pipelines.
+
+Independent datasets (systembook, customers) run at the same time, and a large file is
+split into line-aligned byte ranges that are cleaned on separate cores. Each partition
+is parsed once and handled in two passes over the pool:
+
+1. every worker parses its partition, keeps the parsed frame as an uncompressed Arrow
+   file and returns the row hashes; the parent works out which rows are the first
+   occurrence across the whole file (so duplicates are dropped exactly as
+   duplicateCleaner does on the full frame),
+2. every worker loads its parsed frame back, drops its duplicates, runs the cleaning
+   steps and saves its partition.
+
+The duplicate filter has to run before the steps rather than when the partitions are
+stitched together, otherwise the steps would count rows (blank cells, invalid dates)
+that a serial run drops as duplicates first.
+
+The parent then writes the partitions in file order and sums the workers' metrics into
+the MetricsLogger, so output and counts match a serial run. Book titles the catalog
+does not know yet are matched by the parent as it writes each partition, so title ids
+are numbered in file order as well (see title_normalizer.DeferredTitles).
+
+Partitions are split on newlines, so records must not contain embedded line breaks.
+"""
+
+import io
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dedupe import row_digests
+from quarantine import RowValidity, run_steps
+from streaming import NON_ADDITIVE_METRICS, pinned_dtypes, read_pinned
+from title_normalizer import defer_titles, fill_title_ids, match_pending, pending_titles
+from writers import get_writer, read_output, write_dataframe
+
+DEFAULT_PARTITION_BYTES = 64 * 1024 * 1024
+
+# Rows read up front to decide the column dtypes shared by every partition
+DTYPE_SAMPLE_ROWS = 100_000
+
+
+def partition_file(filepath, partition_bytes=DEFAULT_PARTITION_BYTES):
+    """Split a CSV into (start, end) byte ranges that begin and end on line boundaries"""
+    size = os.path.getsize(filepath)
+    ranges = []
+    with open(filepath, 'rb') as f:
+        header = f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + partition_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+
+    # A header-only file still gets one (empty) partition so the steps log their metrics
+    return header, ranges or [(len(header), len(header))]
+
+
+def read_partition(filepath, header, start, end, dtypes):
+    """Parse one byte range of the CSV, using the file header and the shared dtypes"""
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return read_pinned(io.BytesIO(header + data), dtypes)
+
+
+def step_metrics_logger(step):
+    """The metrics_logger global of the module the (partial-wrapped) cleaner is defined in"""
+    func = getattr(step, 'func', step)
+    return sys.modules[func.__module__].metrics_logger
+
+
+def _parsed_path(tmpdir, dataset, i):
+    return os.path.join(tmpdir, f"{dataset['dataset_name']}_{i:05d}_parsed.arrow")
+
+
+def _hash_partition(filepath, header, start, end, dtypes, parsed_path):
+    """Parse one partition, keep the frame at parsed_path for the clean pass and return its row hashes"""
+    df = read_partition(filepath, header, start, end, dtypes)
+    write_dataframe(df, parsed_path, 'arrow')
+    return row_digests(df)
+
+
+def _clean_partition(parsed_path, keep, dataset_name, steps, partition_path):
+    df = read_output(parsed_path)
+    os.remove(parsed_path)
+    validity = RowValidity(df)
+    validity.reject(~keep, 'duplicate')
+
+    # Cleaners log into their own module's logger inside the worker process
+    loggers = {id(logger): logger for logger in map(step_metrics_logger, steps)}
+    for logger in loggers.values():
+        logger.metrics[dataset_name] = {}
+        logger.step_timings[dataset_name] = {}
+
+    df = run_steps(df, steps, validity=validity)
+
+    metrics, step_timings = {}, {}
+    for logger in loggers.values():
+        metrics.update(logger.metrics[dataset_name])
+        step_timings.update(logger.step_timings[dataset_name])
+
+    write_dataframe(df, partition_path, 'arrow')
+    return len(df), metrics, step_timings, pending_titles(steps)
+
+
+def run_datasets(datasets, metrics_logger, max_workers=None, partition_bytes=DEFAULT_PARTITION_BYTES):
+    """
+    Clean several datasets on a process pool and write each one to its output.
+
+    datasets is a list of dicts with keys dataset_name, filepath, steps, output_path and
+    optionally output_format / writer_options. Steps are called as step(df) and must be
+    picklable (module-level cleaners, or functools.partial of them).
+    Logs initial_row_count, duplicates_dropped and the summed step metrics and step
+    timings for each dataset and returns {dataset_name: rows written}.
+    """
+    plans = []
+    for dataset in datasets:
+        header, ranges = partition_file(dataset['filepath'], partition_bytes)
+        dtypes = pinned_dtypes(dataset['filepath'], DTYPE_SAMPLE_ROWS)
+        plans.append(({**dataset, 'steps': defer_titles(dataset['steps'])}, header, ranges, dtypes))
+
+    final_rows = {}
+    with tempfile.TemporaryDirectory(prefix='parallel_') as tmpdir, ProcessPoolExecutor(max_workers) as pool:
+        # Pass 1: parse every partition of every dataset and hash its rows
+        hash_jobs = [
+            [
+                pool.submit(_hash_partition, dataset['filepath'], header, start, end, dtypes,
+                            _parsed_path(tmpdir, dataset, i))
+                for i, (start, end) in enumerate(ranges)
+            ]
+            for dataset, header, ranges, dtypes in plans
+        ]
+
+        # Pass 2: clean each parsed partition once the dataset's keep mask is known
+        clean_jobs = []
+        for (dataset, _, ranges, _), jobs in zip(plans, hash_jobs):
+            digests = [job.result() for job in jobs]
+            keep = np.zeros(sum(len(d) for d in digests), dtype=bool)
+            keep[np.unique(np.concatenate(digests), return_index=True)[1]] = True
+
+            offsets = np.cumsum([0] + [len(d) for d in digests])
+            jobs = []
+            for i in range(len(ranges)):
+                partition_path = os.path.join(tmpdir, f"{dataset['dataset_name']}_{i:05d}.arrow")
+                job = pool.submit(
+                    _clean_partition, _parsed_path(tmpdir, dataset, i), keep[offsets[i]:offsets[i + 1]],
+                    dataset['dataset_name'], dataset['steps'], partition_path
+                )
+                jobs.append((job, partition_path))
+            clean_jobs.append((dataset, len(keep), int(keep.sum()), jobs))
+
+        # Stitch partitions back together in file order and merge the metrics
+        for dataset, initial_rows, unique_rows, jobs in clean_jobs:
+            dataset_name = dataset['dataset_name']
+            totals = {'initial_row_count': initial_rows, 'duplicates_dropped': initial_rows - unique_rows}
+            writer = get_writer(dataset.get('output_format', 'csv'), dataset['output_path'],
+                                **(dataset.get('writer_options') or {}))
+            with writer:
+                for job, partition_path in jobs:
+                    rows, metrics, step_timings, pending = job.result()
+                    title_ids, title_metrics = match_pending(dataset['steps'], pending)
+                    for metric, value in title_metrics.items():
+                        metrics[metric] += value
+                    for metric, value in metrics.items():
+                        if metric in NON_ADDITIVE_METRICS:
+                            totals[metric] = value
+                        else:
+                            totals[metric] = totals.get(metric, 0) + value
+                    for step, timings in step_timings.items():
+                        metrics_logger.log_step_timing(dataset_name, step, timings)
+                    writer.write(fill_title_ids(read_output(partition_path), title_ids))
+
+            for metric, value in totals.items():
+                metrics_logger.log_metric(dataset_name, metric, value)
+            final_rows[dataset_name] = writer.rows_written
+            print(f"Cleaned {initial_rows} rows of {dataset_name} in {len(jobs)} partition(s), wrote {writer.rows_written} rows")
+
+    return final_rows
@@ -0,0 +1,583 @@
+"""
+Config-driven pipeline engine for the cleaner functions in json_data_clean.py.
+
+A YAML or JSON file declares the datasets, their cleaning steps and the step
+parameters (see pipeline.yaml):
+
+    datasets:
+      systembook_metrics:
+        input: 03_Library Systembook.csv
+        output: cleaned_library_systembook
+        steps:
+          - duplicates
+          - na
+          - dates: {columns: [Book checkout, Book Returned]}
+          - loan_duration: {checkout: Book checkout, returned: Book Returned}
+          - references: {column: Customer ID, dataset: customers_metrics}
+          - borrow_period: {column: Days allowed to borrow}
+          - overdue: {fine_pence_per_day: 20}
+          - ids: {columns: [Id, Customer ID]}
+          - titles: {column: Books}
+
+Before anything runs, each dataset's steps are planned against the file header:
+
+- skip:    steps that would do nothing are dropped (columns not in the file, a date or
+           ID column that an earlier step already converted, a repeated duplicates/na
+           filter with nothing changed in between, `enabled: false`)
+- reorder: row filters are moved ahead of expensive steps when the steps do not touch
+           each other's columns, so a bad row is rejected before it is enriched. Row
+           filters keep their order among themselves: a row two of them would reject is
+           counted by the first, so swapping them would change their metrics
+- fuse:    neighbouring date steps are parsed together and filtered once (datesCleaner)
+
+Reordering changes how many rows the steps that are not filters see, so their metrics
+(e.g. borrow_periods_unparsed) are counted on the rows that reach them; the cleaned
+output and the filter metrics do not change. Switch it off with
+`optimize: {reorder: false}` to keep every metric of the hand-written scripts.
+
+Runners: 'memory' (default), 'streaming' (streaming.py, needs chunksize) and
+'parallel' (parallel.py). Both of the latter drop duplicates over the whole file
+before the steps, so the duplicates step is handled by the runner there.
+
+`backend: polars` runs the memory runner's steps as one lazy Polars query instead of
+the pandas cleaners (see polars_backend.py); outputs and metrics are the same.
+
+With `quarantine: true` the memory and streaming runners write every rejected row
+with its reason code to rejected_<output> (see quarantine.py).
+
+`customer_usage: {loans: <dataset>, customers: <dataset>}` writes one row of usage per
+customer from the two cleaned outputs after the datasets have run (see customer_usage.py).
+
+A references step rejects the rows whose ID in column is not in the cleaned output of
+another dataset (its `key` column, by default the same name; see integrity.py). Datasets
+run after the datasets they reference, so loans are checked against the customers
+cleaned in the same run.
+
+`step_cache: {dir: .step_cache, max_mb: 1024}` (dir relative to output_dir) lets the
+memory runner of the pandas backend pick up the frames of an earlier run over the same
+input files, steps and code instead of cleaning again (see step_cache.py).
+
+`mapped_output: true` also writes each cleaned output as an uncompressed Arrow IPC file,
+which the dashboard and lookup.py memory-map instead of loading a copy per process
+(see writers.open_output()).
+
+An input may also be a directory or a glob (`input: branches/*.csv`): every file is
+cleaned with the dataset's steps on a process pool and the clean rows go to one output
+with a source_file column, whatever the runner (see multi_file.py). A file that cannot
+be cleaned is left out and counted in files_failed instead of failing the dataset.
+
+The titles step matches book titles against output_dir/title_catalog.json, which is
+saved after each run so title ids stay the same between runs (see title_normalizer.py).
+
+Usage: python pipeline.py [config file]
+"""
+
+import json
+import os
+import sys
+from functools import partial
+
+import pandas as pd
+
+import json_data_clean as cleaners
+import polars_backend
+from customer_usage import CustomerUsage
+from integrity import IdSet
+from metrics_store import store_path
+from multi_file import clean_files, expand_inputs, is_multi_input
+from overdue import FINE_PENCE_PER_DAY, whole_pence
+from parallel import DEFAULT_PARTITION_BYTES, run_datasets
+from quarantine import QuarantineSink, quarantine_path
+from step_cache import DEFAULT_MAX_BYTES, StepCache, run_cached_steps
+from streaming import stream_clean
+from title_normalizer import TitleCatalog, title_catalog_path
+from writers import cleaned_output_path, read_output, write_dataframe, write_mapped_copy
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline.yaml')
+RUNNERS = ('memory', 'streaming', 'parallel')
+BACKENDS = ('pandas', 'polars')
+
+# Every column of the frame
+ALL = 'ALL'
+
+# Relative cost of each step per row; row filters with a lower cost run first
+STEP_COSTS = {
+    'na': 1, 'ids': 1, 'references': 1, 'borrow_period': 1, 'overdue': 1,
+    'duplicates': 2, 'loan_duration': 2, 'titles': 2, 'dates': 3
+}
+ROW_FILTERS = {'duplicates', 'na', 'dates', 'loan_duration', 'references'}
+
+# Filters that change nothing when run twice in a row
+IDEMPOTENT_STEPS = {'duplicates', 'na'}
+
+
+class Step:
+    """One configured cleaning step: its kind, parameters and the columns it reads/writes"""
+
+    def __init__(self, kind, params=None):
+        if kind not in STEP_COSTS:
+            raise ValueError(f"Unknown step '{kind}', expected one of {sorted(STEP_COSTS)}")
+        self.kind = kind
+        self.params = dict(params or {})
+        if kind == 'overdue':
+            # Checked here so a fractional fine fails when the config is read, not halfway through a run
+            for name in ('fine_pence_per_day', 'max_fine_pence'):
+                if self.params.get(name) is not None:
+                    whole_pence(self.params[name], name)
+
+    @property
+    def columns(self):
+        return list(self.params.get('columns', []))
+
+    @property
+    def reads(self):
+        if self.kind in ('duplicates', 'na'):
+            return ALL
+        if self.kind == 'loan_duration':
+            return {self.params['checkout'], self.params['returned']}
+        if self.kind in ('references', 'borrow_period', 'titles'):
+            return {self.params['column']}
+        if self.kind == 'overdue':
+            return {'days_borrowed', 'borrow_period_days'}
+        return set(self.columns)
+
+    @property
+    def writes(self):
+        if self.kind in ('dates', 'ids'):
+            return set(self.columns)
+        if self.kind == 'loan_duration':
+            return {'days_borrowed', 'valid_loan_flag'}
+        if self.kind == 'borrow_period':
+            return {'borrow_period_days'}
+        if self.kind == 'overdue':
+            return {'days_overdue', 'is_overdue', 'fine_estimate_pence'}
+        if self.kind == 'titles':
+            return {'title_id'}
+        return set()
+
+    @property
+    def reference(self):
+        """(dataset, key column) a references step checks its column against"""
+        return self.params['dataset'], self.params.get('key', self.params['column'])
+
+    def conflicts_with(self, other):
+        """True when the two steps must keep their relative order"""
+        return (
+            # Which filter rejects a row (and counts it) depends on their order
+            (self.kind in ROW_FILTERS and other.kind in ROW_FILTERS)
+            or _overlaps(self.reads, other.writes)
+            or _overlaps(self.writes, other.reads)
+            or _overlaps(self.writes, other.writes)
+        )
+
+    def bind(self, dataset_name, source=None, title_catalog=None, references=None):
+        """
+        The cleaner call for this step as a df -> df callable (picklable for parallel.py).
+
+        references maps each step's reference to the IdSet of its IDs.
+        """
+        if self.kind == 'duplicates':
+            return partial(cleaners.duplicateCleaner, dataset_name=dataset_name)
+        if self.kind == 'na':
+            return partial(cleaners.naCleaner, dataset_name=dataset_name)
+        if self.kind == 'dates':
+            return partial(cleaners.datesCleaner, self.columns, dataset_name=dataset_name, source=source)
+        if self.kind == 'loan_duration':
+            return partial(
+                cleaners.enrich_dateDuration, self.params['checkout'], self.params['returned'],
+                dataset_name=dataset_name
+            )
+        if self.kind == 'references':
+            return partial(
+                cleaners.referenceCleaner, self.params['column'], dataset_name=dataset_name,
+                known_ids=references[self.reference]
+            )
+        if self.kind == 'borrow_period':
+            return partial(cleaners.borrowPeriodCleaner, self.params['column'], dataset_name=dataset_name)
+        if self.kind == 'overdue':
+            return partial(
+                cleaners.enrich_overdue, 'days_borrowed', 'borrow_period_days', dataset_name=dataset_name,
+                fine_pence_per_day=self.params.get('fine_pence_per_day', FINE_PENCE_PER_DAY),
+                max_fine_pence=self.params.get('max_fine_pence')
+            )
+        if self.kind == 'titles':
+            return partial(cleaners.titleCleaner, self.params['column'], dataset_name=dataset_name, catalog=title_catalog)
+        return partial(cleaners.idCleaner, self.columns, dataset_name=dataset_name)
+
+    def __eq__(self, other):
+        return isinstance(other, Step) and (self.kind, self.params) == (other.kind, other.params)
+
+    def __repr__(self):
+        return f'Step({self.kind!r}, {self.params!r})' if self.params else f'Step({self.kind!r})'
+
+
+def _overlaps(a, b):
+    if not a or not b:
+        return False
+    return a == ALL or b == ALL or bool(a & b)
+
+
+def parse_steps(step_configs):
+    """Turn the config list (names or single-key {name: params} mappings) into Steps"""
+    steps = []
+    for entry in step_configs:
+        if isinstance(entry, str):
+            steps.append(Step(entry))
+        else:
+            (kind, params), = entry.items()
+            steps.append(Step(kind, params))
+    return steps
+
+
+def skip_noops(steps, header):
+    """Drop steps that cannot change the data, given the columns available in the file"""
+    columns = set(header)
+    converted = {'dates': set(), 'ids': set()}
+    # Idempotent filters that have run with no column written since
+    clean_since = set()
+    planned = []
+
+    for step in steps:
+        if step.params.get('enabled') is False:
+            continue
+        step = Step(step.kind, {k: v for k, v in step.params.items() if k != 'enabled'})
+
+        if step.kind == 'loan_duration':
+            missing = step.reads - columns
+            if missing:
+                raise ValueError(f"loan_duration needs columns {sorted(missing)} that are not in the data")
+
+        if step.kind in ('references', 'borrow_period', 'titles') and step.params['column'] not in columns:
+            continue
+        if step.kind == 'overdue' and not step.reads <= columns:
+            # Needs the days_borrowed and borrow_period_days of earlier steps
+            continue
+
+        if step.kind in converted:
+            todo = [col for col in step.columns if col in columns and col not in converted[step.kind]]
+            if not todo:
+                continue
+            step = Step(step.kind, {**step.params, 'columns': todo})
+            converted[step.kind].update(todo)
+
+        if step.kind in clean_since:
+            # Only row filters have run since this filter did, so it would find nothing new
+            continue
+
+        # A column another step writes to has to be converted again afterwards
+        for kind, done in converted.items():
+            if kind != step.kind:
+                done -= step.writes
+        columns |= step.writes
+
+        planned.append(step)
+        if step.writes:
+            clean_since.clear()
+        if step.kind in IDEMPOTENT_STEPS:
+            clean_since.add(step.kind)
+    return planned
+
+
+def reorder_steps(steps):
+    """
+    Run cheap row filters as early as possible.
+
+    A step can only move ahead of the steps it does not conflict with, so every pair
+    of steps that share columns keeps its order. Among the steps that are free to run
+    next, row filters go before other steps and cheaper ones before expensive ones.
+    """
+    remaining = list(enumerate(steps))
+    ordered = []
+    while remaining:
+        ready = [
+            (i, step) for i, step in remaining
+            if not any(j < i and other.conflicts_with(step) for j, other in remaining)
+        ]
+        i, step = min(ready, key=lambda item: (item[1].kind not in ROW_FILTERS, STEP_COSTS[item[1].kind], item[0]))
+        remaining.remove((i, step))
+        ordered.append(step)
+    return ordered
+
+
+def fuse_steps(steps):
+    """Merge neighbouring date steps into one multi-column date step"""
+    fused = []
+    for step in steps:
+        if fused and step.kind == 'dates' and fused[-1].kind == 'dates':
+            fused[-1] = Step('dates', {**fused[-1].params, 'columns': fused[-1].columns + step.columns})
+        else:
+            fused.append(step)
+    return fused
+
+
+def plan_steps(steps, header, optimize=None):
+    """Apply the skip / reorder / fuse passes switched on in optimize (all on by default)"""
+    optimize = {'skip_noops': True, 'reorder': True, 'fuse': True, **(optimize or {})}
+    if optimize['skip_noops']:
+        steps = skip_noops(steps, header)
+    else:
+        steps = [step for step in steps if step.params.get('enabled', True)]
+    if optimize['reorder']:
+        steps = reorder_steps(steps)
+    if optimize['fuse']:
+        steps = fuse_steps(steps)
+    return steps
+
+
+def load_config(path):
+    """Read a pipeline config from YAML (.yaml/.yml) or JSON; relative dirs resolve from the file"""
+    with open(path, 'r') as f:
+        if path.endswith('.json'):
+            config = json.load(f)
+        else:
+            import yaml
+            config = yaml.safe_load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for key in ('input_dir', 'output_dir'):
+        config[key] = os.path.join(base_dir, config.get(key, '.'))
+
+    runner = config.get('runner', 'memory')
+    if runner not in RUNNERS:
+        raise ValueError(f"Unknown runner '{runner}', expected one of {RUNNERS}")
+    if runner == 'streaming' and not config.get('chunksize'):
+        raise ValueError("The streaming runner needs a chunksize")
+
+    backend = config.get('backend', 'pandas')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+    if backend == 'polars' and runner != 'memory':
+        raise ValueError("The polars backend only runs with the memory runner")
+    return config
+
+
+class Pipeline:
+    """Plans and runs every dataset declared in a pipeline config"""
+
+    def __init__(self, config):
+        self.config = config
+        self.runner = config.get('runner', 'memory')
+        self.backend = config.get('backend', 'pandas')
+        self.output_format = config.get('output_format', 'csv')
+        self.writer_options = config.get('writer_options') or {}
+        self.title_catalog = TitleCatalog(title_catalog_path(config['output_dir']))
+        self.step_cache = self.make_step_cache(config.get('step_cache'))
+        self.plans = {name: self.plan(name, dataset) for name, dataset in config['datasets'].items()}
+        # IdSet of each (dataset, key column) a references step checks against, loaded once the dataset has run
+        self.references = {}
+        self.waves = self.run_order()
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_config(path))
+
+    def input_path(self, dataset):
+        return os.path.join(self.config['input_dir'], dataset['input'])
+
+    def input_paths(self, dataset):
+        """The input files of a dataset: one, or every file of a directory or glob input"""
+        return expand_inputs(self.input_path(dataset))
+
+    def is_multi(self, dataset):
+        return is_multi_input(self.input_path(dataset))
+
+    def output_path(self, dataset):
+        return cleaned_output_path(self.config['output_dir'], dataset['output'], self.output_format)
+
+    def make_step_cache(self, options):
+        """StepCache for the memory runner of the pandas backend, or None"""
+        if not options or self.runner != 'memory' or self.backend != 'pandas':
+            return None
+        cache_dir = os.path.join(self.config['output_dir'], options.get('dir', '.step_cache'))
+        return StepCache(cache_dir, options.get('max_mb', DEFAULT_MAX_BYTES // 2**20) * 2**20)
+
+    def quarantine_sink(self, dataset):
+        """Sink for the rejected rows of a dataset, or None if quarantine is off"""
+        if not self.config.get('quarantine') or self.runner == 'parallel':
+            return None
+        name = dataset['output'].removeprefix('cleaned_')
+        path = quarantine_path(self.config['output_dir'], name, self.output_format)
+        return QuarantineSink(path, self.output_format, **self.writer_options)
+
+    def plan(self, name, dataset):
+        paths = self.input_paths(dataset)
+        if not paths:
+            raise FileNotFoundError(f"No input files match {self.input_path(dataset)}")
+        # Branch exports of one dataset share a layout, so the first file's header plans them all
+        header = pd.read_csv(paths[0], nrows=0).columns
+        steps = parse_steps(dataset['steps'])
+        if self.runner != 'memory' and not self.is_multi(dataset):
+            # The streaming and parallel runners drop duplicates across the whole file themselves
+            steps = [step for step in steps if step.kind != 'duplicates']
+        return plan_steps(steps, header, self.config.get('optimize'))
+
+    def dependencies(self, name):
+        """The datasets the references steps of a dataset check against"""
+        return {step.reference[0] for step in self.plans[name] if step.kind == 'references'}
+
+    def run_order(self):
+        """Dataset names in waves: every dataset runs in a wave after the datasets it references"""
+        for name in self.plans:
+            unknown = self.dependencies(name) - set(self.plans)
+            if unknown:
+                raise ValueError(f"{name} references datasets {sorted(unknown)} that are not in the config")
+
+        waves, done, pending = [], set(), list(self.plans)
+        while pending:
+            wave = [name for name in pending if self.dependencies(name) <= done]
+            if not wave:
+                raise ValueError(f"Datasets {pending} reference each other")
+            waves.append(wave)
+            done.update(wave)
+            pending = [name for name in pending if name not in done]
+        return waves
+
+    def downstream(self, names):
+        """The named datasets and every dataset that references one of them, directly or through another"""
+        selected = set(names)
+        for wave in self.waves:
+            selected.update(name for name in wave if self.dependencies(name) & selected)
+        return selected
+
+    def load_references(self, name):
+        """Read the IDs the references steps of a dataset need from the outputs written so far"""
+        for step in self.plans[name]:
+            if step.kind == 'references' and step.reference not in self.references:
+                dataset, key = step.reference
+                self.references[step.reference] = IdSet.from_output(self.output_path(self.config['datasets'][dataset]), key)
+
+    def run(self, names=None):
+        """
+        Clean every dataset (or only the named ones), write the outputs and return {dataset:
+        final row count}. Datasets that are not run keep their outputs from an earlier run,
+        which references steps read as usual.
+        """
+        os.makedirs(self.config['output_dir'], exist_ok=True)
+        selected = set(self.plans) if names is None else set(names)
+        waves = [[name for name in wave if name in selected] for wave in self.waves]
+        waves = [wave for wave in waves if wave]
+        for name in [name for wave in waves for name in wave]:
+            print(f"Plan for {name}: {' -> '.join(step.kind for step in self.plans[name])}")
+
+        if self.runner == 'parallel':
+            partition_bytes = self.config.get('partition_size_mb', DEFAULT_PARTITION_BYTES // 2**20) * 2**20
+            final_rows = {}
+            for wave in waves:
+                datasets = []
+                for name in wave:
+                    dataset = self.config['datasets'][name]
+                    self.load_references(name)
+                    if self.is_multi(dataset):
+                        final_rows[name] = self.run_dataset(name, dataset)
+                        continue
+                    datasets.append({
+                        'dataset_name': name,
+                        'filepath': self.input_path(dataset),
+                        'steps': [
+                            step.bind(name, self.input_path(dataset), self.title_catalog, self.references)
+                            for step in self.plans[name]
+                        ],
+                        'output_path': self.output_path(dataset),
+                        'output_format': self.output_format,
+                        'writer_options': self.writer_options
+                    })
+                if datasets:
+                    final_rows.update(run_datasets(
+                        datasets, cleaners.metrics_logger, self.config.get('max_workers'), partition_bytes
+                    ))
+        else:
+            final_rows = {}
+            for name in [name for wave in waves for name in wave]:
+                self.load_references(name)
+                final_rows[name] = self.run_dataset(name, self.config['datasets'][name])
+
+        if self.title_catalog.misses:
+            self.title_catalog.save()
+        for name, rows in final_rows.items():
+            log_final_metrics(name, rows)
+        if self.config.get('mapped_output'):
+            for name in final_rows:
+                write_mapped_copy(self.output_path(self.config['datasets'][name]))
+        usage = self.config.get('customer_usage')
+        usage_datasets = {usage['loans'], usage['customers']} if usage else set()
+        # Rebuilt when either side was cleaned, if both are in this pipeline
+        if usage_datasets & selected and usage_datasets <= set(self.plans):
+            self.build_customer_usage()
+        return final_rows
+
+    def build_customer_usage(self):
+        """Aggregate the cleaned loans per customer into the customer_usage output"""
+        datasets = self.config['datasets']
+        loans, customers = self.config['customer_usage']['loans'], self.config['customer_usage']['customers']
+        usage = CustomerUsage(
+            self.config['output_dir'], self.output_path(datasets[loans]), self.output_format, self.writer_options
+        )
+        usage_df = usage.rebuild(read_output(self.output_path(datasets[customers])))
+        cleaners.metrics_logger.log_metric(customers, 'usage_customers', len(usage_df))
+        return usage_df
+
+    def run_dataset(self, name, dataset):
+        filepath = self.input_path(dataset)
+        steps = [step.bind(name, filepath, self.title_catalog, self.references) for step in self.plans[name]]
+        sink = self.quarantine_sink(dataset)
+
+        if self.is_multi(dataset):
+            final_rows = clean_files(
+                self.input_paths(dataset), name, steps, self.output_path(dataset), cleaners.metrics_logger,
+                max_workers=self.config.get('max_workers'), output_format=self.output_format,
+                writer_options=self.writer_options, quarantine=sink
+            )
+        elif self.runner == 'streaming':
+            final_rows = stream_clean(
+                filepath, name, steps, self.output_path(dataset), cleaners.metrics_logger,
+                chunksize=self.config['chunksize'], output_format=self.output_format,
+                writer_options=self.writer_options, quarantine=sink
+            )
+        else:
+            if self.backend == 'polars':
+                df = polars_backend.clean_lazy(
+                    filepath, name, self.plans[name], cleaners.metrics_logger, filepath, sink, self.title_catalog,
+                    self.references
+                )
+                polars_backend.write_output(df, self.output_path(dataset), self.output_format, **self.writer_options)
+            else:
+                df = run_cached_steps(filepath, name, cleaners.fileLoader, steps, self.step_cache, sink)
+                write_dataframe(df, self.output_path(dataset), self.output_format, **self.writer_options)
+            final_rows = len(df)
+
+        if sink is not None:
+            sink.close()
+            cleaners.metrics_logger.log_metric(name, 'rows_quarantined', sink.rows_written)
+        return final_rows
+
+
+def save_run_metrics(output_dir):
+    """Save the run's metrics: pipeline_metrics.json and the metrics store that keeps the run history"""
+    # A run that failed while planning never created the output directory
+    os.makedirs(output_dir, exist_ok=True)
+    cleaners.metrics_logger.save_metrics(f"{output_dir}/pipeline_metrics.json")
+    cleaners.metrics_logger.save_to_store(store_path(output_dir))
+
+
+def log_final_metrics(dataset_name, final_rows):
+    """final_row_count, total_rows_dropped and data_retention_rate, as logged by the scripts"""
+    initial_rows = cleaners.metrics_logger.metrics[dataset_name]['initial_row_count']
+    cleaners.metrics_logger.log_metric(dataset_name, 'final_row_count', final_rows)
+    cleaners.metrics_logger.log_metric(dataset_name, 'total_rows_dropped', initial_rows - final_rows)
+    cleaners.metrics_logger.log_metric(
+        dataset_name,
+        'data_retention_rate',
+        round((final_rows / initial_rows) * 100, 2) if initial_rows else 100.0
+    )
+
+
+if __name__ == '__main__':
+    print('**************** Starting Clean ****************')
+
+    pipeline = Pipeline.from_file(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CONFIG)
+    pipeline.run()
+
+    cleaners.metrics_logger.print_summary()
+    save_run_metrics(pipeline.config['output_dir'])
+
+    print('**************** End ****************')
@@ -0,0 +1,355 @@
+"""
+Lazy Polars backend for the pipeline engine (pipeline.py, `backend: polars`).
+
+The planned steps are turned into one Polars lazy query instead of a chain of eager
+pandas frames. Without a quarantine each row filter is a real filter in the query, so
+the later steps (map_batches included) only see the rows still valid, and each step's
+counts are taken from the query as it is at that step. With a quarantine the rejected
+rows are needed too, so no step filters: each row filter records its own index in a
+_rejected_by column for the rows it rejects (the first filter to reject a row keeps
+it, as with RowValidity in quarantine.py). Either way the clean rows, the metric
+counts and the rejected rows are collected together with collect_all(), so Polars
+optimizes them as one plan with the shared part computed once: the CSV is scanned
+once, only the columns in use are read, and the work runs on all cores.
+
+Output rows, values and MetricsLogger counts match the pandas backend:
+- CSV values are read as null for the same NA strings pandas uses
+- dates are parsed with the format date_parser.py infers for the (file, column), or,
+  when none can be guessed, by parsing the distinct values with pandas
+- write_output() writes CSV with Polars in the format pandas' to_csv uses (True/False,
+  dates without a time), and hands Parquet/Arrow to writers.py as a pandas frame with
+  the pandas backend's dtypes (Int64 IDs and days_borrowed, datetime64 dates)
+
+Step timings are recorded for the query as a whole, as 'lazyQuery', because the steps
+no longer run one at a time. Lateness (days_overdue, is_overdue, fine_estimate_pence)
+is plain column arithmetic in the query; borrow periods and book titles are parsed and
+matched in Python, once per distinct value, through map_batches, and IDs are checked
+against the referenced dataset's IdSet (integrity.py) the same way.
+"""
+
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+from borrow_period import parse_borrow_period
+from date_parser import date_format_cache, strip_quotes
+from instrumentation import peak_rss_mb, rss_timings
+from overdue import FINE_PENCE_PER_DAY, whole_pence
+from quarantine import REASON_COLUMN, ROW_COLUMN
+from title_normalizer import title_catalog as shared_title_catalog
+from writers import write_dataframe
+
+# Rows polars reads to infer column types (same sample as dtype_planner.py)
+SCHEMA_SAMPLE_ROWS = 100_000
+
+REJECTED_BY = '_rejected_by'
+NA_VALUES = sorted(STR_NA_VALUES)
+
+
+def available():
+    return pl is not None
+
+
+def date_expr(filepath, col, source, sample):
+    """Expression parsing a text date column the way date_parser.parse_dates would"""
+    values = strip_quotes(pd.Series(sample[col].drop_nulls().unique(maintain_order=True).to_list(), dtype=str))
+    fmt = date_format_cache.get_format(source, col, values)
+
+    stripped = pl.col(col).str.replace_all('"', '', literal=True)
+    if fmt is not None:
+        return stripped.str.strptime(pl.Datetime('us'), fmt, strict=False)
+
+    # No format to parse against: parse each distinct value with pandas and map them back
+    uniques = pl.scan_csv(filepath, null_values=NA_VALUES, schema=sample.schema).select(pl.col(col).unique())
+    uniques = uniques.collect()[col].drop_nulls().to_list()
+    parsed = pd.to_datetime(strip_quotes(pd.Series(uniques, dtype=str)), dayfirst=True, errors='coerce')
+    return pl.col(col).replace_strict(
+        uniques, pl.Series(parsed.astype('datetime64[us]')), default=None, return_dtype=pl.Datetime('us')
+    )
+
+
+class LazyClean:
+    """The planned steps of one dataset as a single lazy query"""
+
+    def __init__(self, filepath, steps, source=None, title_catalog=None, references=None, quarantine=False):
+        # One sample gives the column types and the values to guess date formats from
+        self.sample = pl.read_csv(filepath, n_rows=SCHEMA_SAMPLE_ROWS, null_values=NA_VALUES)
+        self.columns = list(self.sample.columns)
+        # Rejected rows are kept (and marked) only when the quarantine needs them
+        self.marking = quarantine
+        self.query = pl.scan_csv(filepath, null_values=NA_VALUES, schema=self.sample.schema)
+        if self.marking:
+            self.query = self.query.with_row_index(ROW_COLUMN).with_columns(
+                pl.lit(None, dtype=pl.Int32).alias(REJECTED_BY)
+            )
+        self.reasons = []
+        # (metric, expression, frame it is counted on), see count()
+        self.metrics = []
+        self.count('initial_row_count', pl.len())
+        self.originals = {}
+        self.title_catalog = shared_title_catalog if title_catalog is None else title_catalog
+        self.references = references or {}
+        # The pandas backend writes the rejected rows out before the first step that is not a
+        # row filter (see quarantine.run_steps), so they only have the columns up to there
+        self.rejected_columns = None
+
+        for step in steps:
+            getattr(self, f'_{step.kind}')(filepath, source, **step.params)
+
+    @property
+    def valid(self):
+        """Expression that is true for the rows no filter has rejected so far"""
+        return pl.col(REJECTED_BY).is_null() if self.marking else pl.lit(True)
+
+    def count(self, name, expr, frame=None):
+        """
+        Log the aggregate expr as metric name, counted on frame: by default the query as it
+        is now when filtering, or as it ends up when marking (rows are only marked then)
+        """
+        if frame is None and not self.marking:
+            # Cached, so the clean rows and the counts share the work up to here
+            frame = self.query = self.query.cache()
+        self.metrics.append((name, expr, frame))
+
+    def reject(self, flag, reason, extra=()):
+        """
+        Reject the still valid rows where flag is true by a new filter, adding the extra
+        columns first. Returns the count of rejected rows and the frame for count().
+        """
+        self.reasons.append(reason)
+        flag = flag.fill_null(False)
+        if not self.marking:
+            # Cached, so the rows after the filter and the counts share the work up to here
+            counted_on = self.query.with_columns(*extra).cache()
+            self.query = counted_on.filter(~flag)
+            return flag.sum(), counted_on
+
+        index = len(self.reasons) - 1
+        self.query = self.query.with_columns(
+            pl.when(self.valid & flag).then(pl.lit(index, dtype=pl.Int32)).otherwise(pl.col(REJECTED_BY))
+            .alias(REJECTED_BY),
+            *extra
+        )
+        return (pl.col(REJECTED_BY) == index).sum(), None
+
+    def _duplicates(self, filepath, source):
+        dropped, frame = self.reject(~pl.struct(self.columns).is_first_distinct(), 'duplicate')
+        self.count('duplicates_dropped', dropped, frame)
+
+    def _na(self, filepath, source):
+        blanks = f'_blank_cells_{len(self.reasons)}'
+        nulls = pl.sum_horizontal([pl.col(col).is_null() for col in self.columns])
+        counted = pl.when(self.valid).then(nulls).otherwise(0).alias(blanks)
+        dropped, frame = self.reject(nulls > 0, 'missing_values', extra=[counted])
+        self.count('blank_cells_found', pl.col(blanks).sum(), frame)
+        self.count('na_rows_dropped', dropped, frame)
+
+    def _dates(self, filepath, source, columns):
+        for col in columns:
+            if col not in self.originals:
+                self.originals[col] = f'_original_{col}'
+                self.query = self.query.with_columns(
+                    pl.col(col).alias(self.originals[col]), date_expr(filepath, col, source, self.sample).alias(col)
+                )
+            invalid, frame = self.reject(pl.col(col).is_null(), f'invalid_date:{col}')
+            self.count(f'{col}_invalid_dates', invalid, frame)
+            self.count(f'{col}_rows_dropped', invalid, frame)
+
+    def _loan_duration(self, filepath, source, checkout, returned):
+        days = (pl.col(returned) - pl.col(checkout)).dt.total_days()
+        self.query = self.query.with_columns(
+            days.alias('days_borrowed'), days.ge(0).fill_null(False).alias('valid_loan_flag')
+        )
+        self.columns += [col for col in ('days_borrowed', 'valid_loan_flag') if col not in self.columns]
+
+        invalid, frame = self.reject(~pl.col('valid_loan_flag'), 'invalid_loan')
+        self.count('invalid_loans_found', invalid, frame)
+        self.count('invalid_loans_dropped', invalid, frame)
+
+    def _references(self, filepath, source, column, dataset, key=None):
+        known_ids = self.references[(dataset, column if key is None else key)]
+        orphans = pl.col(column).map_batches(partial(orphan_flags, known_ids=known_ids), return_dtype=pl.Boolean)
+        self.count(f'{column}_orphans', *self.reject(orphans, f'orphan:{column}'))
+
+    def _borrow_period(self, filepath, source, column):
+        unparsed = f'_unparsed_periods_{len(self.reasons)}'
+        days = pl.col(column).map_batches(borrow_period_days, return_dtype=pl.Int64)
+        self.query = self.query.with_columns(days.alias('borrow_period_days')).with_columns(
+            (self.valid & pl.col('borrow_period_days').is_null() & pl.col(column).is_not_null()).alias(unparsed)
+        )
+        if 'borrow_period_days' not in self.columns:
+            self.columns.append('borrow_period_days')
+        self.count('borrow_periods_unparsed', pl.col(unparsed).sum())
+
+    def _overdue(self, filepath, source, fine_pence_per_day=FINE_PENCE_PER_DAY, max_fine_pence=None):
+        fine_pence_per_day = whole_pence(fine_pence_per_day, 'fine_pence_per_day')
+        if max_fine_pence is not None:
+            max_fine_pence = whole_pence(max_fine_pence, 'max_fine_pence')
+        late = (pl.col('days_borrowed') - pl.col('borrow_period_days')).clip(lower_bound=0)
+        fine = late * fine_pence_per_day
+        if max_fine_pence is not None:
+            fine = fine.clip(upper_bound=max_fine_pence)
+        self.query = self.query.with_columns(
+            late.alias('days_overdue'), (late > 0).fill_null(False).alias('is_overdue'), fine.alias('fine_estimate_pence')
+        )
+        self.columns += [col for col in ('days_overdue', 'is_overdue', 'fine_estimate_pence') if col not in self.columns]
+
+        self.count('overdue_loans', (self.valid & pl.col('is_overdue')).sum())
+        self.count('fine_estimate_total_pence', pl.col('fine_estimate_pence').filter(self.valid).sum())
+
+    def _titles(self, filepath, source, column):
+        misses = self.title_catalog.misses
+        valid_titles = pl.when(self.valid).then(pl.col(column)) if self.marking else pl.col(column)
+        matched = valid_titles.map_batches(
+            partial(title_ids, catalog=self.title_catalog),
+            return_dtype=pl.Struct({'title_id': pl.Int64, '_title_variant': pl.Boolean})
+        )
+        self.query = self.query.with_columns(matched.alias('_titles')).unnest('_titles')
+        if 'title_id' not in self.columns:
+            self.columns.append('title_id')
+        # Counted once the query has run
+        self.count('new_title_spellings', lambda: self.title_catalog.misses - misses)
+        self.count('title_variant_rows', pl.col('_title_variant').sum())
+
+    def _ids(self, filepath, source, columns):
+        if self.rejected_columns is None:
+            self.rejected_columns = list(self.columns)
+        present = [col for col in columns if col in self.columns]
+        self.query = self.query.with_columns([pl.col(col).cast(pl.Int64) for col in present])
+        self.count('id_columns_converted', pl.lit(len(present)))
+
+    def collect(self):
+        """(clean rows, [(metric, value)], rejected rows as pandas, or None without a quarantine)"""
+        # One select per frame the metrics are counted on
+        frames, counts = [], []
+        for i, (_, expr, frame) in enumerate(self.metrics):
+            if callable(expr):
+                continue
+            frame = self.query if frame is None else frame
+            stage = next((j for j, known in enumerate(frames) if known is frame), None)
+            if stage is None:
+                stage = len(frames)
+                frames.append(frame)
+                counts.append([])
+            counts[stage].append(expr.alias(str(i)))
+
+        queries = [self.query.filter(self.valid).select(self.columns)]
+        queries += [frame.select(exprs) for frame, exprs in zip(frames, counts)]
+        if self.marking:
+            columns = self.columns if self.rejected_columns is None else self.rejected_columns
+            rejected_columns = [pl.col(self.originals.get(col, col)).alias(col) for col in columns]
+            queries.append(
+                self.query.filter(~self.valid).select([pl.col(ROW_COLUMN).cast(pl.Int64), *rejected_columns, REJECTED_BY])
+            )
+
+        results = pl.collect_all(queries)
+        values = {}
+        for result in results[1:len(frames) + 1]:
+            values.update({int(i): value for i, value in result.row(0, named=True).items()})
+        metrics = [
+            (name, int(expr() if callable(expr) else values[i])) for i, (name, expr, _) in enumerate(self.metrics)
+        ]
+        return results[0], metrics, self._rejected(results[-1]) if self.marking else None
+
+    def _rejected(self, frame):
+        rejected = to_pandas(frame.drop(REJECTED_BY))
+        rejected[REASON_COLUMN] = np.array(self.reasons, dtype=object)[frame[REJECTED_BY].to_numpy()]
+        return rejected
+
+
+def borrow_period_days(values):
+    """borrow_period.borrow_period_days for a Polars Series: each distinct value is parsed once"""
+    uniques = values.unique().drop_nulls()
+    days = pl.Series([parse_borrow_period(value) for value in uniques.cast(pl.String).to_list()], dtype=pl.Int64)
+    return values.replace_strict(uniques, days, default=None, return_dtype=pl.Int64)
+
+
+def orphan_flags(values, known_ids):
+    """integrity.IdSet.orphans for a Polars Series"""
+    return pl.Series(known_ids.orphans(values.to_numpy()), dtype=pl.Boolean)
+
+
+def title_ids(values, catalog):
+    """title_normalizer.assign_title_ids for a Polars Series, as a title_id/_title_variant struct"""
+    uniques = values.unique(maintain_order=True).drop_nulls()
+    matched = pl.DataFrame({
+        'spelling': uniques.cast(pl.String),
+        'title_id': [catalog.title_id(spelling) for spelling in uniques.cast(pl.String).to_list()]
+    }, schema={'spelling': pl.String, 'title_id': pl.Int64})
+    canonical = [catalog.titles.get(title_id) for title_id in matched['title_id'].to_list()]
+    matched = matched.with_columns(
+        (pl.Series(canonical, dtype=pl.String) != pl.col('spelling').str.strip_chars()).fill_null(False)
+        .alias('_title_variant')
+    )
+    frame = pl.DataFrame({'spelling': values.cast(pl.String)}).join(matched, on='spelling', how='left', maintain_order='left')
+    return frame.select('title_id', pl.col('_title_variant').fill_null(False)).to_struct()
+
+
+def to_pandas(frame):
+    """Polars frame -> pandas, with integer columns as Int64 like the pandas cleaners leave them"""
+    df = frame.to_pandas()
+    for col, dtype in frame.schema.items():
+        if dtype.is_integer() and col != ROW_COLUMN:
+            df[col] = df[col].astype('Int64')
+    return df
+
+
+def write_output(frame, path, output_format='csv', row_group_size=None, compression=None):
+    """Write the clean rows; the same file as writers.write_dataframe() of the pandas backend's frame"""
+    if output_format != 'csv' or compression is not None:
+        return write_dataframe(to_pandas(frame), path, output_format, row_group_size, compression)
+
+    as_pandas_writes = []
+    for col, dtype in frame.schema.items():
+        if dtype == pl.Boolean:
+            as_pandas_writes.append(
+                pl.when(pl.col(col)).then(pl.lit('True')).when(~pl.col(col)).then(pl.lit('False')).alias(col)
+            )
+        elif isinstance(dtype, pl.Datetime) and (frame[col].dt.truncate('1d') == frame[col]).all():
+            # pandas leaves the time off when every value is at midnight
+            as_pandas_writes.append(pl.col(col).dt.date())
+    frame.with_columns(as_pandas_writes).write_csv(path)
+    return path
+
+
+def clean_lazy(filepath, dataset_name, steps, metrics_logger, source=None, sink=None, title_catalog=None,
+               references=None):
+    """
+    Run the planned pipeline.Step list for one dataset as a lazy Polars query.
+
+    Logs the same metrics as the pandas cleaners, writes the rejected rows to sink if
+    given and returns the clean rows as a Polars DataFrame (see write_output).
+    references maps the reference of each references step to its IdSet (see pipeline.Step).
+    """
+    if pl is None:
+        raise ImportError("The polars backend needs polars (pip install polars)")
+
+    rss_start = peak_rss_mb()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    df, metrics, rejected = LazyClean(filepath, steps, source, title_catalog, references, sink is not None).collect()
+    for name, value in metrics:
+        metrics_logger.log_metric(dataset_name, name, value)
+    if rejected is not None and len(rejected):
+        sink.write(rejected)
+
+    metrics_logger.log_step_timing(dataset_name, 'lazyQuery', {
+        'calls': 1,
+        'wall_seconds': time.perf_counter() - wall_start,
+        # Polars works on its own threads, so this is the CPU time of all of them
+        'cpu_seconds': time.process_time() - cpu_start,
+        'rows_in': metrics[0][1],
+        'rows_out': len(df),
+        **rss_timings(rss_start)
+    })
+    print(f"Cleaned {metrics[0][1]} rows of {filepath} with the polars backend, kept {len(df)}")
+    return df
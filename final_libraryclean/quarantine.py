@@ -0,0 +1,191 @@
+"""
+Quarantine for rejected rows, and the row validity mask shared by the cleaning steps.
+
+The row filters (duplicateCleaner, naCleaner, dateCleaner, datesCleaner and
+enrich_dateDuration) take an optional RowValidity. Given one, a filter only marks the
+rows it rejects, with a reason code, instead of copying the surviving rows into a new
+frame. run_steps() passes one RowValidity through a list of steps and splits the frame
+into clean and rejected rows once: after the last step, or before a step that is not a
+filter (e.g. idCleaner) and needs the clean rows. A row rejected by several filters
+keeps the reason of the first one, so the metrics match running the filters one by one.
+borrowPeriodCleaner rejects nothing but takes a RowValidity too, so it only counts the
+valid rows and does not split the chain.
+
+Rejected rows are appended to a QuarantineSink (CSV, Parquet or Arrow, see writers.py)
+with the values they were rejected for (e.g. the raw text of an invalid date) and two
+extra columns:
+
+    source_row    - index of the row in the frame given to run_steps, i.e. its
+                    position in the source file for loaded or streamed frames (kept
+                    when run_steps splits off the clean rows before a later step)
+    reject_reason - duplicate, missing_values, invalid_date:<column>, invalid_loan or
+                    orphan:<column> (a reference not in the referenced dataset)
+
+A sink opened with append=True keeps the rows already in the file. The incremental mode
+of final_data_clean needs that: a row is only cleaned in the run that first sees it, so
+its reject is never produced again. The exception are the reasons given as recheck
+(e.g. orphan:, see incremental.py): those rows are cleaned again every run, so their
+earlier rejects are dropped from the file.
+"""
+
+import inspect
+import os
+
+import numpy as np
+import pandas as pd
+
+from writers import CsvWriter, cleaned_output_path, get_writer, read_output
+
+ROW_COLUMN = 'source_row'
+REASON_COLUMN = 'reject_reason'
+
+
+class RowValidity:
+    """Which rows of a frame are still valid, and why each of the others was rejected"""
+
+    def __init__(self, df):
+        self.valid = np.ones(len(df), dtype=bool)
+        self.codes = np.zeros(len(df), dtype=np.int8)
+        self.reasons = [None]
+        self.originals = {}
+        # Index of each row in the frame given to run_steps, kept across splits
+        self.rows = df.index.to_numpy()
+
+    @property
+    def rejected_count(self):
+        return int(len(self.valid) - self.valid.sum())
+
+    def reject(self, mask, reason):
+        """Reject the still valid rows where mask is True; returns how many that was"""
+        if hasattr(mask, 'to_numpy'):
+            mask = mask.to_numpy(dtype=bool, na_value=False)
+        rejected = mask & self.valid
+        count = int(rejected.sum())
+        if count:
+            if reason not in self.reasons:
+                self.reasons.append(reason)
+            self.codes[rejected] = self.reasons.index(reason)
+            self.valid &= ~rejected
+        return count
+
+    def keep_original(self, df, col):
+        """Remember col before a filter overwrites it, so rejected rows keep their raw values"""
+        self.originals.setdefault(col, df[col])
+
+    def remaining(self, clean_df):
+        """A fresh RowValidity for the clean rows split off by clean(), keeping their source rows"""
+        validity = RowValidity(clean_df)
+        validity.rows = self.rows[self.valid]
+        return validity
+
+    def clean(self, df):
+        """The valid rows with a fresh index; only copies the frame if rows were rejected"""
+        if self.valid.all():
+            return df.reset_index(drop=True)
+        return df[self.valid].reset_index(drop=True)
+
+    def rejected(self, df):
+        """The rejected rows in their original values, with source_row and reject_reason"""
+        mask = ~self.valid
+        rejected = df[mask]
+        for col, original in self.originals.items():
+            rejected[col] = original[mask]
+
+        # Categories differ between chunks, so they are written as plain values
+        for col in rejected.columns:
+            if isinstance(rejected[col].dtype, pd.CategoricalDtype):
+                rejected[col] = rejected[col].astype(rejected[col].cat.categories.dtype)
+
+        rejected.insert(0, ROW_COLUMN, self.rows[mask])
+        rejected[REASON_COLUMN] = np.array(self.reasons, dtype=object)[self.codes[mask]]
+        return rejected.reset_index(drop=True)
+
+
+def is_filter(step):
+    """True if the step's cleaner can mark rows in a RowValidity instead of dropping them"""
+    return 'validity' in inspect.signature(step).parameters
+
+
+def run_steps(df, steps, sink=None, validity=None):
+    """
+    Run cleaning steps over df and return the clean rows.
+
+    Filters share one RowValidity (validity, if the caller has already rejected rows),
+    and the clean and rejected rows are only materialized when a step that is not a
+    filter comes up and after the last step. Rejected rows are written to sink if given.
+    """
+    if validity is None:
+        validity = RowValidity(df)
+
+    for step in steps:
+        if is_filter(step):
+            df = step(df, validity=validity)
+        else:
+            df = _split(df, validity, sink)
+            validity = validity.remaining(df)
+            df = step(df)
+    return _split(df, validity, sink)
+
+
+def _split(df, validity, sink):
+    if sink is not None and validity.rejected_count:
+        sink.write(validity.rejected(df))
+    return validity.clean(df)
+
+
+def quarantine_path(output_dir, name, output_format):
+    """Quarantine file for a dataset, e.g. output-data/rejected_library_systembook.csv"""
+    return cleaned_output_path(output_dir, f'rejected_{name}', output_format)
+
+
+class QuarantineSink:
+    """Appends rejected rows to one quarantine file, chunk by chunk"""
+
+    def __init__(self, path, output_format='csv', row_group_size=None, compression=None, append=False, recheck=()):
+        self.path = path
+        self.writer = get_writer(output_format, path, row_group_size, compression)
+        # Rows of earlier runs, written back ahead of the first new reject (Parquet and Arrow cannot be appended to)
+        self.previous = None
+        self.rows_kept = 0
+        # Earlier rejects were dropped, so the file is rewritten even if this run rejects nothing
+        self.rewrite = False
+        if os.path.exists(path):
+            if not append:
+                # A run that rejects nothing must not leave the previous run's rejects behind
+                os.remove(path)
+            elif isinstance(self.writer, CsvWriter) and not recheck:
+                self.writer.header_written = True
+            else:
+                self.previous = read_output(path)
+                if recheck:
+                    rechecked = self.previous[REASON_COLUMN].astype(str).str.startswith(tuple(recheck))
+                    self.previous = self.previous[~rechecked.to_numpy()].reset_index(drop=True)
+                    self.rewrite = bool(rechecked.any())
+
+    @property
+    def rows_written(self):
+        """Rejected rows written by this run"""
+        return self.writer.rows_written - self.rows_kept
+
+    def write(self, rejected):
+        self._write_previous()
+        self.writer.write(rejected)
+
+    def _write_previous(self):
+        if self.previous is not None:
+            self.writer.write(self.previous)
+            self.rows_kept = len(self.previous)
+            self.previous = None
+
+    def close(self):
+        if self.rewrite:
+            self._write_previous()
+        self.writer.close()
+        if self.rows_written:
+            print(f"Quarantined {self.rows_written} rejected rows to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
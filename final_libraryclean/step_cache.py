@@ -0,0 +1,300 @@
+"""
+Content-addressed cache of the frames between cleaning steps.
+
+Re-running the pipeline on unchanged input files (dashboard refreshes, CI) redoes every
+step. With a StepCache, run_cached_steps() stores checkpoints: the state after loading the
+file, the state just before each expensive step (EXPENSIVE_STEPS) and the final state.
+Writing a frame after every step made a cold run slower than no cache at all. Each state
+is stored under a key made from:
+
+    the input file's content hash
+    the loader and every step before it: cleaner name and parameters
+    the code version: a hash of the source of the cleaner's module and of every module
+    it loaded from the same directory
+
+so a run with the same input, steps and code picks up the last checkpoint it finds and
+only runs the steps after it. Changing a step's parameters re-runs the steps from the
+checkpoint before it; editing a cleaner re-runs everything.
+
+Each entry is a directory holding:
+
+    frame.arrow         the frame, with the RowValidity mask, reason codes, source rows
+                        and the original values of overwritten columns as extra columns
+                        (Arrow IPC, read back memory-mapped)
+    rejected_<n>.arrow  the batches of rejected rows for the quarantine so far, if any
+    meta.json           the dataset's metrics so far, the reject reasons and the state
+                        of stateful step parameters
+
+Entries are evicted least recently used first (a hit refreshes an entry) once the cache
+holds more than max_bytes; a state bigger than max_bytes on its own is not written. Step parameters that are not plain values must have a
+cache_token() (e.g. integrity.IdSet hashes its IDs, a TitleCatalog its contents). A step
+with any other parameter, and every step after it, is not cached. A parameter that steps
+change as they run also has cache_state() and restore_cache_state(): a TitleCatalog
+learns the spellings of the titles step, and a hit past that step restores them.
+
+Only the memory runner caches; hits and misses are logged as step_cache_hits and
+step_cache_misses (the loader counts as a step).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+
+from quarantine import RowValidity, is_filter, run_steps
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Cleaners worth a checkpoint just before them (the slowest steps per row, see instrumentation.py)
+EXPENSIVE_STEPS = {'dateCleaner', 'datesCleaner', 'titleCleaner'}
+
+# Bump when the entry layout changes
+CACHE_FORMAT = 3
+
+VALID_COLUMN = '__cache_valid__'
+CODE_COLUMN = '__cache_reason_code__'
+ROW_COLUMN = '__cache_source_row__'
+ORIGINAL_PREFIX = '__cache_original__'
+
+
+def file_digest(path, block_size=1024 * 1024):
+    """blake2b hash of a file's contents"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_version(module_name):
+    """Hash of the source of a module and of the modules loaded from its directory"""
+    directory = os.path.dirname(os.path.abspath(sys.modules[module_name].__file__))
+    digest = hashlib.blake2b(digest_size=16)
+    paths = sorted({
+        os.path.abspath(module.__file__) for module in list(sys.modules.values())
+        if getattr(module, '__file__', None) and os.path.dirname(os.path.abspath(module.__file__)) == directory
+    })
+    paths = [path for path in paths if os.path.isfile(path)]
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def value_token(value):
+    """Stable text for one step parameter, or None if it cannot be part of a key"""
+    if hasattr(value, 'cache_token'):
+        return f'{type(value).__name__}({value.cache_token()})'
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        tokens = [value_token(item) for item in value]
+        return None if None in tokens else f"[{', '.join(tokens)}]"
+    if isinstance(value, dict):
+        tokens = {key: value_token(item) for key, item in value.items()}
+        return None if None in tokens.values() else repr(sorted(tokens.items()))
+    return None
+
+
+def step_signature(step):
+    """'module.cleaner(args, name=value)' for a (partial-wrapped) cleaner, or None if it cannot be cached"""
+    func = getattr(step, 'func', step)
+    keywords = sorted(getattr(step, 'keywords', {}).items())
+    tokens = [value_token(arg) for arg in getattr(step, 'args', ())] + [value_token(value) for _, value in keywords]
+    if None in tokens:
+        return None
+    names = [''] * (len(tokens) - len(keywords)) + [f'{name}=' for name, _ in keywords]
+    return f"{func.__module__}.{func.__qualname__}({', '.join(name + token for name, token in zip(names, tokens))})"
+
+
+def checkpoints(steps):
+    """Indexes of the keys to store: after the loader, before each expensive step and after the last step"""
+    before = {i for i, step in enumerate(steps) if getattr(step, 'func', step).__name__ in EXPENSIVE_STEPS}
+    return {0, len(steps)} | before
+
+
+def stateful_params(steps):
+    """The parameters of steps that keep state between calls (cache_state()), each once, in order"""
+    params = {}
+    for step in steps:
+        for value in list(getattr(step, 'args', ())) + list(getattr(step, 'keywords', {}).values()):
+            if hasattr(value, 'cache_state'):
+                params.setdefault(id(value), value)
+    return list(params.values())
+
+
+def step_metrics_logger(step):
+    """The metrics_logger global of the module the (partial-wrapped) cleaner is defined in"""
+    func = getattr(step, 'func', step)
+    return sys.modules[func.__module__].metrics_logger
+
+
+class StepCache:
+    """A directory of cached step states, evicted least recently used first past max_bytes"""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def keys(self, filepath, loader, steps):
+        """Key of the state after the loader and after each step (None from the first step that cannot be cached)"""
+        func = getattr(loader, 'func', loader)
+        key = f'{CACHE_FORMAT}:{code_version(func.__module__)}:{file_digest(filepath)}'
+        keys = []
+        for step in [loader] + list(steps):
+            signature = step_signature(step) if key is not None else None
+            key = None if signature is None else hashlib.blake2b(f'{key}|{signature}'.encode(), digest_size=16).hexdigest()
+            keys.append(key)
+        return keys
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def __contains__(self, key):
+        return key is not None and os.path.exists(os.path.join(self.entry_path(key), 'meta.json'))
+
+    def load(self, key):
+        """(df, RowValidity, metrics, [rejected row batches], [parameter states]) stored under key; refreshes its last use"""
+        path = self.entry_path(key)
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        os.utime(os.path.join(path, 'meta.json'))
+
+        df = read_arrow(os.path.join(path, 'frame.arrow'))
+        validity = RowValidity(df)
+        # Copies: the filters after a checkpoint update the mask in place
+        validity.valid = df.pop(VALID_COLUMN).to_numpy(dtype=bool, copy=True)
+        validity.codes = df.pop(CODE_COLUMN).to_numpy(dtype=np.int8, copy=True)
+        validity.rows = df.pop(ROW_COLUMN).to_numpy(copy=True)
+        validity.reasons = meta['reasons']
+        for col in [col for col in df.columns if col.startswith(ORIGINAL_PREFIX)]:
+            validity.originals[col.removeprefix(ORIGINAL_PREFIX)] = df.pop(col)
+
+        rejected = [read_arrow(os.path.join(path, f'rejected_{i}.arrow')) for i in range(meta['rejected_batches'])]
+        return df, validity, meta['metrics'], rejected, meta['states']
+
+    def store(self, key, df, validity, metrics, rejected=(), params=()):
+        """Save a state under key, with the cache_state() of params, then evict old entries past max_bytes"""
+        if key is None or key in self:
+            return
+        frame = df.assign(**{VALID_COLUMN: validity.valid, CODE_COLUMN: validity.codes, ROW_COLUMN: validity.rows})
+        for col, original in validity.originals.items():
+            frame[ORIGINAL_PREFIX + col] = original.array
+        tables = [pa.Table.from_pandas(frame)] + [pa.Table.from_pandas(batch) for batch in rejected]
+        if sum(table.nbytes for table in tables) > self.max_bytes:
+            # It would be evicted straight away
+            return
+
+        # Written next to the entry and renamed into place, so a reader never sees half an entry
+        staging = tempfile.mkdtemp(dir=self.cache_dir, prefix='.staging-')
+        try:
+            write_arrow(tables[0], os.path.join(staging, 'frame.arrow'))
+            for i, batch in enumerate(tables[1:]):
+                write_arrow(batch, os.path.join(staging, f'rejected_{i}.arrow'))
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump({
+                    'reasons': validity.reasons, 'metrics': metrics, 'rejected_batches': len(rejected),
+                    'states': [param.cache_state() for param in params]
+                }, f)
+            os.replace(staging, self.entry_path(key))
+        except OSError:
+            # Another run stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """[(last use, bytes, key)] of every complete entry"""
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta = os.path.join(self.entry_path(key), 'meta.json')
+            if key.startswith('.') or not os.path.exists(meta):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(self.entry_path(key)))
+            entries.append((os.path.getmtime(meta), size, key))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes; returns how many"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total -= size
+            evicted += 1
+        return evicted
+
+
+def write_arrow(table, path):
+    with pa.ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+
+def read_arrow(path):
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def run_cached_steps(filepath, dataset_name, loader, steps, cache=None, sink=None):
+    """
+    quarantine.run_steps() over loader(filepath, dataset_name), starting from the latest
+    checkpoint found in cache and storing the checkpoints of the steps that run.
+
+    Returns the clean rows; rejected rows go to sink, cached ones included. Without a
+    cache this is run_steps(loader(filepath, dataset_name), steps, sink).
+    """
+    if cache is None:
+        return run_steps(loader(filepath, dataset_name), steps, sink)
+
+    metrics_logger = step_metrics_logger(loader)
+    keys = cache.keys(filepath, loader, steps)
+    stored = checkpoints(steps)
+    cached = max((i for i, key in enumerate(keys) if key in cache), default=None)
+    rejected = []
+
+    if cached is None:
+        df = loader(filepath, dataset_name)
+        validity = RowValidity(df)
+        cache.store(keys[0], df, validity, metrics_logger.metrics.get(dataset_name, {}))
+        start = 0
+    else:
+        df, validity, metrics, rejected, states = cache.load(keys[cached])
+        metrics_logger.metrics[dataset_name] = metrics
+        for param, state in zip(stateful_params(steps[:cached]), states):
+            param.restore_cache_state(state)
+        start = cached
+        print(f"Step cache: restored {dataset_name} after {cached + 1} of {len(keys)} steps")
+
+    for i, (key, step) in enumerate(zip(keys[start + 1:], steps[start:]), start + 1):
+        if is_filter(step):
+            df = step(df, validity=validity)
+        else:
+            df = _split(df, validity, rejected)
+            validity = validity.remaining(df)
+            df = step(df)
+        if i in stored:
+            cache.store(key, df, validity, metrics_logger.metrics[dataset_name], rejected, stateful_params(steps[:i]))
+
+    df = _split(df, validity, rejected)
+    if sink is not None:
+        for frame in rejected:
+            sink.write(frame)
+
+    hits = 0 if cached is None else cached + 1
+    metrics_logger.log_metric(dataset_name, 'step_cache_hits', hits)
+    metrics_logger.log_metric(dataset_name, 'step_cache_misses', len(keys) - hits)
+    return df
+
+
+def _split(df, validity, rejected):
+    if validity.rejected_count:
+        rejected.append(validity.rejected(df))
+    return validity.clean(df)
@@ -0,0 +1,108 @@
+"""
+Chunked streaming mode for the systembook cleaning pipeline.
+
+The source CSV is read in bounded chunks, each chunk is pushed through the
+cleaning steps and appended to the output file, so peak memory depends on the
+chunk size instead of the size of the export.
+"""
+
+import pandas as pd
+
+from dedupe import DEFAULT_MEMORY_BUDGET, HashDeduplicator
+from dtype_planner import DEFAULT_SAMPLE_ROWS, sample_numbers
+from quarantine import RowValidity, run_steps
+from writers import get_writer
+
+# Metrics that describe the run rather than count rows, so they are not summed across chunks
+NON_ADDITIVE_METRICS = {'id_columns_converted'}
+
+
+def pinned_dtypes(filepath, nrows):
+    """
+    Column dtypes for reading a CSV in pieces, taken from its first rows.
+
+    Number columns are pinned to float64 and everything else to text. Without this pandas
+    infers dtypes per piece, so the same value could be read as 1 in one piece and '1'
+    in the next. The sample is at least as big as the one the in-memory loader plans its
+    dtypes from, and a column counts as numbers by the same rule (dtype_planner), so both
+    read the same columns as numbers. Read the pieces with read_pinned.
+    """
+    sample = pd.read_csv(filepath, nrows=max(nrows, DEFAULT_SAMPLE_ROWS))
+    return {col: 'float64' if sample_numbers(sample[col]) is not None else str for col in sample.columns}
+
+
+def convert_pinned(df, dtypes):
+    """
+    Convert the columns pinned to float64 in a piece read as text.
+
+    A value that is not a number becomes missing, so every piece of a pinned column has
+    the same dtype (the output schema and the duplicate hashes depend on it) and
+    naCleaner rejects the row, as it does in memory (see dtype_planner.read_planned_csv).
+    """
+    for col, dtype in dtypes.items():
+        if dtype != 'float64' or col not in df.columns:
+            continue
+        numbers = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        not_numbers = int((numbers.isna() & df[col].notna()).sum())
+        if not_numbers:
+            print(f"Warning: {not_numbers} value(s) in '{col}' are not numbers, reading them as missing")
+        df[col] = numbers
+    return df
+
+
+def read_pinned(filepath_or_buffer, dtypes, **kwargs):
+    """read_csv with pinned dtypes: every column is read as text, then convert_pinned restores the numbers"""
+    text = {col: str for col in dtypes}
+    if 'chunksize' in kwargs:
+        return (convert_pinned(chunk, dtypes) for chunk in pd.read_csv(filepath_or_buffer, dtype=text, **kwargs))
+    return convert_pinned(pd.read_csv(filepath_or_buffer, dtype=text, **kwargs), dtypes)
+
+
+def read_csv_chunks(filepath, chunksize):
+    """Read a CSV in chunks of chunksize rows with the column dtypes pinned from the first chunk"""
+    return read_pinned(filepath, pinned_dtypes(filepath, chunksize), chunksize=chunksize)
+
+
+def stream_clean(filepath, dataset_name, steps, output_path, metrics_logger, chunksize=100_000,
+                 dedupe_memory_budget=DEFAULT_MEMORY_BUDGET, spill_dir=None, output_format='csv', writer_options=None,
+                 quarantine=None):
+    """
+    Clean the CSV at filepath chunk by chunk and append the result to output_path.
+
+    Each step is called as step(df) and returns the cleaned df, e.g.
+    functools.partial(dateCleaner, 'Book checkout', dataset_name='systembook_metrics').
+    Duplicates are dropped across the whole file before the steps run (see dedupe.py; row
+    hashes past dedupe_memory_budget bytes are spilled to spill_dir), and the per-chunk
+    metrics logged by the steps are summed so the final counts match an in-memory run.
+    Chunks are written with the output_format writer from writers.py, configured by
+    writer_options (row_group_size, compression). Row filters share one validity mask per
+    chunk (see quarantine.py); the rejected rows, duplicates included, are appended to the
+    quarantine sink if one is given.
+
+    Returns the number of rows written.
+    """
+    totals = {}
+    writer = get_writer(output_format, output_path, **(writer_options or {}))
+
+    with writer, HashDeduplicator(memory_budget=dedupe_memory_budget, spill_dir=spill_dir) as deduplicator:
+        for chunk in read_csv_chunks(filepath, chunksize):
+            validity = RowValidity(chunk)
+            duplicates = validity.reject(~deduplicator.keep_mask(chunk), 'duplicate')
+            metrics_logger.log_metric(dataset_name, 'initial_row_count', len(chunk))
+            metrics_logger.log_metric(dataset_name, 'duplicates_dropped', duplicates)
+
+            chunk = run_steps(chunk, steps, quarantine, validity)
+
+            writer.write(chunk)
+
+            for metric, value in metrics_logger.metrics[dataset_name].items():
+                if metric in NON_ADDITIVE_METRICS:
+                    totals[metric] = value
+                else:
+                    totals[metric] = totals.get(metric, 0) + value
+
+    for metric, value in totals.items():
+        metrics_logger.log_metric(dataset_name, metric, value)
+
+    print(f"Streamed {totals.get('initial_row_count', 0)} rows from {filepath}, wrote {writer.rows_written} rows")
+    return writer.rows_written
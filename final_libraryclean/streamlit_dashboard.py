@@ -7,6 +7,9 @@ from pathlib import Path
 import os
 from datetime import datetime
 
+from dashboard_data import find_cleaned_output, load_history, load_metric_range, load_metrics, load_output
+from metrics_store import STORE_FILE, metric_series
+
 # Page configuration
 st.set_page_config(
     page_title="Data Pipeline Dashboard",
@@ -20,6 +23,68 @@ st.markdown("---")
 
 # File path for metrics
 metrics_file = 'C:/Users/Admin/Desktop/M5-20260106/output-data/pipeline_metrics.json'
+store_file = os.path.join(os.path.dirname(metrics_file), STORE_FILE)
+
+
+# -------- FIGURES --------
+# Figures are cached on their inputs, so a rerun only rebuilds the ones whose data changed
+
+@st.cache_data(show_spinner=False)
+def retention_gauge(value, bar_color, high_color):
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number+delta",
+        value = value,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        title = {'text': "Retention Rate (%)"},
+        delta = {'reference': 100},
+        gauge = {
+            'axis': {'range': [None, 100]},
+            'bar': {'color': bar_color},
+            'steps': [
+                {'range': [0, 50], 'color': "lightgray"},
+                {'range': [50, 80], 'color': "gray"},
+                {'range': [80, 100], 'color': high_color}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': 90
+            }
+        }
+    ))
+    fig.update_layout(height=300)
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def row_count_chart(df_comparison):
+    fig = go.Figure()
+    fig.add_trace(go.Bar(name='Initial', x=df_comparison['Dataset'], y=df_comparison['Initial'], marker_color='lightblue'))
+    fig.add_trace(go.Bar(name='Final', x=df_comparison['Dataset'], y=df_comparison['Final'], marker_color='darkblue'))
+    fig.add_trace(go.Bar(name='Dropped', x=df_comparison['Dataset'], y=df_comparison['Dropped'], marker_color='red'))
+    fig.update_layout(barmode='group', title="Row Counts by Dataset", xaxis_title="Dataset", yaxis_title="Number of Rows")
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def issues_chart(df_issues, kind, title):
+    if kind == 'pie':
+        return px.pie(df_issues, values='Count', names='Issue Type', title=title)
+    return px.bar(df_issues, x='Issue Type', y='Count', title=title)
+
+
+@st.cache_data(show_spinner=False)
+def step_chart(df_timings, y, title):
+    return px.bar(df_timings, x='Step', y=y, color='Dataset', barmode='group', title=title)
+
+
+@st.cache_data(show_spinner=False)
+def history_chart(_history, version, dataset, metrics, title):
+    """Line chart of metrics over the run history; version is the cache key for _history"""
+    series = metric_series(_history, dataset, list(metrics))
+    value_columns = [metric for metric in metrics if metric in series.columns]
+    return px.line(series, x='execution_timestamp', y=value_columns, markers=True, title=title)
+
 
 # Check if metrics file exists
 if not os.path.exists(metrics_file):
@@ -27,10 +92,9 @@ if not os.path.exists(metrics_file):
     st.info("Please run the data cleaning pipeline first to generate metrics.")
     st.stop()
 
-# Load metrics
+# Load metrics (only re-parsed when the file changes)
 try:
-    with open(metrics_file, 'r') as f:
-        metrics = json.load(f)
+    metrics = load_metrics(metrics_file)
 except Exception as e:
     st.error(f"Error loading metrics: {e}")
     st.stop()
@@ -44,7 +108,10 @@ if st.sidebar.button("🔄 Refresh Dashboard"):
     st.rerun()
 
 # Create tabs for different views
-tab1, tab2, tab3 = st.tabs(["📈 Overview", "📚 Systembook Details", "👥 Customers Details"])
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
+    ["📈 Overview", "📚 Systembook Details", "👥 Customers Details", "⏱️ Step Performance", "📜 Run History",
+     "🗂️ Cleaned Data"]
+)
 
 # Tab 1: Overview
 with tab1:
@@ -88,60 +155,12 @@ with tab1:
     with col1:
         st.subheader("📚 Systembook Data Retention")
         retention_rate = systembook.get('data_retention_rate', 0)
-        
-        fig = go.Figure(go.Indicator(
-            mode = "gauge+number+delta",
-            value = retention_rate,
-            domain = {'x': [0, 1], 'y': [0, 1]},
-            title = {'text': "Retention Rate (%)"},
-            delta = {'reference': 100},
-            gauge = {
-                'axis': {'range': [None, 100]},
-                'bar': {'color': "darkblue"},
-                'steps': [
-                    {'range': [0, 50], 'color': "lightgray"},
-                    {'range': [50, 80], 'color': "gray"},
-                    {'range': [80, 100], 'color': "lightblue"}
-                ],
-                'threshold': {
-                    'line': {'color': "red", 'width': 4},
-                    'thickness': 0.75,
-                    'value': 90
-                }
-            }
-        ))
-        
-        fig.update_layout(height=300)
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(retention_gauge(retention_rate, "darkblue", "lightblue"), use_container_width=True)
     
     with col2:
         st.subheader("👥 Customers Data Retention")
         retention_rate_customers = customers.get('data_retention_rate', 0)
-        
-        fig = go.Figure(go.Indicator(
-            mode = "gauge+number+delta",
-            value = retention_rate_customers,
-            domain = {'x': [0, 1], 'y': [0, 1]},
-            title = {'text': "Retention Rate (%)"},
-            delta = {'reference': 100},
-            gauge = {
-                'axis': {'range': [None, 100]},
-                'bar': {'color': "darkgreen"},
-                'steps': [
-                    {'range': [0, 50], 'color': "lightgray"},
-                    {'range': [50, 80], 'color': "gray"},
-                    {'range': [80, 100], 'color': "lightgreen"}
-                ],
-                'threshold': {
-                    'line': {'color': "red", 'width': 4},
-                    'thickness': 0.75,
-                    'value': 90
-                }
-            }
-        ))
-        
-        fig.update_layout(height=300)
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(retention_gauge(retention_rate_customers, "darkgreen", "lightgreen"), use_container_width=True)
     
     # Row changes comparison
     st.markdown("---")
@@ -154,13 +173,7 @@ with tab1:
         'Dropped': [systembook.get('total_rows_dropped', 0), customers.get('total_rows_dropped', 0)]
     })
     
-    fig = go.Figure()
-    fig.add_trace(go.Bar(name='Initial', x=df_comparison['Dataset'], y=df_comparison['Initial'], marker_color='lightblue'))
-    fig.add_trace(go.Bar(name='Final', x=df_comparison['Dataset'], y=df_comparison['Final'], marker_color='darkblue'))
-    fig.add_trace(go.Bar(name='Dropped', x=df_comparison['Dataset'], y=df_comparison['Dropped'], marker_color='red'))
-    
-    fig.update_layout(barmode='group', title="Row Counts by Dataset", xaxis_title="Dataset", yaxis_title="Number of Rows")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(row_count_chart(df_comparison), use_container_width=True)
 
 # Tab 2: Systembook Details
 with tab2:
@@ -229,8 +242,7 @@ with tab2:
     
     if issues_data['Issue Type']:
         df_issues = pd.DataFrame(issues_data)
-        fig = px.pie(df_issues, values='Count', names='Issue Type', title='Distribution of Data Quality Issues')
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(issues_chart(df_issues, 'pie', 'Distribution of Data Quality Issues'), use_container_width=True)
     else:
         st.success("✅ No data quality issues found!")
 
@@ -284,8 +296,120 @@ with tab3:
         
         if issues_data_customers['Issue Type']:
             df_issues_customers = pd.DataFrame(issues_data_customers)
-            fig = px.bar(df_issues_customers, x='Issue Type', y='Count', title='Data Quality Issues')
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(issues_chart(df_issues_customers, 'bar', 'Data Quality Issues'), use_container_width=True)
+
+# Tab 4: Step Performance
+with tab4:
+    st.header("⏱️ Step Performance")
+
+    step_timings = metrics.get('step_timings', {})
+    timing_rows = [
+        {'Dataset': dataset, 'Step': step, **timings}
+        for dataset, steps in step_timings.items()
+        for step, timings in steps.items()
+    ]
+
+    if not timing_rows:
+        st.info("No step timings in this metrics file. Re-run the pipeline to record them.")
+    else:
+        df_timings = pd.DataFrame(timing_rows)
+
+        st.plotly_chart(step_chart(df_timings, 'wall_seconds', 'Wall Time per Step (seconds)'), use_container_width=True)
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.plotly_chart(
+                step_chart(df_timings, 'rows_per_second', 'Throughput per Step (rows/sec)'), use_container_width=True
+            )
+
+        with col2:
+            # peak_rss_mb is the process peak so far, so the per-step chart shows how much each step added to it
+            if 'rss_growth_mb' in df_timings:
+                st.plotly_chart(
+                    step_chart(df_timings, 'rss_growth_mb', 'Peak RSS Growth per Step (MB)'), use_container_width=True
+                )
+
+        st.dataframe(df_timings, use_container_width=True)
+
+# Tab 5: Run History
+with tab5:
+    st.header("📜 Run History")
+
+    history, history_version = load_history(store_file)
+
+    if history.empty:
+        st.info(f"No run history yet at: {store_file}")
+    else:
+        st.caption(f"{history['execution_timestamp'].nunique()} runs recorded")
+        dataset = st.selectbox("Dataset", sorted(history['dataset'].unique()))
+
+        st.plotly_chart(
+            history_chart(history, history_version, dataset, ('data_retention_rate',), 'Retention Rate (%) over Time'),
+            use_container_width=True
+        )
+        st.plotly_chart(
+            history_chart(
+                history, history_version, dataset,
+                ('initial_row_count', 'final_row_count', 'total_rows_dropped'), 'Row Counts over Time'
+            ),
+            use_container_width=True
+        )
+
+        step_metrics = tuple(sorted(
+            metric for metric in history.loc[history['dataset'] == dataset, 'metric_name'].unique()
+            if metric.endswith('_wall_seconds')
+        ))
+        if step_metrics:
+            st.plotly_chart(
+                history_chart(history, history_version, dataset, step_metrics, 'Step Wall Time (seconds) over Time'),
+                use_container_width=True
+            )
+
+    # Range queries against the indexed metrics store
+    if os.path.exists(store_file):
+        st.markdown("---")
+        st.subheader("Metric over a Date Range")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            range_dataset = st.selectbox("Dataset", ['systembook_metrics', 'customers_metrics'], key='range_dataset')
+        with col2:
+            range_metric = st.text_input("Metric", 'data_retention_rate')
+        with col3:
+            last_days = st.number_input("Last N days", min_value=1, value=30)
+
+        df_range = load_metric_range(store_file, range_dataset, range_metric, int(last_days))
+        if df_range.empty:
+            st.info("No values stored for that metric in the selected range.")
+        else:
+            st.plotly_chart(
+                px.line(df_range, x='execution_timestamp', y='metric_value', markers=True,
+                        title=f'{range_metric} for {range_dataset} over the last {int(last_days)} days'),
+                use_container_width=True
+            )
+
+# Tab 6: Cleaned Data
+with tab6:
+    st.header("🗂️ Cleaned Data")
+
+    output_dir = os.path.dirname(metrics_file)
+    outputs = {
+        name: path for name in ['cleaned_library_systembook', 'cleaned_customers', 'customer_usage']
+        for path in [find_cleaned_output(output_dir, name)] if path is not None
+    }
+
+    if not outputs:
+        st.info(f"No cleaned outputs found in: {output_dir}")
+    else:
+        output_name = st.selectbox("Output", list(outputs))
+        output_path = outputs[output_name]
+        # Shared by every session; Arrow outputs are memory-mapped rather than copied
+        df_output = load_output(output_path)
+
+        mapped = output_path.endswith('.arrow')
+        st.caption(f"{output_path} | {len(df_output):,} rows | {'memory-mapped' if mapped else 'loaded into memory'}")
+        st.dataframe(df_output.head(1000), use_container_width=True)
 
 # Footer
 st.markdown("---")
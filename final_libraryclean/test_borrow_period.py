@@ -0,0 +1,55 @@
+import unittest
+
+import pandas as pd
+
+import json_data_clean as jdc
+from borrow_period import borrow_period_days, parse_borrow_period
+from quarantine import RowValidity
+
+
+class TestParseBorrowPeriod(unittest.TestCase):
+    def test_unit_variants(self):
+        cases = {
+            '2 weeks': 14, '1 week': 7, '3 wks': 21, '2w': 14, '14 days': 14, '10 d': 10,
+            '1 month': 30, '2 mths': 60, 'a fortnight': 14, 'Two Weeks': 14, ' 3 Weeks ': 21,
+            '14': 14, 'week': 7, '1.5 weeks': 10
+        }
+        for text, days in cases.items():
+            self.assertEqual(parse_borrow_period(text), days, text)
+
+    def test_unreadable_periods(self):
+        for text in ['', 'soon', '2 weeks 3 days', 'few weeks', None, float('nan')]:
+            self.assertIsNone(parse_borrow_period(text), text)
+
+
+class TestBorrowPeriodDays(unittest.TestCase):
+    def test_maps_distinct_values_back(self):
+        values = pd.Series(['2 weeks', '14 days', None, '2 weeks', 'soon'], index=[5, 6, 7, 8, 9])
+        days = borrow_period_days(values)
+        self.assertEqual(str(days.dtype), 'Int64')
+        self.assertEqual(days.tolist(), [14, 14, pd.NA, 14, pd.NA])
+        self.assertEqual(list(days.index), [5, 6, 7, 8, 9])
+
+    def test_categorical_column(self):
+        values = pd.Series(['1 month', '3 wks', '1 month'], dtype='category')
+        self.assertEqual(borrow_period_days(values).tolist(), [30, 21, 30])
+
+
+class TestBorrowPeriodCleaner(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+
+    def test_counts_unparsed_valid_rows(self):
+        df = pd.DataFrame({'Days allowed to borrow': ['2 weeks', 'soon', 'later', '1 month']})
+        rows = RowValidity(df)
+        rows.reject(pd.Series([False, False, True, False]), 'duplicate')
+
+        df = jdc.borrowPeriodCleaner('Days allowed to borrow', df, 'systembook_metrics', validity=rows)
+
+        self.assertEqual(df['borrow_period_days'].tolist(), [14, pd.NA, pd.NA, 30])
+        self.assertEqual(rows.rejected_count, 1)
+        self.assertEqual(jdc.metrics_logger.metrics['systembook_metrics']['borrow_periods_unparsed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
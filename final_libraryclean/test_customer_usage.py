@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from customer_usage import CustomerUsage, read_loans
+from writers import write_dataframe
+
+CUSTOMERS = pd.DataFrame({'Customer ID': [1, 2, 3], 'Customer Name': ['Jane Doe', 'John Smith', 'Dan Reeves']})
+
+
+def make_loans(ids, customers, checkouts, returns, days_allowed=14):
+    checkout = pd.to_datetime(pd.Series(checkouts))
+    returned = pd.to_datetime(pd.Series(returns))
+    return pd.DataFrame({
+        'Id': ids,
+        'Book checkout': checkout,
+        'Book Returned': returned,
+        'Customer ID': pd.array(customers, dtype='Int64'),
+        'days_borrowed': (returned - checkout).dt.days.astype('Int64'),
+        'borrow_period_days': pd.array([days_allowed] * len(ids), dtype='Int64')
+    })
+
+
+LOANS = make_loans(
+    [1, 2, 3, 4],
+    [1, 1, 2, 9],
+    ['2023-01-01', '2023-03-01', '2023-03-10', '2023-02-01'],
+    ['2023-01-20', '2023-03-05', '2023-04-10', '2023-02-03']
+)
+
+
+class TestCustomerUsage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.loans_path = os.path.join(self.tmpdir.name, 'cleaned_library_systembook.csv')
+        self.usage = CustomerUsage(self.tmpdir.name, self.loans_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_rebuild(self):
+        usage = self.usage.rebuild(CUSTOMERS, LOANS, as_of='2023-03-15').set_index('Customer ID')
+
+        self.assertEqual(usage.loc[1, ['loan_count', 'days_borrowed_total', 'overdue_loans']].tolist(), [2, 23, 1])
+        self.assertEqual(usage.loc[1, 'avg_days_borrowed'], 11.5)
+        self.assertEqual(usage.loc[2, ['loan_count', 'overdue_loans', 'current_loans']].tolist(), [1, 1, 1])
+        # No loans, and a Customer ID missing from the customers file
+        self.assertEqual(usage.loc[3, 'loan_count'], 0)
+        self.assertTrue(pd.isna(usage.loc[3, 'avg_days_borrowed']))
+        self.assertTrue(pd.isna(usage.loc[9, 'Customer Name']))
+        self.assertEqual(list(usage.index), [1, 2, 3, 9])
+
+    def test_update_matches_rebuild(self):
+        write_dataframe(LOANS, self.loans_path)
+        self.usage.rebuild(CUSTOMERS, as_of='2023-03-15')
+
+        added = make_loans([5, 6], [3, 2], ['2023-03-12', '2023-03-14'], ['2023-04-01', '2023-03-16'])
+        removed = LOANS[LOANS['Id'] == 3]
+        updated = self.usage.update(CUSTOMERS, added, removed, as_of='2023-03-15')
+
+        current = pd.concat([LOANS[LOANS['Id'] != 3], added], ignore_index=True)
+        rebuild_dir = os.path.join(self.tmpdir.name, 'rebuild')
+        os.makedirs(rebuild_dir)
+        expected = CustomerUsage(rebuild_dir, self.loans_path).rebuild(CUSTOMERS, current, '2023-03-15')
+        pd.testing.assert_frame_equal(updated, expected)
+        self.assertEqual(updated.set_index('Customer ID').loc[2, 'current_loans'], 1)
+
+    def test_current_loans_follow_the_date(self):
+        write_dataframe(LOANS, self.loans_path)
+        self.usage.rebuild(CUSTOMERS, as_of='2023-03-15')
+
+        # No new loans, but loan 3 has been returned by then
+        usage = self.usage.update(CUSTOMERS, added=None, as_of='2023-05-01')
+        self.assertEqual(usage['current_loans'].sum(), 0)
+        self.assertEqual(usage['loan_count'].sum(), 4)
+
+    def test_loan_without_return_date_is_current(self):
+        # Loan 7 has not been returned yet, so it is out on any date after its checkout
+        not_returned = make_loans([7], [3], ['2023-03-01'], [None])
+        loans = pd.concat([LOANS, not_returned], ignore_index=True)
+
+        usage = self.usage.rebuild(CUSTOMERS, loans, as_of='2023-03-15').set_index('Customer ID')
+        self.assertEqual(usage.loc[3, ['loan_count', 'current_loans']].tolist(), [1, 1])
+        self.assertEqual(usage['current_loans'].sum(), 2)
+
+        # Still out later, when loan 3 is back
+        usage = self.usage.update(CUSTOMERS, added=None, as_of='2023-05-01').set_index('Customer ID')
+        self.assertEqual(usage.loc[3, 'current_loans'], 1)
+        self.assertEqual(usage['current_loans'].sum(), 1)
+
+    def test_update_counts_added_loan_without_return_date(self):
+        write_dataframe(LOANS, self.loans_path)
+        self.usage.rebuild(CUSTOMERS, as_of='2023-03-15')
+
+        added = make_loans([7], [3], ['2023-03-01'], [None])
+        updated = self.usage.update(CUSTOMERS, added, as_of='2023-03-15')
+
+        write_dataframe(pd.concat([LOANS, added], ignore_index=True), self.loans_path)
+        rebuild_dir = os.path.join(self.tmpdir.name, 'rebuild')
+        os.makedirs(rebuild_dir)
+        expected = CustomerUsage(rebuild_dir, self.loans_path).rebuild(CUSTOMERS, as_of='2023-03-15')
+        pd.testing.assert_frame_equal(updated, expected)
+        self.assertEqual(updated.set_index('Customer ID').loc[3, 'current_loans'], 1)
+
+    def test_read_loans_from_csv_output(self):
+        write_dataframe(LOANS.assign(Books='Dune'), self.loans_path)
+        loans = read_loans(self.loans_path)
+        self.assertNotIn('Books', loans.columns)
+        pd.testing.assert_frame_equal(
+            self.usage.rebuild(CUSTOMERS, loans, as_of='2023-03-15'),
+            self.usage.rebuild(CUSTOMERS, LOANS, as_of='2023-03-15')
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
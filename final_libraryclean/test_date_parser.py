@@ -0,0 +1,67 @@
+import os
+import unittest
+
+import pandas as pd
+
+from date_parser import DateFormatCache, parse_dates
+
+SAMPLE_SYSTEMBOOK = os.path.join(os.path.dirname(__file__), '..', 'sample-data', '03_Library Systembook.csv')
+
+
+class TestParseDates(unittest.TestCase):
+    def setUp(self):
+        self.cache = DateFormatCache()
+        self.dates = pd.Series(['"20/02/2023"', '"02/04/2023"', '"32/05/2023"', '10/06/2023'], name='Book checkout')
+
+    def test_matches_to_datetime_dayfirst(self):
+        data = pd.read_csv(SAMPLE_SYSTEMBOOK).dropna()
+        for col in ['Book checkout', 'Book Returned']:
+            expected = pd.to_datetime(data[col].str.replace('"', '', regex=True), dayfirst=True, errors='coerce')
+            parsed, invalid = parse_dates(data[col], source='sample', column=col, cache=self.cache)
+            pd.testing.assert_series_equal(parsed, expected)
+            pd.testing.assert_series_equal(invalid, expected.isna())
+
+    def test_invalid_dates_flagged_in_same_pass(self):
+        parsed, invalid = parse_dates(self.dates, source='test', cache=self.cache)
+
+        self.assertEqual(parsed[0], pd.Timestamp(2023, 2, 20))
+        self.assertEqual(parsed[1], pd.Timestamp(2023, 4, 2))
+        self.assertEqual(invalid.tolist(), [False, False, True, False])
+
+    def test_missing_values_are_invalid(self):
+        parsed, invalid = parse_dates(pd.Series(['"01/06/2023"', None, None], name='d'), source='test', cache=self.cache)
+        self.assertEqual(parsed[0], pd.Timestamp(2023, 6, 1))
+        self.assertTrue(parsed[1:].isna().all())
+        self.assertEqual(invalid.tolist(), [False, True, True])
+
+        parsed, invalid = parse_dates(pd.Series([None, None], dtype=str, name='d'), source='test', cache=self.cache)
+        self.assertTrue(invalid.all())
+
+    def test_format_cached_per_source_and_column(self):
+        parse_dates(self.dates, source='branch_a.csv', cache=self.cache)
+        self.assertEqual(self.cache.formats[('branch_a.csv', 'Book checkout')], '%d/%m/%Y')
+
+        # Later chunks reuse the cached format even if their first value is ambiguous
+        self.cache.formats[('branch_a.csv', 'Book checkout')] = '%m/%d/%Y'
+        parsed, _ = parse_dates(pd.Series(['02/04/2023'], name='Book checkout'), source='branch_a.csv', cache=self.cache)
+        self.assertEqual(parsed[0], pd.Timestamp(2023, 2, 4))
+
+    def test_changed_format_is_inferred_again(self):
+        parse_dates(self.dates, source='branches/*.csv', cache=self.cache)
+
+        # Another branch under the same source writes ISO dates
+        iso = pd.Series(['2023-05-14', '2023-05-30', 'not a date'], name='Book checkout')
+        parsed, invalid = parse_dates(iso, source='branches/*.csv', cache=self.cache)
+        self.assertEqual(parsed[1], pd.Timestamp(2023, 5, 30))
+        self.assertEqual(invalid.tolist(), [False, False, True])
+        self.assertEqual(self.cache.formats[('branches/*.csv', 'Book checkout')], '%Y-%m-%d')
+
+    def test_unguessable_column_falls_back(self):
+        parsed, invalid = parse_dates(pd.Series(['not a date', None], name='x'), source='test', cache=self.cache)
+
+        self.assertIsNone(self.cache.formats[('test', 'x')])
+        self.assertTrue(invalid.all())
+
+
+if __name__ == '__main__':
+    unittest.main()
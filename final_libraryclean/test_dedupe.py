@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dedupe import HashDeduplicator
+from streaming import read_csv_chunks
+
+SAMPLE_SYSTEMBOOK = os.path.join(os.path.dirname(__file__), '..', 'sample-data', '03_Library Systembook.csv')
+
+
+class TestHashDeduplicator(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        # 20k rows drawn from 3k distinct rows, with some NaNs
+        pool = pd.DataFrame({
+            'Id': rng.integers(0, 1000, 3000).astype(float),
+            'Books': rng.choice(['Dune', 'IT', 'Misery', None], 3000),
+            'Customer ID': rng.integers(0, 50, 3000).astype(float)
+        })
+        pool.loc[::97, 'Id'] = np.nan
+        self.df = pool.iloc[rng.integers(0, len(pool), 20_000)].reset_index(drop=True)
+
+    def dedupe_in_chunks(self, df, chunksize, **kwargs):
+        with HashDeduplicator(**kwargs) as deduplicator:
+            chunks = [deduplicator.drop_duplicates(df.iloc[i:i + chunksize]) for i in range(0, len(df), chunksize)]
+            return pd.concat(chunks, ignore_index=True), deduplicator.duplicates_dropped, deduplicator.spills
+
+    def test_matches_drop_duplicates(self):
+        expected = self.df.drop_duplicates().reset_index(drop=True)
+        result, dropped, spills = self.dedupe_in_chunks(self.df, 1000)
+
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertEqual(dropped, len(self.df) - len(expected))
+        self.assertEqual(spills, 0)
+
+    def test_spills_past_memory_budget(self):
+        expected = self.df.drop_duplicates().reset_index(drop=True)
+        with tempfile.TemporaryDirectory() as spill_dir:
+            result, dropped, spills = self.dedupe_in_chunks(self.df, 500, memory_budget=4096, spill_dir=spill_dir)
+
+        self.assertGreater(spills, 1)
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertEqual(dropped, len(self.df) - len(expected))
+
+    def test_spilled_partitions_stay_small(self):
+        expected = self.df.drop_duplicates().reset_index(drop=True)
+        with tempfile.TemporaryDirectory() as spill_dir:
+            with HashDeduplicator(memory_budget=0, spill_dir=spill_dir) as deduplicator:
+                chunks = [deduplicator.drop_duplicates(self.df.iloc[i:i + 100]) for i in range(0, len(self.df), 100)]
+
+                self.assertGreater(deduplicator.spills, 100)
+                # Runs are merged per partition, so each holds a logarithmic number of files
+                runs = [len(partition) for partition in deduplicator.partitions]
+                self.assertLessEqual(max(runs), 8)
+                self.assertEqual(len(os.listdir(spill_dir)), sum(runs))
+
+                # Each digest is in its own partition's runs
+                for partition, runs in enumerate(deduplicator.partitions):
+                    for run in runs:
+                        self.assertTrue((np.asarray(run) >> np.uint64(58) == partition).all())
+
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+    def test_sample_data_duplicates(self):
+        chunks = read_csv_chunks(SAMPLE_SYSTEMBOOK, 10)
+        with HashDeduplicator(memory_budget=64) as deduplicator:
+            for chunk in chunks:
+                deduplicator.drop_duplicates(chunk)
+
+            self.assertEqual(deduplicator.duplicates_dropped, 92)
+
+    def test_close_removes_own_spill_dir(self):
+        deduplicator = HashDeduplicator(memory_budget=0)
+        deduplicator.drop_duplicates(self.df.head(10))
+        spill_dir = deduplicator.spill_dir
+
+        self.assertTrue(os.path.isdir(spill_dir))
+        deduplicator.close()
+        self.assertFalse(os.path.exists(spill_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
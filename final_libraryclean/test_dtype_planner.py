@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import json_data_clean as jdc
+from dtype_planner import memory_report, plan_dtypes, read_planned_csv
+
+SAMPLE_CUSTOMERS = os.path.join(os.path.dirname(__file__), '..', 'sample-data', '03_Library SystemCustomers.csv')
+
+
+class TestDtypePlanner(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'loans.csv')
+        rows = 200
+        pd.DataFrame({
+            'Id': [float(i) if i % 50 else None for i in range(rows)],
+            'Books': [['Dune ', 'IT', 'Misery '][i % 3] for i in range(rows)],
+            'Book checkout': [f'"{1 + i % 28:02d}/02/2023"' for i in range(rows)],
+            'Book Returned': [f'{1 + (i + 3) % 28:02d}/03/2023' if i % 40 else 'not returned' for i in range(rows)],
+            'Days allowed to borrow': '2 weeks',
+            'Customer ID': [i % 7 + 1 for i in range(rows)],
+            'Customer Name': [f'Customer {i}' for i in range(rows)]
+        }).to_csv(self.path, index=False)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_plan(self):
+        self.assertEqual(plan_dtypes(self.path), {
+            'Id': 'Int32',
+            'Books': 'category',
+            'Book checkout': 'category',
+            'Book Returned': 'category',
+            'Days allowed to borrow': 'category',
+            'Customer ID': 'Int32'
+        })
+
+    def test_less_memory_per_row(self):
+        default = memory_report(pd.read_csv(self.path))
+        planned = memory_report(read_planned_csv(self.path))
+        self.assertLess(planned['bytes_per_row'], default['bytes_per_row'])
+        self.assertLess(planned['columns']['Books'], default['columns']['Books'])
+
+    def test_cleaned_output_unchanged(self):
+        def clean(df):
+            df = jdc.duplicateCleaner(df, 'systembook_metrics')
+            df = jdc.naCleaner(df, 'systembook_metrics')
+            for col in ['Book checkout', 'Book Returned']:
+                df = jdc.dateCleaner(col, df, 'systembook_metrics')
+            df = jdc.enrich_dateDuration('Book checkout', 'Book Returned', df, 'systembook_metrics')
+            return jdc.idCleaner(['Id', 'Customer ID'], df, 'systembook_metrics')
+
+        expected = clean(pd.read_csv(self.path))
+        expected_metrics = dict(jdc.metrics_logger.metrics['systembook_metrics'])
+        jdc.metrics_logger = jdc.MetricsLogger()
+        result = clean(read_planned_csv(self.path))
+
+        self.assertEqual(jdc.metrics_logger.metrics['systembook_metrics'], expected_metrics)
+        self.assertEqual(result.to_csv(index=False), expected.to_csv(index=False))
+        self.assertEqual(str(result['Book checkout'].dtype), 'datetime64[us]')
+
+    def test_falls_back_when_plan_does_not_fit(self):
+        with open(self.path, 'a') as f:
+            f.write('abc,IT,"""01/02/2023""",01/03/2023,2 weeks,1,Someone\n')
+
+        df = read_planned_csv(self.path, sample_rows=50)
+        self.assertEqual(len(df), 201)
+        # Read as missing, so naCleaner rejects the row as the streaming runner does
+        self.assertTrue(pd.isna(df['Id'].iloc[-1]))
+        self.assertEqual(df['Id'].iloc[1], 1)
+
+    def test_customers_names_stay_text(self):
+        plan = plan_dtypes(SAMPLE_CUSTOMERS)
+        self.assertEqual(plan, {'Customer ID': 'Int32'})
+        self.assertEqual(read_planned_csv(SAMPLE_CUSTOMERS)['Customer ID'].isna().sum(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+from functools import partial
+
+import pandas as pd
+
+import json_data_clean as jdc
+from incremental import RowManifest, merge_into_output
+from integrity import IdSet
+from multi_file import RejectedBatches
+from quarantine import run_steps
+from writers import cleaned_output_path, read_output
+
+SAMPLE_SYSTEMBOOK = os.path.join(os.path.dirname(__file__), '..', 'sample-data', '03_Library Systembook.csv')
+
+
+def clean(df):
+    df = jdc.duplicateCleaner(df, 'systembook_metrics')
+    df = jdc.naCleaner(df, 'systembook_metrics')
+    for col in ['Book checkout', 'Book Returned']:
+        df = jdc.dateCleaner(col, df, 'systembook_metrics')
+    df = jdc.enrich_dateDuration('Book checkout', 'Book Returned', df, 'systembook_metrics')
+    return jdc.idCleaner(['Id', 'Customer ID'], df, 'systembook_metrics')
+
+
+class TestIncrementalRuns(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = pd.read_csv(SAMPLE_SYSTEMBOOK)
+
+        # Later export: one loan's return date corrected and two new loans appended
+        self.updated = self.source.copy()
+        self.updated.loc[self.updated['Id'] == 3, 'Book Returned'] = '05/04/2023'
+        new_loans = pd.DataFrame({
+            'Id': [1001.0, 1002.0],
+            'Books': ['Dune ', 'Emma'],
+            'Book checkout': ['"01/07/2023"', '"02/07/2023"'],
+            'Book Returned': ['08/07/2023', '20/07/2023'],
+            'Days allowed to borrow': ['2 weeks', '2 weeks'],
+            'Customer ID': [4.0, 5.0]
+        })
+        self.updated = pd.concat([self.updated, new_loans], ignore_index=True)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_incremental(self, source, output_format):
+        manifest = RowManifest(self.tmpdir.name, 'systembook')
+        path = cleaned_output_path(self.tmpdir.name, 'cleaned_library_systembook', output_format)
+
+        new_rows, removed_keys = manifest.select_changes(source)
+        cleaned = clean(new_rows)
+        merge_into_output(cleaned, path, output_format, removed_keys)
+
+        run_metrics = {'initial_row_count': len(new_rows), 'final_row_count': len(cleaned)}
+        totals = manifest.add_run_metrics(run_metrics)
+        manifest.save()
+        return path, new_rows, removed_keys, totals
+
+    def assert_matches_full_run(self, path, source):
+        expected = clean(source).sort_values('Id').reset_index(drop=True)
+        merged = read_output(path).sort_values('Id').reset_index(drop=True)
+        pd.testing.assert_frame_equal(merged.astype(expected.dtypes.to_dict()), expected)
+
+    def test_incremental_runs_match_full_run(self):
+        for output_format in ['csv', 'parquet']:
+            with self.subTest(output_format=output_format):
+                self.tmpdir.cleanup()
+                self.tmpdir = tempfile.TemporaryDirectory()
+
+                path, new_rows, _, _ = self.run_incremental(self.source, output_format)
+                self.assertEqual(len(new_rows), len(self.source))
+                self.assert_matches_full_run(path, self.source)
+
+                # Unchanged source: nothing to clean
+                _, new_rows, removed_keys, _ = self.run_incremental(self.source, output_format)
+                self.assertEqual(len(new_rows), 0)
+                self.assertEqual(len(removed_keys), 0)
+
+                # The edited loan and the appended loans are the only rows cleaned
+                path, new_rows, removed_keys, totals = self.run_incremental(self.updated, output_format)
+                self.assertEqual(sorted(new_rows['Id']), [3.0, 1001.0, 1002.0])
+                self.assertEqual(list(removed_keys), [3.0])
+                self.assert_matches_full_run(path, self.updated)
+
+                self.assertEqual(totals['initial_row_count'], len(self.source) + 3)
+
+    def test_running_totals(self):
+        manifest = RowManifest(self.tmpdir.name, 'systembook')
+        manifest.add_run_metrics({'initial_row_count': 100, 'final_row_count': 50, 'id_columns_converted': 2})
+        manifest.save()
+
+        manifest = RowManifest(self.tmpdir.name, 'systembook')
+        totals = manifest.add_run_metrics({'initial_row_count': 10, 'final_row_count': 10, 'id_columns_converted': 2})
+
+        self.assertEqual(manifest.state['runs'], 2)
+        self.assertEqual(totals['initial_row_count'], 110)
+        self.assertEqual(totals['id_columns_converted'], 2)
+        self.assertEqual(totals['data_retention_rate'], 54.55)
+
+    def test_orphan_loans_are_checked_again(self):
+        path = cleaned_output_path(self.tmpdir.name, 'cleaned_library_systembook', 'csv')
+        steps = [
+            partial(jdc.duplicateCleaner, dataset_name='systembook_metrics'),
+            partial(jdc.naCleaner, dataset_name='systembook_metrics'),
+            partial(jdc.datesCleaner, ['Book checkout', 'Book Returned'], dataset_name='systembook_metrics'),
+            partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+            partial(jdc.idCleaner, ['Id', 'Customer ID'], dataset_name='systembook_metrics')
+        ]
+
+        rows = []
+        # Customer 10 is only added to the customers output before the second run
+        for customers in [range(1, 10), range(1, 11)]:
+            manifest = RowManifest(self.tmpdir.name, 'systembook')
+            new_rows, removed_keys = manifest.select_changes(self.source)
+            rejected = RejectedBatches()
+            known_ids = IdSet(pd.Series(customers))
+            reference = partial(jdc.referenceCleaner, 'Customer ID', dataset_name='systembook_metrics', known_ids=known_ids)
+            cleaned = run_steps(new_rows, steps[:4] + [reference] + steps[4:], rejected)
+            manifest.recheck(rejected)
+            merge_into_output(cleaned, path, 'csv', removed_keys)
+            manifest.save()
+            rows.append(len(new_rows))
+
+        # Only the orphan loan is cleaned again, and it is in the output now
+        self.assertEqual(rows, [len(self.source), 1])
+        self.assertEqual((read_output(path)['Customer ID'] == 10).sum(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+from functools import partial
+
+import pandas as pd
+
+import json_data_clean as jdc
+from instrumentation import flatten_timings, merge_timings
+from streaming import stream_clean
+
+SAMPLE_SYSTEMBOOK = os.path.join(os.path.dirname(__file__), '..', 'sample-data', '03_Library Systembook.csv')
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+
+    def run_steps(self):
+        df = jdc.fileLoader(SAMPLE_SYSTEMBOOK, 'systembook_metrics')
+        df = jdc.duplicateCleaner(df, 'systembook_metrics')
+        df = jdc.naCleaner(df, 'systembook_metrics')
+        for col in ['Book checkout', 'Book Returned']:
+            df = jdc.dateCleaner(col, df, 'systembook_metrics')
+        return df
+
+    def test_records_every_step(self):
+        self.run_steps()
+        timings = jdc.metrics_logger.step_timings['systembook_metrics']
+
+        self.assertEqual(list(timings), ['fileLoader', 'duplicateCleaner', 'naCleaner', 'dateCleaner'])
+        self.assertEqual((timings['fileLoader']['rows_in'], timings['fileLoader']['rows_out']), (114, 114))
+        self.assertEqual((timings['duplicateCleaner']['rows_in'], timings['duplicateCleaner']['rows_out']), (114, 22))
+        self.assertEqual(timings['dateCleaner']['calls'], 2)
+        self.assertEqual((timings['dateCleaner']['rows_in'], timings['dateCleaner']['rows_out']), (20 + 19, 19 + 19))
+        for step in timings.values():
+            self.assertGreaterEqual(step['wall_seconds'], 0)
+            self.assertGreaterEqual(step['cpu_seconds'], 0)
+            self.assertNotIn('peak_alloc_mb', step)
+            self.assertGreaterEqual(step['rss_growth_mb'], 0)
+            self.assertGreaterEqual(step['peak_rss_mb'], step['rss_growth_mb'])
+
+    def test_row_metrics_are_unchanged(self):
+        self.run_steps()
+        self.assertNotIn('wall_seconds', str(jdc.metrics_logger.metrics))
+        self.assertEqual(jdc.metrics_logger.metrics['systembook_metrics']['duplicates_dropped'], 92)
+
+    def test_tracemalloc_peak(self):
+        tracemalloc.start()
+        try:
+            self.run_steps()
+        finally:
+            tracemalloc.stop()
+
+        self.assertGreater(jdc.metrics_logger.step_timings['systembook_metrics']['fileLoader']['peak_alloc_mb'], 0)
+
+    def test_streaming_adds_up_chunks(self):
+        steps = [partial(jdc.naCleaner, dataset_name='systembook_metrics')]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            stream_clean(SAMPLE_SYSTEMBOOK, 'systembook_metrics', steps, os.path.join(tmpdir, 'out.csv'),
+                         jdc.metrics_logger, chunksize=10)
+
+        timings = jdc.metrics_logger.step_timings['systembook_metrics']['naCleaner']
+        self.assertEqual(timings['calls'], 12)
+        self.assertEqual(timings['rows_in'], 22)
+
+    def test_saved_to_json(self):
+        self.run_steps()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'pipeline_metrics.json')
+            jdc.metrics_logger.save_metrics(path)
+            with open(path) as f:
+                saved = json.load(f)
+
+        self.assertEqual(saved['step_timings']['systembook_metrics']['naCleaner']['rows_out'], 20)
+        self.assertEqual(saved['systembook_metrics']['initial_row_count'], 114)
+
+    def test_merge_and_flatten(self):
+        first = {'calls': 1, 'wall_seconds': 1.0, 'cpu_seconds': 0.5, 'rows_in': 100, 'rows_out': 90,
+                 'rss_growth_mb': 5.0, 'peak_rss_mb': 50.0}
+        second = {**first, 'wall_seconds': 3.0, 'rss_growth_mb': 20.0, 'peak_rss_mb': 70.0}
+        total = merge_timings(merge_timings(None, first), second)
+
+        self.assertEqual(total['calls'], 2)
+        self.assertEqual(total['rows_in'], 200)
+        self.assertEqual(total['rows_per_second'], 50)
+        self.assertEqual((total['rss_growth_mb'], total['peak_rss_mb']), (25.0, 70.0))
+        self.assertNotIn('peak_alloc_mb', total)
+        rows = flatten_timings({'systembook_metrics': {'naCleaner': total}})
+        self.assertIn(('systembook_metrics', 'naCleaner_rows_per_second', 50), rows)
+
+        # A step too quick to time has no rows_per_second, which is left out rather than written as None
+        quick = merge_timings(None, {**first, 'wall_seconds': 0.0})
+        self.assertIsNone(quick['rows_per_second'])
+        self.assertNotIn('naCleaner_rows_per_second', [row[1] for row in
+                                                      flatten_timings({'systembook_metrics': {'naCleaner': quick}})])
+
+    def test_flat_timings_have_no_blanks(self):
+        self.run_steps()
+        flat = pd.DataFrame(flatten_timings(jdc.metrics_logger.step_timings),
+                            columns=['dataset', 'metric_name', 'metric_value'])
+
+        self.assertFalse(flat['metric_value'].isna().any())
+        self.assertIn('naCleaner_rss_growth_mb', set(flat['metric_name']))
+        self.assertNotIn('naCleaner_peak_alloc_mb', set(flat['metric_name']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import json_data_clean as jdc
+from integrity import IdSet
+from quarantine import RowValidity
+
+
+class TestIdSet(unittest.TestCase):
+    def test_dense_ids_use_a_bitmap(self):
+        ids = IdSet(pd.Series([1.0, 2.0, 3.0, np.nan, 5.0, 3.0]))
+        self.assertIsNotNone(ids.bitmap)
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(ids.contains(pd.Series([0, 1, 3, 4, 5, 6])).tolist(), [False, True, True, False, True, False])
+
+    def test_sparse_ids_use_a_sorted_array(self):
+        ids = IdSet(pd.Series([7, 10**12, 42], dtype='Int64'))
+        self.assertIsNone(ids.bitmap)
+        self.assertEqual(ids.contains(pd.Series([42, 10**12, 43, 10**13])).tolist(), [True, True, False, False])
+
+    def test_orphans(self):
+        ids = IdSet([1, 2, 3])
+        values = pd.Series([1.0, 2.5, None, 4.0, 3.0])
+        # Missing IDs are not orphans, IDs that are not whole numbers are
+        self.assertEqual(ids.orphans(values).tolist(), [False, True, False, True, False])
+        self.assertEqual(IdSet([]).orphans(values).tolist(), [True, True, False, True, True])
+
+    def test_cleaner_rejects_orphans(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        df = pd.DataFrame({'Id': [1, 2, 3, 4], 'Customer ID': [1.0, 9.0, 2.0, 9.0]})
+        rows = RowValidity(df)
+        rows.reject(pd.Series([False, False, False, True]), 'missing_values')
+
+        df = jdc.referenceCleaner('Customer ID', df, 'systembook_metrics', IdSet([1, 2]), validity=rows)
+        self.assertEqual(rows.clean(df)['Id'].tolist(), [1, 3])
+        self.assertEqual(rows.rejected(df)['reject_reason'].tolist(), ['orphan:Customer ID', 'missing_values'])
+        self.assertEqual(jdc.metrics_logger.metrics['systembook_metrics']['Customer ID_orphans'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+import json_data_clean as jdc
+from lookup import LookupService, make_server, positions_by_key
+from writers import write_mapped_copy
+from pipeline import DEFAULT_CONFIG, Pipeline, load_config
+
+
+class TestPositionsByKey(unittest.TestCase):
+    def test_groups_rows_and_skips_missing(self):
+        index = positions_by_key(pd.Series([3, None, 1, 3, None, 2], dtype='Int64'))
+        self.assertEqual({key: rows.tolist() for key, rows in index.items()}, {3: [0, 3], 1: [2], 2: [5]})
+
+
+class TestLookupService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # One pipeline run over the sample data with the repo config
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        config = load_config(DEFAULT_CONFIG)
+        config['output_dir'] = cls.tmpdir.name
+        jdc.metrics_logger = jdc.MetricsLogger()
+        Pipeline(config).run()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.service = LookupService(self.tmpdir.name, poll_seconds=0.05)
+
+    def tearDown(self):
+        self.service.stop()
+
+    def test_customer_and_loans(self):
+        self.assertEqual(self.service.customer('1'), {'Customer ID': 1, 'Customer Name': 'Jane Doe'})
+        self.assertIsNone(self.service.customer(4))
+        self.assertEqual(sorted(loan['Id'] for loan in self.service.customer_loans(1)), [1, 6, 12])
+
+        loan, = self.service.loan(9)
+        self.assertEqual((loan['Books'], loan['Customer ID'], loan['days_borrowed']), ('Catch 22', 7, 1))
+        self.assertEqual(self.service.loan(404), [])
+
+    def test_ids_must_be_whole_numbers(self):
+        self.assertEqual(self.service.customer(' 1.0 '), self.service.customer(1))
+        self.assertEqual(self.service.customer(1.0), self.service.customer(1))
+        for value in ['inf', '-inf', 'nan', 'abc', '1e3', '7.5', '', float('inf'), float('nan'), 7.5]:
+            with self.assertRaises(ValueError, msg=repr(value)):
+                self.service.loan(value)
+
+    def test_mapped_outputs_give_same_records(self):
+        csv_loans = self.service.customer_loans(1)
+        for name in ['cleaned_customers', 'cleaned_library_systembook']:
+            write_mapped_copy(os.path.join(self.tmpdir.name, f'{name}.csv'))
+        mapped = LookupService(self.tmpdir.name)
+
+        self.assertIsInstance(mapped.index.loans.arrays[0], pd.arrays.ArrowExtensionArray)
+        self.assertEqual(mapped.customer(1), self.service.customer(1))
+        self.assertEqual(json.dumps(mapped.customer_loans(1)), json.dumps(csv_loans))
+        self.assertEqual(mapped.title('little women')['loan_count'], 2)
+
+    def test_title_lookup_matches_spellings(self):
+        for query in ['Little Women', 'little women.', '  LITTLE WOMEN']:
+            title = self.service.title(query)
+            self.assertEqual(title['title'], 'Little Women', query)
+            self.assertEqual(title['loan_count'], 2)
+            self.assertEqual(title['latest_loan']['Id'], 12)
+            self.assertEqual(sorted(loan['Id'] for loan in self.service.title_loans(query)), [6, 12])
+        self.assertIsNone(self.service.title('Moby Dick'))
+
+    def test_reloads_after_a_new_run(self):
+        customers_path = os.path.join(self.tmpdir.name, 'cleaned_customers.csv')
+        original = pd.read_csv(customers_path)
+        self.service.start()
+        try:
+            added = pd.concat([original, pd.DataFrame({'Customer ID': [99], 'Customer Name': ['Ada Lovelace']})])
+            added.to_csv(customers_path, index=False)
+
+            deadline = time.monotonic() + 5
+            while self.service.reloads == 0 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(self.service.customer(99)['Customer Name'], 'Ada Lovelace')
+        finally:
+            original.to_csv(customers_path, index=False)
+
+    def test_http_routes(self):
+        server = make_server(self.service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        try:
+            with urllib.request.urlopen(f'{base}/customers/2') as response:
+                body = json.load(response)
+            self.assertEqual(body['customer']['Customer Name'], 'John Smith')
+            self.assertEqual(len(body['loans']), 4)
+
+            with urllib.request.urlopen(f'{base}/titles?q=catch%2022') as response:
+                self.assertEqual(json.load(response)['title'], 'Catch 22')
+
+            for path, status in [('/customers/404', 404), ('/loans/abc', 400), ('/books', 404),
+                                 ('/customers/inf', 400), ('/loans/nan', 400), ('/loans/-inf', 400)]:
+                with self.assertRaises(urllib.error.HTTPError) as error:
+                    urllib.request.urlopen(base + path)
+                self.assertEqual(error.exception.code, status, path)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import json_data_clean as jdc
+from metrics_store import HistoryReader, MetricsStore, metric_series, store_path
+
+
+def run_metrics(i):
+    return {
+        'systembook_metrics': {'initial_row_count': 114, 'final_row_count': 13 + i, 'data_retention_rate': 11.4},
+        'customers_metrics': {'initial_row_count': 9, 'final_row_count': 8}
+    }
+
+
+class TestMetricsStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = store_path(self.tmpdir.name)
+        self.store = MetricsStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def add_runs(self, days):
+        now = datetime.now()
+        for i, days_ago in enumerate(days):
+            timestamp = (now - timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S')
+            self.store.append_run(
+                timestamp,
+                {'systembook_metrics': {'data_retention_rate': 10.0 + i, 'final_row_count': 13},
+                 'customers_metrics': {'data_retention_rate': 88.89}},
+                {'systembook_metrics': {'naCleaner': {'wall_seconds': 0.01, 'peak_alloc_mb': None}}}
+            )
+
+    def test_last_days_range(self):
+        self.add_runs([90, 45, 20, 3, 0])
+
+        retention = self.store.metric_range('systembook_metrics', 'data_retention_rate', last_days=30)
+        self.assertEqual(retention['metric_value'].tolist(), [12.0, 13.0, 14.0])
+        self.assertTrue(retention['execution_timestamp'].is_monotonic_increasing)
+
+    def test_start_end_range_and_runs(self):
+        self.add_runs([10, 5, 1])
+        start = datetime.now() - timedelta(days=6)
+        end = datetime.now() - timedelta(days=2)
+
+        self.assertEqual(len(self.store.metric_range('customers_metrics', 'data_retention_rate', start, end)), 1)
+        runs = self.store.runs(start, end, datasets=['systembook_metrics'])
+        self.assertEqual(set(runs['metric_name']),
+                         {'data_retention_rate', 'final_row_count', 'naCleaner_wall_seconds', 'naCleaner_peak_alloc_mb'})
+        self.assertTrue(runs.loc[runs['metric_name'] == 'naCleaner_peak_alloc_mb', 'metric_value'].isna().all())
+        self.assertEqual(self.store.run_count(), 3)
+
+    def test_range_query_uses_index(self):
+        plan = self.store.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT metric_value FROM metrics '
+            'WHERE dataset = ? AND metric_name = ? AND execution_timestamp >= ?',
+            ('systembook_metrics', 'data_retention_rate', '2026-01-01 00:00:00')
+        ).fetchall()
+        self.assertIn('idx_metrics_dataset_metric', str(plan))
+
+    def test_reopened_store_keeps_history(self):
+        self.add_runs([1])
+        self.store.close()
+        self.store = MetricsStore(self.path)
+        self.add_runs([0])
+        self.assertEqual(self.store.run_count(), 2)
+
+    def test_metrics_logger_saves_run(self):
+        logger = jdc.MetricsLogger()
+        logger.log_metric('systembook_metrics', 'data_retention_rate', 11.4)
+        run_id = logger.save_to_store(self.path)
+
+        retention = self.store.metric_range('systembook_metrics', 'data_retention_rate')
+        self.assertEqual(retention['run_id'].tolist(), [run_id])
+        self.assertEqual(retention['metric_value'].tolist(), [11.4])
+
+
+class TestHistoryReader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = store_path(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def append(self, *runs):
+        timings = {'systembook_metrics': {'naCleaner': {'wall_seconds': 0.5, 'rows_in': 22}}}
+        with MetricsStore(self.path) as store:
+            for i in runs:
+                store.append_run(f'2026-01-01 10:00:{i:02d}', run_metrics(i), timings)
+
+    def test_reads_only_new_runs(self):
+        reader = HistoryReader(self.path)
+        self.assertEqual(reader.refresh(), 0)
+
+        self.append(0, 1)
+        self.assertEqual(reader.refresh(), 2)
+        first_frame = reader.frame()
+        self.assertIs(reader.frame(), first_frame)
+        self.assertEqual(reader.refresh(), 0)
+
+        self.append(2)
+        self.assertEqual(reader.refresh(), 1)
+        history = reader.frame()
+        self.assertIsNot(history, first_frame)
+        self.assertEqual(history['execution_timestamp'].nunique(), 3)
+
+        series = metric_series(history, 'systembook_metrics', ['final_row_count', 'naCleaner_wall_seconds'])
+        self.assertEqual(series['final_row_count'].tolist(), [13, 14, 15])
+        self.assertEqual(series['naCleaner_wall_seconds'].tolist(), [0.5, 0.5, 0.5])
+
+    def test_replaced_store_is_reread(self):
+        self.append(0, 1, 2)
+        reader = HistoryReader(self.path)
+        reader.refresh()
+
+        os.remove(self.path)
+        self.append(5)
+        self.assertEqual(reader.refresh(), 1)
+        self.assertEqual(reader.run_count, 1)
+        self.assertEqual(reader.frame()['execution_timestamp'].nunique(), 1)
+
+    def test_thousands_of_runs_load_quickly(self):
+        with MetricsStore(self.path) as store:
+            for i in range(5000):
+                store.append_run(f'2026-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}', run_metrics(i))
+
+        start = time.perf_counter()
+        reader = HistoryReader(self.path)
+        reader.refresh()
+        history = reader.frame()
+        metric_series(history, 'systembook_metrics', ['final_row_count'])
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(reader.run_count, 5000)
+
+    def test_metrics_logger_run_reaches_history(self):
+        logger = jdc.MetricsLogger()
+        logger.log_metric('systembook_metrics', 'duplicates_dropped', np.int64(92))
+        logger.log_step_timing('systembook_metrics', 'duplicateCleaner', {'calls': 1, 'wall_seconds': 0.1})
+        logger.save_to_store(self.path)
+
+        reader = HistoryReader(self.path)
+        reader.refresh()
+        history = reader.frame()
+        dropped = history.loc[history['metric_name'] == 'duplicates_dropped', 'metric_value']
+        self.assertEqual(dropped.tolist(), [92])
+        self.assertIn('duplicateCleaner_wall_seconds', set(history['metric_name']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import os
+import tempfile
+import unittest
+from functools import partial
+
+import pandas as pd
+
+import json_data_clean as jdc
+from multi_file import SOURCE_COLUMN, RejectedBatches, clean_files, expand_inputs, file_labels
+from quarantine import REASON_COLUMN, run_steps
+from title_normalizer import TitleCatalog
+from writers import read_output
+
+SAMPLE_DIR = os.path.join(os.path.dirname(__file__), '..', 'sample-data')
+SAMPLE_SYSTEMBOOK = os.path.join(SAMPLE_DIR, '03_Library Systembook.csv')
+
+
+def systembook_steps(source=None):
+    return [
+        partial(jdc.duplicateCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.naCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.datesCleaner, ['Book checkout', 'Book Returned'], dataset_name='systembook_metrics', source=source),
+        partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+        partial(jdc.idCleaner, ['Id', 'Customer ID'], dataset_name='systembook_metrics')
+    ]
+
+
+class TestCleanFiles(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.branch_dir = os.path.join(self.tmpdir.name, 'branches')
+        os.makedirs(self.branch_dir)
+
+        # The sample loans split into three branch exports
+        sample = pd.read_csv(SAMPLE_SYSTEMBOOK, dtype=str, keep_default_na=False)
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.branch_dir, f'branch_{i}.csv')
+            sample[i::3].to_csv(path, index=False)
+            self.paths.append(path)
+        self.output_path = os.path.join(self.tmpdir.name, 'cleaned.csv')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def add_broken_file(self):
+        path = os.path.join(self.branch_dir, 'branch_9.csv')
+        with open(path, 'w') as f:
+            f.write('Id,Books\n1,Dune\n')
+        return path
+
+    def clean_by_hand(self, paths):
+        """Each file cleaned on its own with run_steps, then stacked"""
+        frames = []
+        for path in paths:
+            df = run_steps(jdc.fileLoader(path, 'systembook_metrics'), systembook_steps(path))
+            frames.append(df.assign(**{SOURCE_COLUMN: os.path.basename(path)}))
+        jdc.metrics_logger = jdc.MetricsLogger()
+        return pd.concat(frames, ignore_index=True)
+
+    def test_expand_inputs(self):
+        self.assertEqual(expand_inputs(self.branch_dir), self.paths)
+        self.assertEqual(expand_inputs(os.path.join(self.branch_dir, 'branch_[01].csv')), self.paths[:2])
+        self.assertEqual(expand_inputs(os.path.join(self.tmpdir.name, '**', '*.csv')), self.paths)
+        self.assertEqual(expand_inputs(SAMPLE_SYSTEMBOOK), [SAMPLE_SYSTEMBOOK])
+        self.assertEqual(expand_inputs(os.path.join(self.branch_dir, 'none_*.csv')), [])
+
+        self.assertEqual(file_labels(self.paths), ['branch_0.csv', 'branch_1.csv', 'branch_2.csv'])
+        nested = os.path.join(self.tmpdir.name, 'north', 'branch_0.csv')
+        self.assertEqual(file_labels([self.paths[0], nested]), [os.path.join('branches', 'branch_0.csv'),
+                                                                os.path.join('north', 'branch_0.csv')])
+
+    def test_union_matches_each_file_cleaned_on_its_own(self):
+        expected = self.clean_by_hand(self.paths)
+
+        rows = clean_files(self.paths, 'systembook_metrics', systembook_steps(), self.output_path, jdc.metrics_logger,
+                           max_workers=2, io_workers=2)
+
+        self.assertEqual(rows, len(expected))
+        output = pd.read_csv(self.output_path)
+        self.assertEqual(list(output.columns), list(expected.columns))
+        self.assertEqual(output[SOURCE_COLUMN].tolist(), expected[SOURCE_COLUMN].tolist())
+        self.assertEqual(output['Id'].tolist(), expected['Id'].tolist())
+
+    def test_per_file_and_total_metrics(self):
+        clean_files(self.paths, 'systembook_metrics', systembook_steps(), self.output_path, jdc.metrics_logger,
+                    max_workers=2)
+        metrics = jdc.metrics_logger.metrics
+
+        per_file = [metrics[f'systembook_metrics/branch_{i}.csv'] for i in range(3)]
+        self.assertEqual([m['initial_row_count'] for m in per_file], [38, 38, 38])
+        total = metrics['systembook_metrics']
+        self.assertEqual((total['files_total'], total['files_cleaned'], total['files_failed']), (3, 3, 0))
+        for metric in ['initial_row_count', 'duplicates_dropped', 'na_rows_dropped']:
+            self.assertEqual(total[metric], sum(m[metric] for m in per_file), metric)
+        self.assertEqual(sum(m['final_row_count'] for m in per_file), len(pd.read_csv(self.output_path)))
+        self.assertIn('datesCleaner', jdc.metrics_logger.step_timings['systembook_metrics'])
+
+    def test_broken_file_does_not_stop_the_others(self):
+        expected = self.clean_by_hand(self.paths)
+        paths = self.paths + [self.add_broken_file(), os.path.join(self.branch_dir, 'deleted.csv')]
+
+        rows = clean_files(paths, 'systembook_metrics', systembook_steps(), self.output_path, jdc.metrics_logger,
+                           max_workers=2)
+
+        self.assertEqual(rows, len(expected))
+        metrics = jdc.metrics_logger.metrics
+        self.assertEqual((metrics['systembook_metrics']['files_cleaned'], metrics['systembook_metrics']['files_failed']),
+                         (3, 2))
+        self.assertEqual(metrics['systembook_metrics/branch_9.csv']['file_failed'], 1)
+        self.assertEqual(metrics['systembook_metrics/branch_0.csv']['file_failed'], 0)
+
+    def test_blank_file_does_not_fix_the_output_types(self):
+        blank = os.path.join(self.branch_dir, 'branch_00.csv')
+        with open(blank, 'w') as f:
+            f.write('Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID\n,,,,,\n')
+        output_path = os.path.join(self.tmpdir.name, 'cleaned.arrow')
+
+        rows = clean_files([blank] + self.paths, 'systembook_metrics', systembook_steps(), output_path,
+                           jdc.metrics_logger, output_format='arrow')
+
+        output = read_output(output_path)
+        self.assertEqual(len(output), rows)
+        self.assertEqual(output['Book checkout'].dtype.kind, 'M')
+        self.assertEqual(jdc.metrics_logger.metrics['systembook_metrics/branch_00.csv']['final_row_count'], 0)
+
+    def test_each_file_gets_its_own_date_format(self):
+        iso = os.path.join(self.branch_dir, 'branch_3.csv')
+        with open(iso, 'w') as f:
+            f.write('Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID\n'
+                    '900,Dune,2023-05-14,2023-05-30,2 weeks,1\n')
+
+        glob_source = os.path.join(self.branch_dir, '*.csv')
+        clean_files(self.paths + [iso], 'systembook_metrics', systembook_steps(glob_source), self.output_path,
+                    jdc.metrics_logger)
+
+        metrics = jdc.metrics_logger.metrics['systembook_metrics/branch_3.csv']
+        self.assertEqual((metrics['Book checkout_invalid_dates'], metrics['final_row_count']), (0, 1))
+        output = pd.read_csv(self.output_path, parse_dates=['Book checkout'])
+        self.assertEqual(output.loc[output['Id'] == 900, 'Book checkout'].iloc[0], pd.Timestamp(2023, 5, 14))
+
+    def test_no_file_cleaned(self):
+        with self.assertRaises(ValueError):
+            clean_files([self.add_broken_file()], 'systembook_metrics', systembook_steps(), self.output_path,
+                        jdc.metrics_logger)
+        self.assertEqual(jdc.metrics_logger.metrics['systembook_metrics']['files_failed'], 1)
+        with self.assertRaises(FileNotFoundError):
+            clean_files([], 'systembook_metrics', systembook_steps(), self.output_path, jdc.metrics_logger)
+
+    def test_rejected_rows_name_their_file(self):
+        quarantine = RejectedBatches()
+        rows = clean_files(self.paths, 'systembook_metrics', systembook_steps(), self.output_path, jdc.metrics_logger,
+                           max_workers=2, quarantine=quarantine)
+
+        rejected = pd.concat(quarantine, ignore_index=True)
+        self.assertEqual(rows + len(rejected), 114)
+        self.assertEqual(set(rejected[SOURCE_COLUMN]), {'branch_0.csv', 'branch_1.csv', 'branch_2.csv'})
+        self.assertIn(REASON_COLUMN, rejected.columns)
+
+    def test_titles_numbered_in_file_order(self):
+        catalog = TitleCatalog()
+        title_step = partial(jdc.titleCleaner, 'Books', dataset_name='systembook_metrics', catalog=catalog)
+        expected = pd.concat(
+            [run_steps(jdc.fileLoader(path, 'systembook_metrics'), systembook_steps(path) + [title_step])
+             for path in self.paths],
+            ignore_index=True
+        )
+
+        jdc.metrics_logger = jdc.MetricsLogger()
+        fresh = TitleCatalog()
+        title_step = partial(jdc.titleCleaner, 'Books', dataset_name='systembook_metrics', catalog=fresh)
+        clean_files(self.paths, 'systembook_metrics', systembook_steps() + [title_step], self.output_path,
+                    jdc.metrics_logger, max_workers=2)
+
+        self.assertEqual(pd.read_csv(self.output_path)['title_id'].tolist(), expected['title_id'].tolist())
+        self.assertEqual(fresh.titles, catalog.titles)
+        self.assertEqual(jdc.metrics_logger.metrics['systembook_metrics']['new_title_spellings'], catalog.misses)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+import pandas as pd
+
+import json_data_clean as jdc
+from overdue import overdue_columns
+from pipeline import Step
+from quarantine import RowValidity
+
+
+class TestOverdue(unittest.TestCase):
+    def test_overdue_columns(self):
+        days_borrowed = pd.Series(pd.array([10, 20, 14, None, 30], dtype='Int64'))
+        periods = pd.Series(pd.array([14, 14, 14, 14, None], dtype='Int64'))
+        days_overdue, is_overdue, fines = overdue_columns(days_borrowed, periods, fine_pence_per_day=25)
+
+        self.assertEqual(days_overdue.tolist(), [0, 6, 0, pd.NA, pd.NA])
+        self.assertEqual(is_overdue.tolist(), [False, True, False, False, False])
+        self.assertEqual(fines.tolist(), [0, 150, 0, pd.NA, pd.NA])
+
+    def test_fine_cap(self):
+        days_borrowed = pd.Series(pd.array([15, 60], dtype='Int64'))
+        periods = pd.Series(pd.array([14, 14], dtype='Int64'))
+        _, _, fines = overdue_columns(days_borrowed, periods, fine_pence_per_day=20, max_fine_pence=500)
+        self.assertEqual(fines.tolist(), [20, 500])
+
+    def test_fines_must_be_whole_pence(self):
+        days_borrowed = pd.Series(pd.array([15, 60], dtype='Int64'))
+        periods = pd.Series(pd.array([14, 14], dtype='Int64'))
+        _, _, fines = overdue_columns(days_borrowed, periods, fine_pence_per_day=20.0, max_fine_pence=500.0)
+        self.assertEqual((fines.dtype, fines.tolist()), (pd.Int64Dtype(), [20, 500]))
+
+        for params in [{'fine_pence_per_day': 2.5}, {'max_fine_pence': 99.9}]:
+            with self.assertRaises(ValueError, msg=params):
+                overdue_columns(days_borrowed, periods, **params)
+            with self.assertRaises(ValueError, msg=params):
+                Step('overdue', params)
+
+    def test_cleaner_counts_valid_rows_only(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        df = pd.DataFrame({
+            'days_borrowed': pd.array([21, 21, 7], dtype='Int64'),
+            'borrow_period_days': pd.array([14, 14, 14], dtype='Int64')
+        })
+        rows = RowValidity(df)
+        rows.reject(pd.Series([False, True, False]), 'invalid_loan')
+
+        df = jdc.enrich_overdue('days_borrowed', 'borrow_period_days', df, 'systembook_metrics', validity=rows)
+        self.assertEqual(df['is_overdue'].tolist(), [True, True, False])
+        metrics = jdc.metrics_logger.metrics['systembook_metrics']
+        self.assertEqual(metrics['overdue_loans'], 1)
+        self.assertEqual(metrics['fine_estimate_total_pence'], 140)
+
+
+if __name__ == '__main__':
+    unittest.main()
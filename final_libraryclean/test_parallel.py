@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+from functools import partial
+
+import json_data_clean as jdc
+from parallel import partition_file, run_datasets
+from title_normalizer import TitleCatalog
+from writers import read_output
+
+SAMPLE_DIR = os.path.join(os.path.dirname(__file__), '..', 'sample-data')
+SAMPLE_SYSTEMBOOK = os.path.join(SAMPLE_DIR, '03_Library Systembook.csv')
+SAMPLE_CUSTOMERS = os.path.join(SAMPLE_DIR, '03_Library SystemCustomers.csv')
+DATE_COLUMNS = ['Book checkout', 'Book Returned']
+ID_COLUMNS = ['Id', 'Customer ID']
+
+
+class TestRunDatasets(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def dataset_metrics(self):
+        return {name: dict(jdc.metrics_logger.metrics[name]) for name in ['systembook_metrics', 'customers_metrics']}
+
+    def run_serial(self):
+        df = jdc.fileLoader(SAMPLE_SYSTEMBOOK, 'systembook_metrics')
+        df = jdc.duplicateCleaner(df, 'systembook_metrics')
+        df = jdc.naCleaner(df, 'systembook_metrics')
+        for col in DATE_COLUMNS:
+            df = jdc.dateCleaner(col, df, 'systembook_metrics')
+        df = jdc.enrich_dateDuration('Book checkout', 'Book Returned', df, 'systembook_metrics')
+        df = jdc.idCleaner(ID_COLUMNS, df, 'systembook_metrics')
+        df.to_csv(os.path.join(self.tmpdir.name, 'serial_systembook.csv'), index=False)
+
+        df2 = jdc.fileLoader(SAMPLE_CUSTOMERS, 'customers_metrics')
+        df2 = jdc.duplicateCleaner(df2, 'customers_metrics')
+        df2 = jdc.naCleaner(df2, 'customers_metrics')
+        df2 = jdc.idCleaner(['Customer ID'], df2, 'customers_metrics')
+        df2.to_csv(os.path.join(self.tmpdir.name, 'serial_customers.csv'), index=False)
+
+        return self.dataset_metrics()
+
+    def run_parallel(self, partition_bytes):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        systembook_steps = [partial(jdc.naCleaner, dataset_name='systembook_metrics')]
+        systembook_steps += [partial(jdc.dateCleaner, col, dataset_name='systembook_metrics') for col in DATE_COLUMNS]
+        systembook_steps += [
+            partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+            partial(jdc.idCleaner, ID_COLUMNS, dataset_name='systembook_metrics')
+        ]
+        customers_steps = [
+            partial(jdc.naCleaner, dataset_name='customers_metrics'),
+            partial(jdc.idCleaner, ['Customer ID'], dataset_name='customers_metrics')
+        ]
+
+        datasets = [
+            {'dataset_name': 'systembook_metrics', 'filepath': SAMPLE_SYSTEMBOOK, 'steps': systembook_steps,
+             'output_path': os.path.join(self.tmpdir.name, f'parallel_systembook_{partition_bytes}.csv')},
+            {'dataset_name': 'customers_metrics', 'filepath': SAMPLE_CUSTOMERS, 'steps': customers_steps,
+             'output_path': os.path.join(self.tmpdir.name, f'parallel_customers_{partition_bytes}.csv')}
+        ]
+        rows = run_datasets(datasets, jdc.metrics_logger, max_workers=2, partition_bytes=partition_bytes)
+        return rows, self.dataset_metrics()
+
+    def read(self, name):
+        with open(os.path.join(self.tmpdir.name, name)) as f:
+            return f.read()
+
+    def test_partitions_cover_file(self):
+        header, ranges = partition_file(SAMPLE_SYSTEMBOOK, 100)
+
+        self.assertGreater(len(ranges), 10)
+        self.assertEqual(ranges[0][0], len(header))
+        self.assertEqual(ranges[-1][1], os.path.getsize(SAMPLE_SYSTEMBOOK))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+
+    def test_output_and_metrics_match_serial_run(self):
+        expected_metrics = self.run_serial()
+
+        for partition_bytes in [100, 1000, 64 * 1024 * 1024]:
+            rows, metrics = self.run_parallel(partition_bytes)
+            self.assertEqual(metrics, expected_metrics, f'partition_bytes={partition_bytes}')
+            for name in ['systembook', 'customers']:
+                self.assertEqual(
+                    self.read(f'parallel_{name}_{partition_bytes}.csv'),
+                    self.read(f'serial_{name}.csv'),
+                    f'{name}, partition_bytes={partition_bytes}'
+                )
+            self.assertEqual(rows, {'systembook_metrics': 13, 'customers_metrics': 8})
+
+    def test_titles_numbered_as_in_serial_run(self):
+        steps = [
+            partial(jdc.duplicateCleaner, dataset_name='systembook_metrics'),
+            partial(jdc.naCleaner, dataset_name='systembook_metrics'),
+            partial(jdc.datesCleaner, DATE_COLUMNS, dataset_name='systembook_metrics'),
+            partial(jdc.titleCleaner, 'Books', dataset_name='systembook_metrics', catalog=TitleCatalog())
+        ]
+        df = jdc.fileLoader(SAMPLE_SYSTEMBOOK, 'systembook_metrics')
+        for step in steps:
+            df = step(df)
+        expected = df['title_id'].tolist()
+        expected_metrics = jdc.metrics_logger.metrics['systembook_metrics']
+
+        for partition_bytes in [100, 1000]:
+            jdc.metrics_logger = jdc.MetricsLogger()
+            catalog = TitleCatalog()
+            steps[-1] = partial(jdc.titleCleaner, 'Books', dataset_name='systembook_metrics', catalog=catalog)
+            output_path = os.path.join(self.tmpdir.name, 'titles.arrow')
+            run_datasets(
+                [{'dataset_name': 'systembook_metrics', 'filepath': SAMPLE_SYSTEMBOOK, 'steps': steps[1:],
+                  'output_path': output_path, 'output_format': 'arrow'}],
+                jdc.metrics_logger, max_workers=2, partition_bytes=partition_bytes
+            )
+
+            metrics = jdc.metrics_logger.metrics['systembook_metrics']
+            self.assertEqual(read_output(output_path)['title_id'].tolist(), expected, partition_bytes)
+            for metric in ['new_title_spellings', 'title_variant_rows']:
+                self.assertEqual(metrics[metric], expected_metrics[metric], metric)
+            self.assertEqual(catalog.misses, expected_metrics['new_title_spellings'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import json_data_clean as jdc
+from pipeline import Pipeline, Step, load_config, plan_steps
+
+SAMPLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'sample-data'))
+SAMPLE_SYSTEMBOOK = os.path.join(SAMPLE_DIR, '03_Library Systembook.csv')
+HEADER = ['Id', 'Books', 'Book checkout', 'Book Returned', 'Days allowed to borrow', 'Customer ID']
+
+SYSTEMBOOK_STEPS = [
+    'duplicates',
+    'na',
+    {'dates': {'columns': ['Book checkout']}},
+    {'dates': {'columns': ['Book Returned']}},
+    {'loan_duration': {'checkout': 'Book checkout', 'returned': 'Book Returned'}},
+    {'ids': {'columns': ['Id', 'Customer ID']}}
+]
+
+
+class TestPlanSteps(unittest.TestCase):
+    def test_reorders_cheap_filters_and_fuses_dates(self):
+        steps = [
+            Step('duplicates'),
+            Step('na'),
+            Step('dates', {'columns': ['Book checkout']}),
+            Step('ids', {'columns': ['Id', 'Customer ID']}),
+            Step('dates', {'columns': ['Book Returned']}),
+            Step('loan_duration', {'checkout': 'Book checkout', 'returned': 'Book Returned'})
+        ]
+        self.assertEqual(plan_steps(steps, HEADER), [
+            Step('duplicates'),
+            Step('na'),
+            Step('dates', {'columns': ['Book checkout', 'Book Returned']}),
+            Step('loan_duration', {'checkout': 'Book checkout', 'returned': 'Book Returned'}),
+            Step('ids', {'columns': ['Id', 'Customer ID']})
+        ])
+
+    def test_conflicting_steps_keep_their_order(self):
+        # Duplicates must see the raw dates, so it cannot move after the date step
+        steps = [Step('dates', {'columns': ['Book checkout']}), Step('duplicates')]
+        self.assertEqual(plan_steps(steps, HEADER), steps)
+
+    def test_row_filters_keep_their_order(self):
+        # Both would reject a blank duplicate row; the metrics count it under the first
+        steps = [Step('duplicates'), Step('na'), Step('references', {'column': 'Customer ID', 'dataset': 'customers_metrics'})]
+        self.assertEqual(plan_steps(steps, HEADER), steps)
+
+    def test_skips_noop_steps(self):
+        steps = [
+            Step('na'),
+            Step('na'),
+            Step('dates', {'columns': ['Book checkout', 'Missing']}),
+            Step('dates', {'columns': ['Book checkout']}),
+            Step('ids', {'columns': ['Not in file']}),
+            Step('borrow_period', {'column': 'Not in file'}),
+            Step('duplicates', {'enabled': False})
+        ]
+        self.assertEqual(
+            plan_steps(steps, HEADER, {'reorder': False}),
+            [Step('na'), Step('dates', {'columns': ['Book checkout']})]
+        )
+
+    def test_unknown_step(self):
+        with self.assertRaises(ValueError):
+            Step('sort')
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_config(self, **overrides):
+        config = {
+            'input_dir': SAMPLE_DIR,
+            'output_dir': self.tmpdir.name,
+            'datasets': {
+                'systembook_metrics': {
+                    'input': '03_Library Systembook.csv',
+                    'output': 'pipeline_systembook',
+                    'steps': SYSTEMBOOK_STEPS
+                }
+            },
+            **overrides
+        }
+        path = os.path.join(self.tmpdir.name, 'pipeline.json')
+        with open(path, 'w') as f:
+            json.dump(config, f)
+        return path
+
+    def run_by_hand(self):
+        df = jdc.fileLoader(SAMPLE_SYSTEMBOOK, 'systembook_metrics')
+        df = jdc.duplicateCleaner(df, 'systembook_metrics')
+        df = jdc.naCleaner(df, 'systembook_metrics')
+        for col in ['Book checkout', 'Book Returned']:
+            df = jdc.dateCleaner(col, df, 'systembook_metrics')
+        df = jdc.enrich_dateDuration('Book checkout', 'Book Returned', df, 'systembook_metrics')
+        df = jdc.idCleaner(['Id', 'Customer ID'], df, 'systembook_metrics')
+
+        path = os.path.join(self.tmpdir.name, 'by_hand.csv')
+        df.to_csv(path, index=False)
+        metrics = dict(jdc.metrics_logger.metrics['systembook_metrics'])
+        jdc.metrics_logger = jdc.MetricsLogger()
+        return path, metrics
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_without_reorder_matches_hand_written_chain(self):
+        expected_path, expected_metrics = self.run_by_hand()
+
+        rows = Pipeline.from_file(self.write_config(optimize={'reorder': False})).run()
+        metrics = jdc.metrics_logger.metrics['systembook_metrics']
+
+        self.assertEqual(rows, {'systembook_metrics': 13})
+        self.assertEqual(self.read(os.path.join(self.tmpdir.name, 'pipeline_systembook.csv')), self.read(expected_path))
+        for metric, value in expected_metrics.items():
+            self.assertEqual(metrics[metric], value, metric)
+        self.assertEqual(metrics['data_retention_rate'], 11.4)
+
+    def test_optimized_plan_gives_same_output(self):
+        expected_path, _ = self.run_by_hand()
+
+        for runner in ['memory', 'streaming', 'parallel']:
+            jdc.metrics_logger = jdc.MetricsLogger()
+            Pipeline.from_file(self.write_config(runner=runner, chunksize=10, partition_size_mb=1)).run()
+
+            output = self.read(os.path.join(self.tmpdir.name, 'pipeline_systembook.csv'))
+            self.assertEqual(output, self.read(expected_path), runner)
+            self.assertEqual(jdc.metrics_logger.metrics['systembook_metrics']['final_row_count'], 13)
+
+    def test_step_cache_reuses_earlier_run(self):
+        expected_path, _ = self.run_by_hand()
+        config = self.write_config(step_cache={'dir': 'cache', 'max_mb': 16})
+
+        for hits in [0, 6]:
+            jdc.metrics_logger = jdc.MetricsLogger()
+            Pipeline.from_file(config).run()
+
+            metrics = jdc.metrics_logger.metrics['systembook_metrics']
+            self.assertEqual(metrics['step_cache_hits'], hits)
+            self.assertEqual(self.read(os.path.join(self.tmpdir.name, 'pipeline_systembook.csv')), self.read(expected_path))
+        self.assertTrue(os.path.isdir(os.path.join(self.tmpdir.name, 'cache')))
+
+    def test_references_run_after_the_referenced_dataset(self):
+        datasets = {
+            'systembook_metrics': {
+                'input': '03_Library Systembook.csv',
+                'output': 'pipeline_systembook',
+                'steps': SYSTEMBOOK_STEPS + [{'references': {'column': 'Customer ID', 'dataset': 'customers_metrics'}}]
+            },
+            'customers_metrics': {
+                'input': '03_Library SystemCustomers.csv',
+                'output': 'pipeline_customers',
+                'steps': ['duplicates', 'na', {'ids': {'columns': ['Customer ID']}}]
+            }
+        }
+        for runner in ['memory', 'streaming', 'parallel']:
+            jdc.metrics_logger = jdc.MetricsLogger()
+            pipeline = Pipeline.from_file(self.write_config(runner=runner, chunksize=10, datasets=datasets))
+            self.assertEqual(pipeline.waves, [['customers_metrics'], ['systembook_metrics']])
+            rows = pipeline.run()
+
+            # Customer 10 has one clean loan but is not a customer
+            self.assertEqual(rows['systembook_metrics'], 12, runner)
+            output = pd.read_csv(os.path.join(self.tmpdir.name, 'pipeline_systembook.csv'))
+            self.assertNotIn(10, output['Customer ID'].tolist())
+
+    def test_glob_input_cleans_every_file_into_one_output(self):
+        expected_path, _ = self.run_by_hand()
+        sample = pd.read_csv(SAMPLE_SYSTEMBOOK, dtype=str, keep_default_na=False)
+        os.makedirs(os.path.join(self.tmpdir.name, 'branches'))
+        for i in range(2):
+            sample[i::2].to_csv(os.path.join(self.tmpdir.name, 'branches', f'branch_{i}.csv'), index=False)
+        datasets = {'systembook_metrics': {
+            'input': 'branches/*.csv', 'output': 'pipeline_systembook', 'steps': SYSTEMBOOK_STEPS
+        }}
+
+        for runner in ['memory', 'streaming', 'parallel']:
+            jdc.metrics_logger = jdc.MetricsLogger()
+            config = self.write_config(runner=runner, chunksize=10, input_dir=self.tmpdir.name, datasets=datasets)
+            rows = Pipeline.from_file(config).run()
+
+            output = pd.read_csv(os.path.join(self.tmpdir.name, 'pipeline_systembook.csv'))
+            self.assertEqual(rows, {'systembook_metrics': 13}, runner)
+            self.assertEqual(sorted(output['Id']), sorted(pd.read_csv(expected_path)['Id']), runner)
+            self.assertEqual(set(output['source_file']), {'branch_0.csv', 'branch_1.csv'})
+            metrics = jdc.metrics_logger.metrics['systembook_metrics']
+            self.assertEqual((metrics['files_total'], metrics['files_failed'], metrics['initial_row_count']), (2, 0, 114))
+
+    def test_references_to_unknown_dataset(self):
+        datasets = {'systembook_metrics': {
+            'input': '03_Library Systembook.csv',
+            'output': 'pipeline_systembook',
+            'steps': [{'references': {'column': 'Customer ID', 'dataset': 'members'}}]
+        }}
+        with self.assertRaises(ValueError):
+            Pipeline.from_file(self.write_config(datasets=datasets))
+
+    def test_load_config_checks_runner(self):
+        with self.assertRaises(ValueError):
+            load_config(self.write_config(runner='spark'))
+        with self.assertRaises(ValueError):
+            load_config(self.write_config(runner='streaming'))
+
+    def test_yaml_config_in_repo(self):
+        config = load_config(os.path.join(os.path.dirname(__file__), 'pipeline.yaml'))
+        self.assertEqual(set(config['datasets']), {'systembook_metrics', 'customers_metrics'})
+
+
+if __name__ == '__main__':
+    unittest.main()
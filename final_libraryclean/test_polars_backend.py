@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import unittest
+
+import json_data_clean as jdc
+import polars_backend
+from date_parser import date_format_cache
+from pipeline import Pipeline, load_config
+
+SAMPLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'sample-data'))
+
+SYSTEMBOOK_STEPS = [
+    'duplicates',
+    'na',
+    {'dates': {'columns': ['Book checkout', 'Book Returned']}},
+    {'loan_duration': {'checkout': 'Book checkout', 'returned': 'Book Returned'}},
+    {'borrow_period': {'column': 'Days allowed to borrow'}},
+    {'overdue': {'fine_pence_per_day': 20, 'max_fine_pence': 100}},
+    {'ids': {'columns': ['Id', 'Customer ID']}},
+    {'titles': {'column': 'Books'}}
+]
+
+MESSY_SYSTEMBOOK = '''Id,Books,Book checkout,Book Returned,Days allowed to borrow,Customer ID
+1,Dune,"""01/02/2023""",05/02/2023,2 weeks,1
+1,Dune,"""01/02/2023""",05/02/2023,2 weeks,1
+2,"Emma, Vol 1",03/02/2023,01/02/2023,2 weeks,2
+3,IT,31/02/2023,05/03/2023,2 weeks,3
+4,NaN,04/02/2023,06/02/2023,2 weeks,
+,,,,,
+,,,,,
+5,Misery ,10/02/2023,NA,3 weeks,4
+6,Ulysses,11/02/2023,20/02/2023,14 days,5
+7,Emma,12/02/2023,20/02/2023,3 wks,6
+8,Carrie,13/02/2023,20/02/2023,until Friday,7
+9,ulysses,14/02/2023,28/02/2023,1 week,8
+'''
+
+
+@unittest.skipUnless(polars_backend.available(), 'polars is not installed')
+class TestPolarsBackend(unittest.TestCase):
+    def setUp(self):
+        date_format_cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_backends(self, input_dir, input_name, steps, **overrides):
+        """Run the pipeline with each backend; returns {backend: (output dir, metrics)}"""
+        runs = {}
+        for backend in ['pandas', 'polars']:
+            output_dir = os.path.join(self.tmpdir.name, backend)
+            config = {
+                'input_dir': input_dir,
+                'output_dir': output_dir,
+                'backend': backend,
+                'quarantine': True,
+                'datasets': {'systembook_metrics': {'input': input_name, 'output': 'systembook', 'steps': steps}},
+                **overrides
+            }
+            path = os.path.join(self.tmpdir.name, f'{backend}.json')
+            with open(path, 'w') as f:
+                json.dump(config, f)
+
+            jdc.metrics_logger = jdc.MetricsLogger()
+            Pipeline.from_file(path).run()
+            runs[backend] = output_dir, jdc.metrics_logger.metrics['systembook_metrics']
+        return runs
+
+    def assert_same_runs(self, runs):
+        (pandas_dir, pandas_metrics), (polars_dir, polars_metrics) = runs['pandas'], runs['polars']
+        self.assertEqual(polars_metrics, pandas_metrics)
+        self.assertEqual(sorted(os.listdir(polars_dir)), sorted(os.listdir(pandas_dir)))
+        for name in os.listdir(pandas_dir):
+            with open(os.path.join(pandas_dir, name)) as expected, open(os.path.join(polars_dir, name)) as output:
+                self.assertEqual(output.read(), expected.read(), name)
+
+    def test_sample_data_matches_pandas(self):
+        for optimize in [{'reorder': False}, {'reorder': True}]:
+            # Without a quarantine the filters are real filters in the query
+            for quarantine in [True, False]:
+                runs = self.run_backends(
+                    SAMPLE_DIR, '03_Library Systembook.csv', SYSTEMBOOK_STEPS, optimize=optimize, quarantine=quarantine
+                )
+                self.assert_same_runs(runs)
+                self.assertEqual(runs['polars'][1]['final_row_count'], 13)
+
+    def test_messy_file_matches_pandas(self):
+        with open(os.path.join(self.tmpdir.name, 'messy.csv'), 'w') as f:
+            f.write(MESSY_SYSTEMBOOK)
+
+        for quarantine in [True, False]:
+            runs = self.run_backends(
+                self.tmpdir.name, 'messy.csv', SYSTEMBOOK_STEPS, optimize={'reorder': False}, quarantine=quarantine
+            )
+            self.assert_same_runs(runs)
+            self.assertEqual(runs['polars'][1]['final_row_count'], 5)
+            self.assertEqual(runs['polars'][1]['title_variant_rows'], 1)
+            self.assertEqual(runs['polars'][1]['borrow_periods_unparsed'], 1)
+            self.assertEqual(runs['polars'][1]['overdue_loans'], 1)
+            self.assertEqual(runs['polars'][1]['fine_estimate_total_pence'], 100)
+
+    def test_only_with_memory_runner(self):
+        path = os.path.join(self.tmpdir.name, 'streaming.json')
+        with open(path, 'w') as f:
+            json.dump({'runner': 'streaming', 'chunksize': 10, 'backend': 'polars', 'datasets': {}}, f)
+        with self.assertRaises(ValueError):
+            load_config(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
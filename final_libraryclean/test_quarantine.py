@@ -0,0 +1,154 @@
+import os
+import tempfile
+import unittest
+from functools import partial
+
+import pandas as pd
+
+import json_data_clean as jdc
+from integrity import IdSet
+from multi_file import RejectedBatches
+from quarantine import QuarantineSink, RowValidity, run_steps
+from streaming import stream_clean
+from writers import read_output
+
+SAMPLE_SYSTEMBOOK = os.path.join(os.path.dirname(__file__), '..', 'sample-data', '03_Library Systembook.csv')
+DATE_COLUMNS = ['Book checkout', 'Book Returned']
+ID_COLUMNS = ['Id', 'Customer ID']
+
+
+def systembook_steps():
+    return [
+        partial(jdc.naCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.datesCleaner, DATE_COLUMNS, dataset_name='systembook_metrics'),
+        partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+        partial(jdc.idCleaner, ID_COLUMNS, dataset_name='systembook_metrics')
+    ]
+
+
+class TestRunSteps(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_one_by_one(self):
+        df = jdc.fileLoader(SAMPLE_SYSTEMBOOK, 'systembook_metrics')
+        df = jdc.duplicateCleaner(df, 'systembook_metrics')
+        for step in systembook_steps():
+            df = step(df)
+        return df, dict(jdc.metrics_logger.metrics['systembook_metrics'])
+
+    def run_with_mask(self, output_format='csv'):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        path = os.path.join(self.tmpdir.name, f'rejected.{output_format}')
+        steps = [partial(jdc.duplicateCleaner, dataset_name='systembook_metrics')] + systembook_steps()
+
+        with QuarantineSink(path, output_format) as sink:
+            df = run_steps(jdc.fileLoader(SAMPLE_SYSTEMBOOK, 'systembook_metrics'), steps, sink)
+        return df, dict(jdc.metrics_logger.metrics['systembook_metrics']), read_output(path)
+
+    def test_output_and_metrics_match_step_by_step_run(self):
+        expected, expected_metrics = self.run_one_by_one()
+        df, metrics, _ = self.run_with_mask()
+
+        pd.testing.assert_frame_equal(df, expected)
+        self.assertEqual(metrics, expected_metrics)
+
+    def test_rejected_rows_have_reason_and_raw_values(self):
+        df, _, rejected = self.run_with_mask()
+
+        self.assertEqual(len(df) + len(rejected), 114)
+        self.assertEqual(rejected['reject_reason'].value_counts().to_dict(), {
+            'duplicate': 92, 'invalid_loan': 6, 'missing_values': 2, 'invalid_date:Book checkout': 1
+        })
+
+        invalid_date = rejected[rejected['reject_reason'] == 'invalid_date:Book checkout'].iloc[0]
+        self.assertEqual(invalid_date['source_row'], 16)
+        self.assertEqual(invalid_date['Book checkout'], '"32/05/2023"')
+
+    def test_parquet_quarantine(self):
+        _, _, rejected = self.run_with_mask('parquet')
+        self.assertEqual(len(rejected), 101)
+        self.assertEqual(list(rejected.columns[[0, -1]]), ['source_row', 'reject_reason'])
+
+    def test_first_failing_filter_gives_the_reason(self):
+        df = pd.DataFrame({'a': [1, None, 3, 3], 'b': ['x', 'y', None, 'z']})
+        validity = RowValidity(df)
+
+        self.assertEqual(validity.reject(df['a'].isna() | df['b'].isna(), 'missing_values'), 2)
+        self.assertEqual(validity.reject(df['a'] == 3, 'three'), 1)
+        self.assertEqual(validity.rejected(df)['reject_reason'].tolist(), ['missing_values', 'missing_values', 'three'])
+        self.assertEqual(validity.clean(df)['a'].tolist(), [1])
+
+    def test_rejects_after_a_split_keep_their_source_row(self):
+        df = pd.DataFrame({'Id': [1, 2, 3, 4], 'Customer ID': [1, None, 1, 9]})
+        steps = [
+            partial(jdc.naCleaner, dataset_name='systembook_metrics'),
+            partial(jdc.idCleaner, ['Id'], dataset_name='systembook_metrics'),
+            partial(jdc.referenceCleaner, 'Customer ID', dataset_name='systembook_metrics', known_ids=IdSet([1]))
+        ]
+        rejected = RejectedBatches()
+
+        run_steps(df, steps, rejected)
+
+        rejected = pd.concat(rejected, ignore_index=True)
+        self.assertEqual(rejected['source_row'].tolist(), [1, 3])
+        self.assertEqual(rejected['reject_reason'].tolist(), ['missing_values', 'orphan:Customer ID'])
+
+    def test_streamed_rejects_match_in_memory(self):
+        _, _, expected = self.run_with_mask()
+
+        jdc.metrics_logger = jdc.MetricsLogger()
+        path = os.path.join(self.tmpdir.name, 'rejected_streamed.csv')
+        with QuarantineSink(path) as sink:
+            stream_clean(
+                SAMPLE_SYSTEMBOOK, 'systembook_metrics', systembook_steps(), os.path.join(self.tmpdir.name, 'out.csv'),
+                jdc.metrics_logger, chunksize=7, quarantine=sink
+            )
+        streamed = read_output(path)
+
+        key = ['source_row', 'reject_reason']
+        self.assertEqual(
+            streamed.sort_values('source_row')[key].values.tolist(), expected.sort_values('source_row')[key].values.tolist()
+        )
+
+    def test_sink_replaces_previous_quarantine(self):
+        path = os.path.join(self.tmpdir.name, 'rejected.csv')
+        with open(path, 'w') as f:
+            f.write('stale\n')
+
+        with QuarantineSink(path) as sink:
+            self.assertFalse(os.path.exists(path))
+            sink.write(pd.DataFrame({'source_row': [1], 'reject_reason': ['duplicate']}))
+            sink.write(pd.DataFrame({'source_row': [5], 'reject_reason': ['invalid_loan']}))
+
+        self.assertEqual(sink.rows_written, 2)
+        self.assertEqual(read_output(path)['source_row'].tolist(), [1, 5])
+
+    def test_appending_sink_keeps_earlier_rejects(self):
+        for output_format in ['csv', 'parquet', 'arrow']:
+            path = os.path.join(self.tmpdir.name, f'rejected_append.{output_format}')
+            with QuarantineSink(path, output_format) as sink:
+                sink.write(pd.DataFrame({'source_row': [1], 'reject_reason': ['duplicate']}))
+
+            # A run that rejects nothing leaves the file as it was
+            with QuarantineSink(path, output_format, append=True) as sink:
+                pass
+            self.assertEqual(read_output(path)['source_row'].tolist(), [1], output_format)
+
+            with QuarantineSink(path, output_format, append=True) as sink:
+                sink.write(pd.DataFrame({'source_row': [5], 'reject_reason': ['invalid_loan']}))
+            self.assertEqual(sink.rows_written, 1)
+            self.assertEqual(read_output(path)['reject_reason'].tolist(), ['duplicate', 'invalid_loan'], output_format)
+
+            # Rechecked rows are cleaned again, so their earlier rejects go even if nothing is rejected now
+            with QuarantineSink(path, output_format, append=True, recheck=('invalid_',)) as sink:
+                pass
+            self.assertEqual(read_output(path)['reject_reason'].tolist(), ['duplicate'], output_format)
+
+
+if __name__ == '__main__':
+    unittest.main()
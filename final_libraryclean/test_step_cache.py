@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+from functools import partial
+
+import pandas as pd
+
+import json_data_clean as jdc
+from integrity import IdSet
+from quarantine import QuarantineSink, run_steps
+from step_cache import StepCache, checkpoints, run_cached_steps, step_signature
+from title_normalizer import TitleCatalog
+from writers import read_output
+
+SAMPLE_SYSTEMBOOK = os.path.join(os.path.dirname(__file__), '..', 'sample-data', '03_Library Systembook.csv')
+
+
+def systembook_steps(id_columns=('Id', 'Customer ID')):
+    return [
+        partial(jdc.duplicateCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.naCleaner, dataset_name='systembook_metrics'),
+        partial(jdc.datesCleaner, ['Book checkout', 'Book Returned'], dataset_name='systembook_metrics'),
+        partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+        partial(jdc.referenceCleaner, 'Customer ID', dataset_name='systembook_metrics', known_ids=IdSet(range(1, 10))),
+        partial(jdc.idCleaner, list(id_columns), dataset_name='systembook_metrics')
+    ]
+
+
+class TestStepCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = StepCache(os.path.join(self.tmpdir.name, 'cache'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_pipeline(self, steps, cache, run=0):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        path = os.path.join(self.tmpdir.name, f'rejected_{run}.csv')
+        with QuarantineSink(path, 'csv') as sink:
+            df = run_cached_steps(SAMPLE_SYSTEMBOOK, 'systembook_metrics', jdc.fileLoader, steps, cache, sink)
+        return df, dict(jdc.metrics_logger.metrics['systembook_metrics']), read_output(path)
+
+    def test_warm_run_matches_uncached_run(self):
+        expected, expected_metrics, expected_rejected = self.run_pipeline(systembook_steps(), None)
+        cold, cold_metrics, _ = self.run_pipeline(systembook_steps(), self.cache, 1)
+        warm, warm_metrics, warm_rejected = self.run_pipeline(systembook_steps(), self.cache, 2)
+
+        self.assertEqual((cold_metrics['step_cache_hits'], cold_metrics['step_cache_misses']), (0, 7))
+        self.assertEqual((warm_metrics['step_cache_hits'], warm_metrics['step_cache_misses']), (7, 0))
+        pd.testing.assert_frame_equal(cold, expected)
+        pd.testing.assert_frame_equal(warm, expected)
+        pd.testing.assert_frame_equal(warm_rejected, expected_rejected)
+        for metrics in (cold_metrics, warm_metrics):
+            self.assertEqual({k: v for k, v in metrics.items() if not k.startswith('step_cache')}, expected_metrics)
+
+    def test_hit_past_titles_step_restores_catalog(self):
+        catalog_path = os.path.join(self.tmpdir.name, 'title_catalog.json')
+
+        def steps(catalog):
+            return systembook_steps() + [
+                partial(jdc.titleCleaner, 'Books', dataset_name='systembook_metrics', catalog=catalog)
+            ]
+
+        catalog = TitleCatalog(catalog_path)
+        expected, _, _ = self.run_pipeline(steps(catalog), self.cache)
+        catalog.save()
+        titles = dict(catalog.titles)
+
+        # The catalog changed, so its title ids are not taken from the entry of the empty catalog
+        _, metrics, _ = self.run_pipeline(steps(TitleCatalog(catalog_path)), self.cache, 1)
+        self.assertEqual(metrics['step_cache_misses'], 1)
+
+        # Without the catalog file the first run's entry is used, and the catalog comes back with it
+        os.remove(catalog_path)
+        catalog = TitleCatalog(catalog_path)
+        df, metrics, _ = self.run_pipeline(steps(catalog), self.cache, 2)
+        self.assertEqual(metrics['step_cache_misses'], 0)
+        pd.testing.assert_frame_equal(df, expected)
+        self.assertEqual(catalog.titles, titles)
+        self.assertGreater(catalog.misses, 0)
+        self.assertEqual(catalog.title_id('Little Women'), df.loc[df['Books'] == 'Little Women', 'title_id'].iloc[0])
+
+    def test_changed_step_reruns_from_that_step(self):
+        self.run_pipeline(systembook_steps(), self.cache)
+        df, metrics, _ = self.run_pipeline(systembook_steps(id_columns=['Id']), self.cache, 1)
+
+        # Picked up at the checkpoint before datesCleaner, the last one before the changed step
+        self.assertEqual((metrics['step_cache_hits'], metrics['step_cache_misses']), (3, 4))
+        jdc.metrics_logger = jdc.MetricsLogger()
+        expected = run_steps(jdc.fileLoader(SAMPLE_SYSTEMBOOK, 'systembook_metrics'), systembook_steps(id_columns=['Id']))
+        pd.testing.assert_frame_equal(df, expected)
+
+    def test_changed_file_misses(self):
+        self.run_pipeline(systembook_steps(), self.cache)
+        keys = self.cache.keys(SAMPLE_SYSTEMBOOK, jdc.fileLoader, systembook_steps())
+
+        copy = os.path.join(self.tmpdir.name, 'systembook.csv')
+        with open(SAMPLE_SYSTEMBOOK, 'rb') as f:
+            data = f.read()
+        with open(copy, 'wb') as f:
+            f.write(data + b'\n')
+        self.assertEqual(checkpoints(systembook_steps()), {0, 2, 6})
+        self.assertEqual([i for i, key in enumerate(keys) if key in self.cache], [0, 2, 6])
+        self.assertFalse(any(key in self.cache for key in self.cache.keys(copy, jdc.fileLoader, systembook_steps())))
+
+    def test_state_bigger_than_cache_is_not_written(self):
+        self.cache.max_bytes = 1024
+        self.run_pipeline(systembook_steps(), self.cache)
+        self.assertEqual(self.cache.entries(), [])
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+
+    def test_step_with_uncacheable_parameter(self):
+        steps = systembook_steps()
+        steps[3] = partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics', validity=object())
+        self.assertIsNone(step_signature(steps[3]))
+
+        keys = self.cache.keys(SAMPLE_SYSTEMBOOK, jdc.fileLoader, steps)
+        self.assertTrue(all(key is not None for key in keys[:4]))
+        self.assertTrue(all(key is None for key in keys[4:]))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.run_pipeline(systembook_steps(), self.cache)
+        entries = sorted(self.cache.entries())
+        newest = entries[-1][2]
+
+        self.cache.max_bytes = sum(size for _, size, _ in entries) - 1
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertNotIn(entries[0][2], self.cache)
+        self.assertIn(newest, self.cache)
+
+        self.cache.max_bytes = 0
+        self.cache.evict()
+        self.assertEqual(self.cache.entries(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from functools import partial
+
+import pandas as pd
+
+import json_data_clean as jdc
+from streaming import stream_clean
+from writers import read_output
+
+SAMPLE_SYSTEMBOOK = os.path.join(os.path.dirname(__file__), '..', 'sample-data', '03_Library Systembook.csv')
+DATE_COLUMNS = ['Book checkout', 'Book Returned']
+ID_COLUMNS = ['Id', 'Customer ID']
+
+
+class TestStreamClean(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_in_memory(self, filepath=SAMPLE_SYSTEMBOOK):
+        df = jdc.fileLoader(filepath, 'systembook_metrics')
+        df = jdc.duplicateCleaner(df, 'systembook_metrics')
+        df = jdc.naCleaner(df, 'systembook_metrics')
+        for col in DATE_COLUMNS:
+            df = jdc.dateCleaner(col, df, 'systembook_metrics')
+        df = jdc.enrich_dateDuration('Book checkout', 'Book Returned', df, 'systembook_metrics')
+        df = jdc.idCleaner(ID_COLUMNS, df, 'systembook_metrics')
+
+        output_path = os.path.join(self.tmpdir.name, 'in_memory.csv')
+        df.to_csv(output_path, index=False)
+        return output_path, dict(jdc.metrics_logger.metrics['systembook_metrics'])
+
+    def run_streaming(self, chunksize, filepath=SAMPLE_SYSTEMBOOK, output_format='csv'):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        steps = [partial(jdc.naCleaner, dataset_name='systembook_metrics')]
+        steps += [partial(jdc.dateCleaner, col, dataset_name='systembook_metrics') for col in DATE_COLUMNS]
+        steps += [
+            partial(jdc.enrich_dateDuration, 'Book checkout', 'Book Returned', dataset_name='systembook_metrics'),
+            partial(jdc.idCleaner, ID_COLUMNS, dataset_name='systembook_metrics')
+        ]
+
+        output_path = os.path.join(self.tmpdir.name, f'streamed_{chunksize}.{output_format}')
+        rows = stream_clean(filepath, 'systembook_metrics', steps, output_path, jdc.metrics_logger, chunksize,
+                            output_format=output_format)
+        return output_path, rows, dict(jdc.metrics_logger.metrics['systembook_metrics'])
+
+    def test_output_matches_in_memory_run(self):
+        expected_path, _ = self.run_in_memory()
+
+        for chunksize in [1, 7, 50, 1000]:
+            output_path, rows, _ = self.run_streaming(chunksize)
+            with open(expected_path) as expected, open(output_path) as streamed:
+                self.assertEqual(streamed.read(), expected.read(), f'chunksize={chunksize}')
+            self.assertEqual(rows, len(pd.read_csv(expected_path)))
+
+    def test_metrics_match_in_memory_run(self):
+        _, expected_metrics = self.run_in_memory()
+
+        for chunksize in [1, 7, 50, 1000]:
+            _, _, metrics = self.run_streaming(chunksize)
+            self.assertEqual(metrics, expected_metrics, f'chunksize={chunksize}')
+
+    def test_text_in_numeric_column_past_first_chunk(self):
+        sample = pd.read_csv(SAMPLE_SYSTEMBOOK, dtype=str, keep_default_na=False)
+        sample.loc[len(sample) - 1, 'Customer ID'] = 'unknown'
+        filepath = os.path.join(self.tmpdir.name, 'late_text.csv')
+        sample.to_csv(filepath, index=False)
+        expected_path, _ = self.run_in_memory(filepath)
+
+        output_path, rows, _ = self.run_streaming(10, filepath)
+
+        with open(expected_path) as expected, open(output_path) as streamed:
+            self.assertEqual(streamed.read(), expected.read())
+        self.assertEqual(rows, len(pd.read_csv(expected_path)))
+
+    def test_text_in_numeric_column_streams_to_parquet(self):
+        # The last 5-row chunk has text in Customer ID and repeats the first row
+        sample = pd.read_csv(SAMPLE_SYSTEMBOOK, dtype=str, keep_default_na=False).drop_duplicates().head(20)
+        bad = sample.iloc[[1]].assign(Id='999', **{'Customer ID': 'abc'})
+        filepath = os.path.join(self.tmpdir.name, 'late_text.csv')
+        pd.concat([sample, sample.iloc[[0]], bad]).to_csv(filepath, index=False)
+        expected_path, expected_metrics = self.run_in_memory(filepath)
+
+        output_path, rows, metrics = self.run_streaming(5, filepath, 'parquet')
+
+        self.assertEqual(metrics, expected_metrics)
+        self.assertEqual((metrics['duplicates_dropped'], metrics['na_rows_dropped']), (1, 1))
+        output = read_output(output_path)
+        self.assertEqual(rows, len(output))
+        self.assertEqual(rows, len(pd.read_csv(expected_path)))
+        self.assertEqual(output['Customer ID'].dtype, 'Int64')
+
+
+if __name__ == '__main__':
+    unittest.main()
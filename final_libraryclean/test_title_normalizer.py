@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import json_data_clean as jdc
+from quarantine import RowValidity
+from title_normalizer import TitleCatalog, assign_title_ids, title_key
+
+
+class TestTitleKey(unittest.TestCase):
+    def test_punctuation_case_and_stopwords(self):
+        self.assertEqual(title_key('The Lord of the Rings: Return of the King'), 'lord rings return king')
+        self.assertEqual(title_key('  Dune '), 'dune')
+        self.assertEqual(title_key('Les Misérables'), 'les miserables')
+        self.assertEqual(title_key('The'), 'the')
+
+
+class TestTitleCatalog(unittest.TestCase):
+    def test_groups_near_duplicates(self):
+        catalog = TitleCatalog()
+        king = catalog.title_id('Lord of the rings the return of the kind')
+        self.assertEqual(catalog.title_id('Lord of the Rings: Return of the King'), king)
+        self.assertNotEqual(catalog.title_id('Lord of the rings the two towers'), king)
+        self.assertNotEqual(catalog.title_id('Catch 22'), catalog.title_id('Catcher in the Rye'))
+        self.assertEqual(catalog.titles[king], 'Lord of the rings the return of the kind')
+
+    def test_only_new_spellings_are_matched(self):
+        catalog = TitleCatalog()
+        values = pd.Series(['Dune ', 'dune', 'Dune ', None, 'The Hobbit', 'dune'], dtype='category')
+
+        ids, variants = assign_title_ids(values, catalog)
+
+        self.assertEqual(ids.tolist(), [1, 1, 1, pd.NA, 2, 1])
+        self.assertEqual(variants.tolist(), [False, True, False, False, False, True])
+        self.assertEqual(catalog.misses, 3)
+
+        assign_title_ids(values, catalog)
+        self.assertEqual(catalog.misses, 3)
+
+    def test_saved_catalog_keeps_ids(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'title_catalog.json')
+            catalog = TitleCatalog(path)
+            hobbit = catalog.title_id('The Hobbit')
+            catalog.title_id('Dune')
+            catalog.save()
+
+            reloaded = TitleCatalog(path)
+            self.assertEqual(reloaded.title_id('The Hobbit'), hobbit)
+            self.assertEqual(reloaded.title_id('The hobbit.'), hobbit)
+            self.assertEqual(reloaded.title_id('Emma'), 3)
+            self.assertEqual(reloaded.misses, 2)
+
+
+class TestTitleCleaner(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+
+    def test_rejected_rows_get_no_title(self):
+        df = pd.DataFrame({'Books': ['Dune', 'dune', 'Emma', 'Dune ']})
+        rows = RowValidity(df)
+        rows.reject(pd.Series([False, False, True, False]), 'duplicate')
+
+        df = jdc.titleCleaner('Books', df, 'systembook_metrics', catalog=TitleCatalog(), validity=rows)
+
+        self.assertEqual(df['title_id'].tolist(), [1, 1, pd.NA, 1])
+        metrics = jdc.metrics_logger.metrics['systembook_metrics']
+        self.assertEqual(metrics['new_title_spellings'], 3)
+        self.assertEqual(metrics['title_variant_rows'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import json_data_clean as jdc
+from metrics_store import MetricsStore, store_path
+from pipeline import DEFAULT_CONFIG, load_config
+from watch_folder import INGEST_METRICS, IngestService
+
+SAMPLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'sample-data'))
+SYSTEMBOOK = '03_Library Systembook.csv'
+CUSTOMERS = '03_Library SystemCustomers.csv'
+
+
+class TestIngestService(unittest.TestCase):
+    def setUp(self):
+        jdc.metrics_logger = jdc.MetricsLogger()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmpdir.name, 'in')
+        self.output_dir = os.path.join(self.tmpdir.name, 'out')
+        os.makedirs(self.input_dir)
+
+        self.config = load_config(DEFAULT_CONFIG)
+        self.config['input_dir'] = self.input_dir
+        self.config['output_dir'] = self.output_dir
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def drop(self, name, source=None, mtime_ns=None):
+        path = os.path.join(self.input_dir, name)
+        shutil.copyfile(source or os.path.join(SAMPLE_DIR, name), path)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def read_metrics(self):
+        with open(os.path.join(self.output_dir, 'pipeline_metrics.json')) as f:
+            return json.load(f)
+
+    def test_files_there_at_start_are_not_cleaned(self):
+        self.drop(CUSTOMERS)
+        service = IngestService(self.config, settle_seconds=1)
+
+        self.assertFalse(service.poll(now=0))
+        self.assertFalse(service.poll(now=5))
+        self.assertTrue(service.queue.empty())
+
+    def test_drop_is_queued_once_it_settles(self):
+        service = IngestService(self.config, settle_seconds=1)
+        path = self.drop(CUSTOMERS, mtime_ns=1)
+
+        self.assertFalse(service.poll(now=0))
+        # Still being written: the settle time starts again
+        with open(path, 'a') as f:
+            f.write('99,Ada Lovelace\n')
+        self.assertFalse(service.poll(now=1))
+        self.assertFalse(service.poll(now=1.5))
+        self.assertTrue(service.poll(now=2))
+
+        job = service.queue.get_nowait()
+        self.assertEqual((job['files'], job['datasets']), ([CUSTOMERS], {'customers_metrics'}))
+        self.assertEqual(job['first_seen'], 1)
+        # Not queued again until the file changes
+        self.assertFalse(service.poll(now=10))
+
+    def test_new_branch_export_is_a_drop(self):
+        self.config['datasets']['systembook_metrics']['input'] = 'branches/*.csv'
+        os.makedirs(os.path.join(self.input_dir, 'branches'))
+        self.drop(os.path.join('branches', 'north.csv'), source=os.path.join(SAMPLE_DIR, SYSTEMBOOK))
+        service = IngestService(self.config, settle_seconds=0)
+
+        self.drop(os.path.join('branches', 'south.csv'), source=os.path.join(SAMPLE_DIR, SYSTEMBOOK))
+        service.poll(now=0)
+        self.assertTrue(service.poll(now=0))
+        job = service.queue.get_nowait()
+        self.assertEqual((job['files'], job['datasets']), ([os.path.join('branches', 'south.csv')], {'systembook_metrics'}))
+
+    def test_full_queue_holds_drops(self):
+        service = IngestService(self.config, settle_seconds=0, queue_size=1)
+        self.drop(CUSTOMERS)
+        service.poll(now=0)
+        self.assertTrue(service.poll(now=0))
+
+        self.drop(SYSTEMBOOK)
+        service.poll(now=1)
+        self.assertFalse(service.poll(now=1))
+        self.assertFalse(service.poll(now=2))
+        self.assertEqual(service.backpressure_polls, 2)
+
+        service.queue.get_nowait()
+        self.assertTrue(service.poll(now=3))
+        self.assertEqual(service.queue.get_nowait()['files'], [SYSTEMBOOK])
+
+    def test_run_cleans_drop_and_its_dependents(self):
+        service = IngestService(self.config, settle_seconds=0)
+        for name in [CUSTOMERS, SYSTEMBOOK]:
+            self.drop(name)
+        service.poll(now=0)
+        service.poll(now=0)
+
+        final_rows = service.run(service.queue.get_nowait())
+        self.assertEqual(final_rows, {'customers_metrics': 8, 'systembook_metrics': 12})
+        metrics = self.read_metrics()[INGEST_METRICS]
+        self.assertEqual((metrics['files_dropped'], metrics['datasets_run'], metrics['run_failed']), (2, 2, 0))
+
+        # A new customers drop re-cleans the loans that reference them
+        self.drop(CUSTOMERS, mtime_ns=1)
+        service.poll(now=1)
+        service.poll(now=1)
+        self.assertEqual(set(service.run(service.queue.get_nowait())), {'customers_metrics', 'systembook_metrics'})
+
+        with MetricsStore(store_path(self.output_dir)) as store:
+            self.assertEqual(store.run_count(), 2)
+
+    def test_failed_run_is_recorded(self):
+        service = IngestService(self.config, settle_seconds=0)
+        broken = os.path.join(self.tmpdir.name, 'broken.csv')
+        with open(broken, 'w') as f:
+            f.write('Id,Books\n1,Dune\n')
+        self.drop(CUSTOMERS)
+        self.drop(SYSTEMBOOK, source=broken)
+        service.poll(now=0)
+        service.poll(now=0)
+
+        self.assertEqual(service.run(service.queue.get_nowait()), {})
+        self.assertEqual(service.failed_runs, 1)
+        self.assertEqual(self.read_metrics()[INGEST_METRICS]['run_failed'], 1)
+
+    def test_service_cleans_drops_in_the_background(self):
+        service = IngestService(self.config, poll_seconds=0.02, settle_seconds=0.05).start()
+        try:
+            self.drop(CUSTOMERS)
+            deadline = time.monotonic() + 10
+            while service.runs == 0 and time.monotonic() < deadline:
+                time.sleep(0.02)
+        finally:
+            service.stop()
+
+        self.assertEqual(service.runs, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'cleaned_customers.csv')))
+        self.assertEqual(self.read_metrics()['customers_metrics']['final_row_count'], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
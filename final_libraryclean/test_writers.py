@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from writers import cleaned_output_path, get_writer, map_output, read_output, write_dataframe, write_mapped_copy
+
+
+class TestWriters(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({
+            'Id': pd.array([1, 6, 9, 10], dtype='Int64'),
+            'Books': ['Catcher in the Rye ', 'Little Women', 'Catch 22', 'Animal Farm '],
+            'Book checkout': pd.to_datetime(['20/02/2023', '02/04/2023', '15/04/2023', '20/04/2023'], dayfirst=True),
+            'Customer ID': pd.array([1, 1, 7, None], dtype='Int64'),
+            'days_borrowed': [5, 29, 1, 4],
+            'valid_loan_flag': [True, True, True, True]
+        })
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_columnar_formats_keep_types(self):
+        for output_format in ['parquet', 'arrow']:
+            path = cleaned_output_path(self.tmpdir.name, 'cleaned_library_systembook', output_format)
+            write_dataframe(self.df, path, output_format, compression='zstd')
+
+            pd.testing.assert_frame_equal(read_output(path), self.df)
+
+    def test_csv_matches_to_csv(self):
+        path = cleaned_output_path(self.tmpdir.name, 'cleaned_library_systembook', 'csv')
+        write_dataframe(self.df, path, 'csv')
+
+        with open(path) as f:
+            self.assertEqual(f.read(), self.df.to_csv(index=False))
+
+    def test_chunked_writes_append(self):
+        for output_format in ['csv', 'parquet', 'arrow']:
+            path = cleaned_output_path(self.tmpdir.name, 'chunks', output_format)
+            with get_writer(output_format, path, row_group_size=2) as writer:
+                writer.write(self.df.iloc[:3])
+                writer.write(self.df.iloc[3:])
+
+            self.assertEqual(writer.rows_written, 4)
+            self.assertEqual(len(read_output(path)), 4)
+
+    def test_parquet_row_group_size(self):
+        path = cleaned_output_path(self.tmpdir.name, 'groups', 'parquet')
+        write_dataframe(self.df, path, 'parquet', row_group_size=1)
+
+        self.assertEqual(pq.ParquetFile(path).num_row_groups, 4)
+
+    def test_map_output_does_not_copy(self):
+        path = cleaned_output_path(self.tmpdir.name, 'cleaned_library_systembook', 'arrow')
+        write_dataframe(self.df, path, 'arrow')
+
+        allocated = pa.total_allocated_bytes()
+        mapped = map_output(path)
+        self.assertLess(pa.total_allocated_bytes() - allocated, 1024)
+        self.assertTrue(all(isinstance(dtype, pd.ArrowDtype) for dtype in mapped.dtypes))
+        pd.testing.assert_series_equal(mapped['Customer ID'].astype('Int64'), self.df['Customer ID'])
+
+        # A new run replaces the file; the mapped frame keeps the old rows
+        write_dataframe(self.df.iloc[:1], path, 'arrow')
+        self.assertEqual(mapped['Books'].tolist(), self.df['Books'].tolist())
+        self.assertEqual(len(map_output(path)), 1)
+        self.assertFalse(os.path.exists(f'{path}.tmp'))
+
+    def test_mapped_copy_keeps_csv_types(self):
+        path = cleaned_output_path(self.tmpdir.name, 'cleaned_library_systembook', 'csv')
+        write_dataframe(self.df, path, 'csv')
+        mapped_path = write_mapped_copy(path)
+
+        self.assertEqual(mapped_path, cleaned_output_path(self.tmpdir.name, 'cleaned_library_systembook', 'arrow'))
+        schema = pa.ipc.open_file(mapped_path).schema
+        self.assertEqual(
+            [schema.field(col).type for col in ['Id', 'Book checkout', 'valid_loan_flag']], [pa.int64(), pa.date32(), pa.bool_()]
+        )
+        self.assertEqual(map_output(mapped_path)['Id'].tolist(), [1, 6, 9, 10])
+        self.assertEqual(write_mapped_copy(mapped_path), mapped_path)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            get_writer('xlsx', os.path.join(self.tmpdir.name, 'out.xlsx'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+"""
+Book title normalization and near-duplicate grouping for the 'Books' column.
+
+The same book shows up under several spellings: "Dune " with a trailing space, "The
+Hobbit" and "The hobbit", or typos such as "Lord of the rings the return of the kind"
+for "Lord of the Rings: Return of the King". Every spelling is reduced to a match key
+(lowercase ASCII words without punctuation and without 'a', 'an', 'the', 'of', 'and'),
+and spellings whose keys are close enough are grouped under one canonical title with a
+numeric title id.
+
+Grouping is blocked: a new key is only compared (difflib ratio, with the cheap upper
+bounds checked first) with the known keys that start with the same word, so the work
+grows with the size of a block, not with the square of the number of titles. A typo in
+the first significant word therefore starts a new title.
+
+A TitleCatalog remembers every spelling it has seen, so only new distinct spellings
+are normalized and matched; with a path it is saved between runs (e.g.
+output-data/title_catalog.json), which also keeps title ids stable from run to run.
+The canonical title of a group is the first spelling seen for it, and ids are numbered
+in the order titles are first seen; ids in the catalog never change.
+
+Steps that run in worker processes (parallel.py, multi_file.py) get a DeferredTitles
+copy of the catalog: spellings the catalog does not know get a provisional id there,
+and the parent matches them, partition by partition in file order, when it stitches
+the output together (match_pending() and fill_title_ids()). Titles are therefore
+numbered as a serial run numbers them.
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+CATALOG_FILE = 'title_catalog.json'
+
+# Words left out of match keys
+STOPWORDS = {'a', 'an', 'the', 'of', 'and'}
+
+# difflib ratio two keys need to be the same title
+MATCH_THRESHOLD = 0.9
+
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def title_catalog_path(output_dir):
+    return os.path.join(output_dir, CATALOG_FILE)
+
+
+def title_key(title):
+    """Match key of a title: 'The Lord of the Rings: Return of the King' -> 'lord rings return king'"""
+    text = unicodedata.normalize('NFKD', str(title)).encode('ascii', 'ignore').decode().lower()
+    words = WORD.findall(text)
+    # A title made only of stopwords keeps them
+    return ' '.join([word for word in words if word not in STOPWORDS] or words)
+
+
+def similarity(a, b, at_least=0.0):
+    """difflib ratio of two keys, or 0.0 as soon as it is clearly below at_least"""
+    if 2 * min(len(a), len(b)) / (len(a) + len(b)) < at_least:
+        return 0.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() < at_least or matcher.quick_ratio() < at_least:
+        return 0.0
+    return matcher.ratio()
+
+
+class TitleCatalog:
+    """Canonical titles with their ids, and the title id of every spelling seen so far"""
+
+    def __init__(self, path=None, threshold=MATCH_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.spellings = {}
+        self.keys = {}
+        self.titles = {}
+        # Spellings normalized and matched since the catalog was created or loaded
+        self.misses = 0
+
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                state = json.load(f)
+            self.spellings = state['spellings']
+            self.keys = state['keys']
+            self.titles = {int(title_id): title for title_id, title in state['titles'].items()}
+        self.index_blocks()
+
+    def index_blocks(self):
+        self.blocks = {}
+        for key in self.keys:
+            self.blocks.setdefault(key.split()[0], []).append(key)
+
+    def title_id(self, spelling):
+        """Title id of one spelling, matching it against the known titles the first time it is seen"""
+        if spelling in self.spellings:
+            return self.spellings[spelling]
+
+        self.misses += 1
+        key = title_key(spelling)
+        if not key:
+            title_id = None
+        elif key in self.keys:
+            title_id = self.keys[key]
+        else:
+            match = self.closest(key)
+            if match is None:
+                title_id = len(self.titles) + 1
+                self.titles[title_id] = spelling.strip()
+            else:
+                title_id = self.keys[match]
+            self.keys[key] = title_id
+            self.blocks.setdefault(key.split()[0], []).append(key)
+
+        self.spellings[spelling] = title_id
+        return title_id
+
+    def closest(self, key):
+        """The most similar known key in key's block, if any reaches the threshold"""
+        best, best_ratio = None, self.threshold
+        for other in self.blocks.get(key.split()[0], []):
+            ratio = similarity(key, other, at_least=best_ratio)
+            if ratio >= best_ratio and (best is None or ratio > best_ratio):
+                best, best_ratio = other, ratio
+        return best
+
+    def state(self):
+        return {'titles': self.titles, 'keys': self.keys, 'spellings': self.spellings}
+
+    def cache_token(self):
+        """Hash of the catalog's contents, for step_cache.py: the title ids of a cached step come from them"""
+        return hashlib.blake2b(json.dumps(self.state(), sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    def cache_state(self):
+        """The catalog as stored with a cached step, see restore_cache_state()"""
+        return json.loads(json.dumps(self.state()))
+
+    def restore_cache_state(self, state):
+        """Take the catalog from a cached step, with the spellings the step matched when it ran"""
+        self.misses += len(set(state['spellings']) - set(self.spellings))
+        self.spellings = state['spellings']
+        self.keys = state['keys']
+        self.titles = {int(title_id): title for title_id, title in state['titles'].items()}
+        self.index_blocks()
+
+    def frame(self):
+        """The canonical titles as a title_id, title frame"""
+        return pd.DataFrame({
+            'title_id': pd.array(list(self.titles), dtype='Int64'),
+            'title': pd.Series(list(self.titles.values()), dtype=str)
+        })
+
+    def save(self, path=None):
+        path = self.path if path is None else path
+        state = self.state()
+        with open(path, 'w') as f:
+            json.dump(state, f)
+        return path
+
+
+class DeferredTitles:
+    """
+    A catalog as sent to a worker process. Known spellings get their title id, new ones
+    a provisional negative id and are kept in pending (spelling -> rows, in order of
+    appearance) for the parent to match; nothing is matched in the worker.
+    """
+
+    # The worker matches no spellings, the parent counts them in match_pending()
+    misses = 0
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.pending = {}
+        self.provisional = {}
+
+    @property
+    def titles(self):
+        return self.catalog.titles
+
+    def title_id(self, spelling):
+        if spelling in self.catalog.spellings:
+            return self.catalog.spellings[spelling]
+        if spelling not in self.provisional:
+            self.provisional[spelling] = -(len(self.provisional) + 1)
+            self.pending[spelling] = 0
+        return self.provisional[spelling]
+
+    def count_rows(self, spellings, rows):
+        for spelling, count in zip(spellings, rows):
+            if spelling in self.pending:
+                self.pending[spelling] += int(count)
+
+
+def _step_catalog(step):
+    return getattr(step, 'keywords', {}).get('catalog')
+
+
+def defer_titles(steps):
+    """The steps with each TitleCatalog parameter wrapped in a DeferredTitles, for steps run in workers"""
+    return [
+        partial(step.func, *step.args, **{**step.keywords, 'catalog': DeferredTitles(_step_catalog(step))})
+        if isinstance(_step_catalog(step), TitleCatalog) else step
+        for step in steps
+    ]
+
+
+def pending_titles(steps):
+    """The (spelling, rows) each deferred titles step of a worker left to match, one list per step"""
+    return [list(_step_catalog(step).pending.items()) for step in steps if isinstance(_step_catalog(step), DeferredTitles)]
+
+
+def match_pending(steps, pending):
+    """
+    Match the spellings one partition left pending (see pending_titles()) in the parent's
+    catalogs. Returns {provisional id: title id} for fill_title_ids() and the
+    new_title_spellings and title_variant_rows to add to the partition's metrics.
+    """
+    catalogs = [_step_catalog(step).catalog for step in steps if isinstance(_step_catalog(step), DeferredTitles)]
+    title_ids, metrics = {}, dict.fromkeys(['new_title_spellings', 'title_variant_rows'], 0) if catalogs else {}
+    for catalog, spellings in zip(catalogs, pending):
+        misses = catalog.misses
+        for i, (spelling, rows) in enumerate(spellings):
+            title_id = title_ids[-(i + 1)] = catalog.title_id(spelling)
+            if title_id is not None and catalog.titles[title_id] != spelling.strip():
+                metrics['title_variant_rows'] += rows
+        metrics['new_title_spellings'] += catalog.misses - misses
+    return title_ids, metrics
+
+
+def fill_title_ids(df, title_ids):
+    """Replace the provisional title ids in a worker's frame with the ids match_pending() found"""
+    if not title_ids or 'title_id' not in df.columns:
+        return df
+    provisional = df['title_id'].lt(0).fillna(False).to_numpy(dtype=bool)
+    if provisional.any():
+        ids = df['title_id'].array.copy()
+        ids[provisional] = pd.array([title_ids[title_id] for title_id in ids[provisional]], dtype='Int64')
+        df['title_id'] = ids
+    return df
+
+
+# Shared in-memory catalog for cleaners called without one
+title_catalog = TitleCatalog()
+
+
+def assign_title_ids(values, catalog=title_catalog):
+    """
+    Title ids for a column of book titles, matching each distinct spelling once.
+
+    Returns (ids, variants): ids is an Int64 Series (missing titles stay <NA>) and
+    variants a boolean array marking the rows whose spelling, stripped, is not the
+    canonical title of their group.
+    """
+    codes, spellings = pd.factorize(values)
+    spellings = [str(spelling) for spelling in spellings]
+    ids = [catalog.title_id(spelling) for spelling in spellings]
+    if isinstance(catalog, DeferredTitles):
+        catalog.count_rows(spellings, np.bincount(codes[codes >= 0], minlength=len(spellings)))
+    # Provisional ids (< 0) of a DeferredTitles are counted by match_pending()
+    variant = np.array(
+        [
+            title_id is not None and title_id > 0 and catalog.titles[title_id] != spelling.strip()
+            for spelling, title_id in zip(spellings, ids)
+        ],
+        dtype=bool
+    )
+
+    # Missing values have code -1 and come back as <NA>
+    ids = pd.array(ids, dtype='Int64').take(codes, allow_fill=True)
+    variants = np.zeros(len(codes), dtype=bool)
+    variants[codes >= 0] = variant[codes[codes >= 0]]
+    return pd.Series(ids, index=values.index), variants
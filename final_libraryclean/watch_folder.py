@@ -0,0 +1,238 @@
+"""
+Ingestion service: watches the pipeline's input directory and cleans new drops from one
+long-running process, instead of someone starting final_data_clean or the container by
+hand.
+
+IngestService polls input_dir every poll_seconds, like the lookup service polls its
+outputs (no extra dependency, works on network shares). Only the dataset inputs named in
+the pipeline config are watched; for a directory or glob input (see multi_file.py) every
+file it matches is, so a new or changed branch export re-cleans the dataset. A file
+counts as dropped once its size and mtime have stayed the same for settle_seconds, so a
+CSV that is still being copied in is not read half written. Files already there when the service starts are not cleaned again.
+
+A drop re-cleans its dataset and the datasets whose references steps check against it
+(Pipeline.downstream()); the other datasets keep their outputs. Datasets whose input has
+not been dropped yet are left out, so a dataset that references one of them fails its
+run until it arrives. Drops that settle in the same poll are cleaned in one run.
+
+Runs go through a bounded queue (queue_size) to one worker thread. The modules and the
+config are loaded once, so a drop costs the cleaning itself and not a new interpreter,
+imports and config parsing. There is a single worker because the metrics logger is
+process-wide and the runs write the same outputs; the config's runner still decides how
+one run uses the CPUs. When the queue is full the watcher stops taking drops: they stay
+pending, and are queued with any later drops by the first poll that finds room
+(backpressure).
+
+Every run saves its metrics like pipeline.py (pipeline_metrics.json, the run history and
+the metrics store), with the service's own under ingest_metrics:
+
+    files_dropped           input files that triggered the run
+    datasets_run            datasets cleaned
+    queue_wait_seconds      from queueing to the start of the run
+    run_seconds             cleaning and writing the outputs
+    drop_to_output_seconds  from the first poll that saw the drop to the outputs being written
+    queue_depth             runs still waiting when the run started
+    backpressure_polls      polls that found the queue full since the previous run
+    run_failed              1 if the run raised an error (the service keeps going)
+
+Usage: python watch_folder.py [config file]
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+
+import pandas as pd
+
+import json_data_clean as cleaners
+from multi_file import expand_inputs
+from pipeline import DEFAULT_CONFIG, Pipeline, load_config, save_run_metrics
+
+# Seconds between scans of the input directory
+POLL_SECONDS = 1.0
+
+# Seconds a file's size and mtime must stay the same before it is read
+SETTLE_SECONDS = 2.0
+
+# Runs waiting for the worker before the watcher stops taking drops
+QUEUE_SIZE = 4
+
+INGEST_METRICS = 'ingest_metrics'
+
+
+class IngestService:
+    """Cleans the pipeline's datasets whenever a new version of one of their input files is dropped"""
+
+    def __init__(self, config, poll_seconds=POLL_SECONDS, settle_seconds=SETTLE_SECONDS, queue_size=QUEUE_SIZE):
+        self.config = config
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.inputs = {dataset['input']: name for name, dataset in config['datasets'].items()}
+        # file name (relative to input_dir) -> dataset, for every file the inputs matched so far
+        self.owners = {}
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        # file name -> (mtime_ns, size) of the version last queued, or there at start
+        self.seen = self.scan()
+        # file name -> ((mtime_ns, size), monotonic time it was first seen with that signature)
+        self.changing = {}
+        # file name -> ((mtime_ns, size), monotonic time first seen) of settled drops waiting for the queue
+        self.ready = {}
+
+        self.backpressure_polls = 0
+        self.runs = 0
+        self.failed_runs = 0
+        self._stop = threading.Event()
+        self._threads = []
+
+    @classmethod
+    def from_file(cls, path, **options):
+        return cls(load_config(path), **options)
+
+    def scan(self):
+        """(mtime_ns, size) of each watched input file in input_dir"""
+        input_dir = self.config['input_dir']
+        if not os.path.isdir(input_dir):
+            raise FileNotFoundError(f"Input directory {input_dir} not found")
+        signatures = {}
+        for pattern, dataset in self.inputs.items():
+            for path in expand_inputs(os.path.join(input_dir, pattern)):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if os.path.isfile(path):
+                    name = os.path.relpath(path, input_dir)
+                    signatures[name] = (stat.st_mtime_ns, stat.st_size)
+                    self.owners[name] = dataset
+        return signatures
+
+    def poll(self, now=None):
+        """Scan once, move settled drops to ready and queue them if there is room; returns True if a run was queued"""
+        now = time.monotonic() if now is None else now
+        for name, signature in self.scan().items():
+            if self.seen.get(name) == signature or self.ready.get(name, (None,))[0] == signature:
+                continue
+            first = self.changing.get(name)
+            if first is None or first[0] != signature:
+                # New or still being written: wait for it to settle
+                self.changing[name] = (signature, now)
+            elif now - first[1] >= self.settle_seconds:
+                del self.changing[name]
+                self.ready[name] = first
+        return self.enqueue() if self.ready else False
+
+    def enqueue(self):
+        """Queue one run for every ready drop, unless the queue is full"""
+        job = {
+            'files': sorted(self.ready),
+            'datasets': {self.owners[name] for name in self.ready},
+            'first_seen': min(first for _, first in self.ready.values()),
+            'queued_at': time.monotonic()
+        }
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            self.backpressure_polls += 1
+            print(f"Ingest queue full, holding {job['files']}")
+            return False
+        self.seen.update({name: signature for name, (signature, _) in self.ready.items()})
+        self.ready.clear()
+        print(f"Queued a run for {job['files']}")
+        return True
+
+    def present_config(self):
+        """The config without the datasets whose input files have not been dropped yet"""
+        datasets = {
+            name: dataset for name, dataset in self.config['datasets'].items()
+            if any(map(os.path.isfile, expand_inputs(os.path.join(self.config['input_dir'], dataset['input']))))
+        }
+        return {**self.config, 'datasets': datasets}
+
+    def run(self, job):
+        """Clean the datasets of one job and save the run's metrics; returns {dataset: final row count}"""
+        cleaners.metrics_logger = cleaners.MetricsLogger()
+        started = time.monotonic()
+        queue_depth = self.queue.qsize()
+        final_rows, failed = {}, False
+        try:
+            # A new Pipeline per run plans the steps against the dropped file's header
+            pipeline = Pipeline(self.present_config())
+            final_rows = pipeline.run(pipeline.downstream(job['datasets']))
+        except (OSError, KeyError, ValueError, pd.errors.ParserError) as e:
+            print(f"Error cleaning {job['files']}: {e}")
+            failed = True
+        finished = time.monotonic()
+
+        for metric, value in [
+            ('files_dropped', len(job['files'])),
+            ('datasets_run', len(final_rows)),
+            ('queue_wait_seconds', round(started - job['queued_at'], 3)),
+            ('run_seconds', round(finished - started, 3)),
+            ('drop_to_output_seconds', round(finished - job['first_seen'], 3)),
+            ('queue_depth', queue_depth),
+            ('backpressure_polls', self.backpressure_polls),
+            ('run_failed', int(failed))
+        ]:
+            cleaners.metrics_logger.log_metric(INGEST_METRICS, metric, value)
+        self.backpressure_polls = 0
+        save_run_metrics(self.config['output_dir'])
+
+        self.runs += 1
+        self.failed_runs += failed
+        print(f"Cleaned {job['files']} in {finished - started:.2f}s" if not failed else f"Run for {job['files']} failed")
+        return final_rows
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                self.run(job)
+            finally:
+                self.queue.task_done()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except OSError as e:
+                # The input directory may be briefly unavailable (network share); try again next poll
+                print(f"Error scanning {self.config['input_dir']}: {e}")
+
+    def start(self):
+        """Start the worker and the watcher in daemon threads"""
+        if not self._threads:
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._work, name='ingest-worker', daemon=True),
+                threading.Thread(target=self._watch, name='ingest-watch', daemon=True)
+            ]
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching, let the worker finish the queued runs and wait for it"""
+        if self._threads:
+            self._stop.set()
+            worker, watcher = self._threads
+            watcher.join()
+            self.queue.put(None)
+            worker.join()
+            self._threads = []
+
+
+if __name__ == '__main__':
+    service = IngestService.from_file(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CONFIG).start()
+    print(f"Watching {service.config['input_dir']} for {sorted(service.inputs)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
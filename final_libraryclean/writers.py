@@ -0,0 +1,195 @@
+"""
+Pluggable writers for the cleaned datasets.
+
+CSV stays the default for Power BI, while Parquet and Arrow IPC (Feather v2) keep the
+column types (datetime64 dates, Int64 IDs, bool flags) so downstream readers do not
+need to re-parse text. Every writer accepts whole frames or a stream of chunks.
+
+Options:
+    row_group_size - rows per Parquet row group / Arrow record batch
+    compression    - 'snappy', 'zstd', 'gzip' (Parquet), 'lz4', 'zstd' (Arrow),
+                     'gzip', 'bz2', 'zip' (CSV) or None
+
+Readers that keep the cleaned outputs open (the dashboard, lookup.py) use open_output():
+an uncompressed Arrow IPC file is memory-mapped and wrapped without copying (pyarrow
+backed columns), so every process reading it shares the same page cache pages instead of
+holding its own copy. write_mapped_copy() writes that file next to a CSV or Parquet
+output. Arrow files are written under a temporary name and renamed into place, so a
+reader that still maps the previous run's file keeps seeing it whole.
+"""
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+
+class OutputWriter:
+    """Base class for writers that append DataFrame chunks to one output file"""
+
+    extension = ''
+
+    def __init__(self, path, row_group_size=None, compression=None):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.rows_written = 0
+
+    def write(self, df):
+        """Append df to the output file"""
+        self._write(df)
+        self.rows_written += len(df)
+
+    def _write(self, df):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvWriter(OutputWriter):
+    extension = '.csv'
+
+    def __init__(self, path, row_group_size=None, compression=None):
+        super().__init__(path, row_group_size, compression)
+        self.header_written = False
+
+    def _write(self, df):
+        mode = 'a' if self.header_written else 'w'
+        df.to_csv(self.path, mode=mode, header=not self.header_written, index=False, compression=self.compression)
+        self.header_written = True
+
+
+class ArrowTableWriter(OutputWriter):
+    """Shared logic for the pyarrow based writers: the first chunk fixes the file schema"""
+
+    def __init__(self, path, row_group_size=None, compression=None):
+        super().__init__(path, row_group_size, compression)
+        self.schema = None
+        self.writer = None
+
+    def _write(self, df):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = self._open(table.schema)
+        else:
+            # Later chunks may infer slightly different types (e.g. an all-null column)
+            table = table.cast(self.schema)
+        self._write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class ParquetWriter(ArrowTableWriter):
+    extension = '.parquet'
+
+    def _open(self, schema):
+        return pq.ParquetWriter(self.path, schema, compression=self.compression or 'none')
+
+    def _write_table(self, table):
+        self.writer.write_table(table, row_group_size=self.row_group_size)
+
+
+class ArrowIpcWriter(ArrowTableWriter):
+    extension = '.arrow'
+
+    def _open(self, schema):
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(staging_path(self.path), schema, options=options)
+
+    def _write_table(self, table):
+        self.writer.write_table(table, max_chunksize=self.row_group_size)
+
+    def close(self):
+        written = self.writer is not None
+        super().close()
+        if written:
+            # Readers may have the old file mapped: replace it rather than truncating it
+            os.replace(staging_path(self.path), self.path)
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+    'arrow': ArrowIpcWriter
+}
+
+
+def get_writer(output_format, path, row_group_size=None, compression=None):
+    """Return an open writer for output_format ('csv', 'parquet' or 'arrow')"""
+    if output_format not in WRITERS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {list(WRITERS)}")
+    return WRITERS[output_format](path, row_group_size=row_group_size, compression=compression)
+
+
+def cleaned_output_path(output_dir, name, output_format):
+    """Build the output file path for a dataset, e.g. output-data/cleaned_customers.parquet"""
+    return f'{output_dir}/{name}{WRITERS[output_format].extension}'
+
+
+def write_dataframe(df, path, output_format='csv', row_group_size=None, compression=None):
+    """Write a whole DataFrame in one go"""
+    with get_writer(output_format, path, row_group_size, compression) as writer:
+        writer.write(df)
+    return path
+
+
+def staging_path(path):
+    return f'{path}.tmp'
+
+
+def mapped_output_path(path):
+    """The Arrow IPC file next to an output, e.g. cleaned_customers.csv -> cleaned_customers.arrow"""
+    return os.path.splitext(path)[0] + ArrowIpcWriter.extension
+
+
+def write_mapped_copy(path):
+    """Write an uncompressed Arrow IPC copy of a CSV or Parquet output for open_output(); returns its path"""
+    mapped_path = mapped_output_path(path)
+    if mapped_path == path:
+        return path
+    # pyarrow infers the column types (ISO dates, integers, True/False) from the whole CSV
+    table = pq.read_table(path) if path.endswith(ParquetWriter.extension) else pa_csv.read_csv(path)
+    with pa.ipc.new_file(staging_path(mapped_path), table.schema) as writer:
+        writer.write_table(table)
+    os.replace(staging_path(mapped_path), mapped_path)
+    return mapped_path
+
+
+def map_output(path):
+    """
+    DataFrame over a memory-mapped Arrow IPC file, with pyarrow backed columns that point
+    into the mapping (no copy). Compressed files are decompressed into memory instead.
+    """
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    # The buffers keep the mapping alive after the file is closed
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def open_output(path):
+    """map_output() for Arrow IPC files, read_output() for the other formats"""
+    if path.endswith(ArrowIpcWriter.extension):
+        return map_output(path)
+    return read_output(path)
+
+
+def read_output(path):
+    """Load a file written by one of the writers back into a DataFrame"""
+    if path.endswith(ParquetWriter.extension):
+        return pd.read_parquet(path)
+    if path.endswith(ArrowIpcWriter.extension):
+        return pd.read_feather(path)
+    return pd.read_csv(path)
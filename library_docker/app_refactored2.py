@@ -3,6 +3,8 @@
 import pandas as pd
 import os
 
+from writers import cleaned_output_path, write_dataframe
+
 # Function to output dataframe that can be manipulated via a filepath
 def fileLoader(filepath):
     data = pd.read_csv(filepath)
@@ -66,6 +68,10 @@ if __name__ == '__main__':
     date_columns = ['Book checkout', 'Book Returned']
     output_dir = '/output'
 
+    # Cleaned file format: 'csv', 'parquet' or 'arrow' (see writers.py)
+    output_format = os.environ.get('OUTPUT_FORMAT', 'csv')
+    writer_options = {'row_group_size': None, 'compression': None}
+
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
@@ -96,10 +102,10 @@ if __name__ == '__main__':
     print(data2)
     print('**************** DATA CLEANED ****************')
 
-    print('Writing cleaned data to CSV files...')
+    print(f'Writing cleaned data to {output_format} files...')
 
-    # Write cleaned data to CSV
-    data.to_csv(f'{output_dir}/cleaned_library_systembook.csv', index=False)
-    data2.to_csv(f'{output_dir}/cleaned_customers.csv', index=False)
+    # Write cleaned data
+    write_dataframe(data, cleaned_output_path(output_dir, 'cleaned_library_systembook', output_format), output_format, **writer_options)
+    write_dataframe(data2, cleaned_output_path(output_dir, 'cleaned_customers', output_format), output_format, **writer_options)
     
     print('**************** End ****************')
\ No newline at end of file
@@ -1,9 +1,10 @@
 ## Before starting, in terminal run 'pip install -r requiremtns.txt'
 
 import pandas as pd
-from sqlalchemy import create_engine
 import pyodbc
 
+from sql_loader import dispose_engines, load_table
+
 # Function to output dataframe that can be manipulated via a filepath
 def fileLoader(filepath):
     data = pd.read_csv(filepath)
@@ -59,19 +60,22 @@ def enrich_dateDuration(colA, colB, df):
 
     return df
 
-def writeToSQL(df, table_name, server, database):
+def writeToSQL(df, table_name, server, database, mode='replace', key=None):
+    """
+    Load the DataFrame into SQL Server through the shared, pooled engine.
+
+    mode='replace' swaps the table for df, 'append' adds the rows and 'upsert' replaces
+    rows matching on key (e.g. 'Id'). See sql_loader.py.
+    """
 
     # Create the connection string with Windows Authentication
     connection_string = f'mssql+pyodbc://@{server}/{database}?trusted_connection=yes&driver=ODBC+Driver+17+for+SQL+Server'
 
-    # Create the SQLAlchemy engine
-    engine = create_engine(connection_string)
-
     try:
-        # Write the DataFrame to SQL Server
-        df.to_sql(table_name, con=engine, if_exists='replace', index=False)
+        # Batched inserts into a staging table, swapped in within one transaction
+        rows = load_table(df, table_name, connection_string, mode=mode, key=key)
 
-        print(f"Table{table_name} written to SQL")
+        print(f"Table {table_name} written to SQL ({rows} rows, mode={mode})")
     except Exception as e:
         print(f"Error writing to the SQL Server: {e}")
 
@@ -119,13 +123,19 @@ if __name__ == '__main__':
         data, 
         table_name='loans_bronze', 
         server = 'localhost', 
-        database = 'DE5_Module5' 
+        database = 'DE5_Module5',
+        mode='upsert',
+        key='Id'
     )
 
     writeToSQL(
         data2, 
         table_name='customer_bronze', 
         server = 'localhost', 
-        database = 'DE5_Module5'
+        database = 'DE5_Module5',
+        mode='upsert',
+        key='Customer ID'
     )
+
+    dispose_engines()
     print('**************** End ****************')
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Throughput of the pooled bulk loader against the old writeToSQL approach on SQLite.
+
+Usage: python bench_sql_loader.py [rows]   (default 200,000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from sql_loader import SqlLoader, dispose_engines, get_engine
+
+
+def make_loans(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    checkout = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, rows), unit='D')
+    return pd.DataFrame({
+        'Id': pd.array(np.arange(1, rows + 1), dtype='Int64'),
+        'Books': rng.choice(['Dune', 'IT', 'Misery', 'Catch 22', 'Little Women'], rows),
+        'Book checkout': checkout,
+        'Book Returned': checkout + pd.to_timedelta(rng.integers(0, 60, rows), unit='D'),
+        'Customer ID': pd.array(rng.integers(1, 5000, rows), dtype='Int64'),
+        'valid_loan_flag': True
+    })
+
+
+def legacy_write(df, table_name, connection_string):
+    """The original writeToSQL: new engine per call, to_sql with if_exists='replace'"""
+    engine = create_engine(connection_string)
+    df.to_sql(table_name, con=engine, if_exists='replace', index=False)
+    engine.dispose()
+
+
+def timed(label, rows, func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    print(f"{label:<28}{seconds:>9.2f}{rows / seconds:>14,.0f}")
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    loans = make_loans(rows)
+    updates = loans.sample(frac=0.1, random_state=0).assign(Books='Updated')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        connection_string = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        loader = SqlLoader(get_engine(connection_string))
+
+        print(f"{'load':<28}{'seconds':>9}{'rows/sec':>14}")
+        timed('legacy to_sql replace', rows, legacy_write, loans, 'legacy', connection_string)
+        timed('SqlLoader replace', rows, loader.load, loans, 'loans_bronze', mode='replace')
+        timed('SqlLoader append', rows, loader.load, loans, 'loans_append', mode='append')
+        timed('SqlLoader upsert (10%)', len(updates), loader.load, updates, 'loans_bronze', mode='upsert', key='Id')
+        dispose_engines()
@@ -0,0 +1,157 @@
+"""
+Pooled, bulk SQL loader for the cleaned library tables.
+
+- One pooled SQLAlchemy engine per connection string, shared by every table load
+  (fast_executemany is switched on for SQL Server / pyodbc).
+- Rows are inserted in batches with a single executemany per batch.
+- Every load writes into a staging table first and then, inside the same transaction,
+  either swaps it in (replace), appends it (append) or upserts it on a key (upsert).
+  If anything fails the transaction rolls back and the target table is left untouched.
+
+Works against SQLite for local testing, e.g. get_engine('sqlite:///library.db').
+"""
+
+import pandas as pd
+from sqlalchemy import MetaData, Table, create_engine, event
+
+DEFAULT_BATCH_SIZE = 10_000
+LOAD_MODES = ('replace', 'append', 'upsert')
+
+# Bind parameter marker for each DB-API paramstyle (sqlite3 and pyodbc use qmark)
+PLACEHOLDERS = {'qmark': '?', 'format': '%s', 'pyformat': '%s'}
+
+# Initialize shared engine pool, one engine per connection string
+_engines = {}
+
+
+def get_engine(connection_string, **engine_options):
+    """Return the shared pooled engine for connection_string, creating it on first use"""
+    if connection_string not in _engines:
+        if connection_string.startswith('mssql+pyodbc'):
+            engine_options.setdefault('fast_executemany', True)
+        engine = create_engine(connection_string, pool_pre_ping=True, **engine_options)
+
+        if engine.dialect.name == 'sqlite':
+            _enable_sqlite_transactional_ddl(engine)
+        _engines[connection_string] = engine
+    return _engines[connection_string]
+
+
+def dispose_engines():
+    """Close every pooled connection (e.g. at the end of the pipeline)"""
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
+
+
+def _enable_sqlite_transactional_ddl(engine):
+    """
+    pysqlite commits implicitly before CREATE/DROP/ALTER, which would break the staging
+    swap. Take over transaction control so DDL is part of the load transaction.
+    """
+    @event.listens_for(engine, 'connect')
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def _begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
+
+def dataframe_rows(df, dialect_name):
+    """
+    Convert a DataFrame to DB-API row tuples (NaN/NA/NaT become None).
+
+    Works column by column so the per-value work is numpy/pandas rather than Python.
+    """
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            if dialect_name == 'sqlite':
+                # Same text format SQLAlchemy's SQLite DateTime type stores
+                values = values.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+            else:
+                values = pd.Series(values.dt.to_pydatetime(), index=values.index, dtype=object)
+        columns.append(values.astype(object).where(values.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+class SqlLoader:
+    """Loads DataFrames into SQL tables through a staging table and one transaction per load"""
+
+    def __init__(self, engine, batch_size=DEFAULT_BATCH_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def _quote(self, name):
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    def _rename_table(self, conn, old_name, new_name):
+        if self.engine.dialect.name == 'mssql':
+            conn.exec_driver_sql(f"EXEC sp_rename '{old_name}', '{new_name}'")
+        else:
+            conn.exec_driver_sql(f'ALTER TABLE {self._quote(old_name)} RENAME TO {self._quote(new_name)}')
+
+    def _drop_table(self, conn, name):
+        Table(name, MetaData()).drop(conn, checkfirst=True)
+
+    def _write_staging(self, conn, df, staging_name):
+        """Create the staging table from the DataFrame's columns and bulk insert the rows"""
+        self._drop_table(conn, staging_name)
+        df.head(0).to_sql(staging_name, conn, index=False)
+
+        columns = ', '.join(self._quote(col) for col in df.columns)
+        placeholder = PLACEHOLDERS[self.engine.dialect.paramstyle]
+        insert = (
+            f'INSERT INTO {self._quote(staging_name)} ({columns}) '
+            f'VALUES ({", ".join([placeholder] * len(df.columns))})'
+        )
+
+        # One executemany per batch goes straight to the driver (fast_executemany on pyodbc)
+        for start in range(0, len(df), self.batch_size):
+            rows = dataframe_rows(df.iloc[start:start + self.batch_size], self.engine.dialect.name)
+            conn.exec_driver_sql(insert, rows)
+
+    def load(self, df, table_name, mode='replace', key=None):
+        """
+        Load df into table_name.
+
+        mode='replace' swaps the whole table for df, 'append' adds the rows and 'upsert'
+        replaces rows whose key matches a row in df and adds the rest.
+        Returns the number of rows loaded.
+        """
+        if mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode '{mode}', expected one of {LOAD_MODES}")
+        if mode == 'upsert' and key not in df.columns:
+            raise ValueError(f"Upsert needs a key column that exists in the DataFrame, got {key!r}")
+
+        staging_name = f'{table_name}__staging'
+        target = self._quote(table_name)
+        staging = self._quote(staging_name)
+        columns = ', '.join(self._quote(col) for col in df.columns)
+
+        with self.engine.begin() as conn:
+            self._write_staging(conn, df, staging_name)
+            target_exists = self.engine.dialect.has_table(conn, table_name)
+
+            if mode == 'replace' or not target_exists:
+                self._drop_table(conn, table_name)
+                self._rename_table(conn, staging_name, table_name)
+                return len(df)
+
+            if mode == 'upsert':
+                quoted_key = self._quote(key)
+                conn.exec_driver_sql(
+                    f'DELETE FROM {target} WHERE {quoted_key} IN (SELECT {quoted_key} FROM {staging})'
+                )
+            conn.exec_driver_sql(f'INSERT INTO {target} ({columns}) SELECT {columns} FROM {staging}')
+            self._drop_table(conn, staging_name)
+
+        return len(df)
+
+
+def load_table(df, table_name, connection_string, mode='replace', key=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Load df into table_name using the shared engine for connection_string"""
+    loader = SqlLoader(get_engine(connection_string), batch_size=batch_size)
+    return loader.load(df, table_name, mode=mode, key=key)
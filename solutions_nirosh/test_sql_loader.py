@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from sql_loader import SqlLoader, dispose_engines, get_engine
+
+
+class TestSqlLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.connection_string = f"sqlite:///{os.path.join(self.tmpdir.name, 'library.db')}"
+        self.engine = get_engine(self.connection_string)
+        self.loader = SqlLoader(self.engine, batch_size=2)
+        self.loans = pd.DataFrame({
+            'Id': pd.array([1, 2, 3], dtype='Int64'),
+            'Books': ['Dune', 'IT', None],
+            'Book checkout': pd.to_datetime(['20/02/2023', '24/03/2023', '29/03/2023'], dayfirst=True),
+            'valid_loan_flag': [True, False, True]
+        })
+
+    def tearDown(self):
+        dispose_engines()
+        self.tmpdir.cleanup()
+
+    def read_table(self, table_name='loans_bronze'):
+        return pd.read_sql(f'SELECT * FROM {table_name} ORDER BY Id', self.engine)
+
+    def test_engine_is_shared(self):
+        self.assertIs(get_engine(self.connection_string), self.engine)
+
+    def test_replace(self):
+        self.loader.load(self.loans, 'loans_bronze')
+        self.loader.load(self.loans.head(1), 'loans_bronze', mode='replace')
+
+        self.assertEqual(self.read_table()['Id'].tolist(), [1])
+
+    def test_append(self):
+        self.loader.load(self.loans, 'loans_bronze')
+        self.loader.load(self.loans.head(2), 'loans_bronze', mode='append')
+
+        self.assertEqual(self.read_table()['Id'].tolist(), [1, 1, 2, 2, 3])
+
+    def test_upsert_on_key(self):
+        self.loader.load(self.loans, 'loans_bronze')
+        changes = pd.DataFrame({
+            'Id': pd.array([2, 4], dtype='Int64'),
+            'Books': ['IT (2nd edition)', 'Emma'],
+            'Book checkout': pd.to_datetime(['25/03/2023', '01/04/2023'], dayfirst=True),
+            'valid_loan_flag': [True, True]
+        })
+        self.loader.load(changes, 'loans_bronze', mode='upsert', key='Id')
+
+        table = self.read_table()
+        self.assertEqual(table['Id'].tolist(), [1, 2, 3, 4])
+        self.assertEqual(table.loc[1, 'Books'], 'IT (2nd edition)')
+        self.assertTrue(pd.isna(table.loc[2, 'Books']))
+
+    def test_failed_load_rolls_back(self):
+        self.loader.load(self.loans, 'loans_bronze')
+        mismatched = self.loans.rename(columns={'Books': 'Title'})
+
+        with self.assertRaises(Exception):
+            self.loader.load(mismatched, 'loans_bronze', mode='append')
+
+        self.assertEqual(len(self.read_table()), 3)
+        with self.engine.connect() as conn:
+            self.assertFalse(self.engine.dialect.has_table(conn, 'loans_bronze__staging'))
+
+    def test_upsert_needs_key(self):
+        with self.assertRaises(ValueError):
+            self.loader.load(self.loans, 'loans_bronze', mode='upsert', key='Customer ID')
+
+
+if __name__ == '__main__':
+    unittest.main()